@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import logging
+
+import pymbolic.mapper.flop_counter
+
+import sumpy.symbolic as sym
+from sumpy.assignment_collection import SymbolicAssignmentCollection
+from sumpy.codegen import to_loopy_insns
+from sumpy.expansion.local import LinearPDEConformingVolumeTaylorLocalExpansion
+from sumpy.expansion.m2l import VolumeTaylorM2LTranslation
+from sumpy.expansion.multipole import (
+    LinearPDEConformingVolumeTaylorMultipoleExpansion,
+)
+from sumpy.kernel import LaplaceKernel
+
+
+logger = logging.getLogger(__name__)
+
+
+class Param:
+    def __init__(self, dim, order, kind):
+        self.dim = dim
+        self.order = order
+        self.kind = kind
+
+    def __repr__(self):
+        return f"{self.kind}_{self.dim}D_order_{self.order}"
+
+
+def make_assignment_collection(param):
+    knl = LaplaceKernel(param.dim)
+    m_expn = LinearPDEConformingVolumeTaylorMultipoleExpansion(
+        knl, order=param.order)
+    l_expn = LinearPDEConformingVolumeTaylorLocalExpansion(
+        knl, order=param.order, m2l_translation=VolumeTaylorM2LTranslation())
+
+    src_expn, tgt_expn = {
+        "m2m": (m_expn, m_expn),
+        "m2l": (m_expn, l_expn),
+        "l2l": (l_expn, l_expn),
+        }[param.kind]
+
+    src_coeff_exprs = [
+        sym.Symbol(f"src_coeff{i}")
+        for i in range(len(src_expn))]
+    dvec = sym.make_sym_vector("d", knl.dim)
+    src_rscale = sym.Symbol("src_rscale")
+    tgt_rscale = sym.Symbol("tgt_rscale")
+
+    sac = SymbolicAssignmentCollection()
+    result = tgt_expn.translate_from(src_expn, src_coeff_exprs, src_rscale,
+                                     dvec, tgt_rscale, sac)
+    for i, expr in enumerate(result):
+        sac.assign_unique(f"coeff{i}", expr)
+
+    return sac
+
+
+class CSEBenchmarkSuite:
+    """Compares the number of operations after common subexpression
+    elimination and the time taken by it for the engines supported by
+    :meth:`~sumpy.assignment_collection.SymbolicAssignmentCollection.run_global_cse`.
+    """
+
+    params = (
+        (
+            Param(2, 20, "m2l"),
+            Param(3, 8, "m2l"),
+            Param(3, 12, "m2l"),
+            Param(3, 12, "m2m"),
+            Param(3, 16, "l2l"),
+        ),
+        ("sympy", "dag"),
+    )
+
+    param_names = ("translation", "engine")
+
+    def setup(self, param, engine):
+        logging.basicConfig(level=logging.INFO)
+        self.sac = make_assignment_collection(param)
+        self.assignments = dict(self.sac.assignments)
+
+    def time_cse(self, param, engine):
+        self.sac.assignments = dict(self.assignments)
+        self.sac.run_global_cse(engine=engine)
+
+    time_cse.timeout = 300.0
+
+    def track_op_count(self, param, engine):
+        self.sac.assignments = dict(self.assignments)
+        self.sac.run_global_cse(engine=engine)
+        insns = to_loopy_insns(self.sac.assignments.items())
+        counter = pymbolic.mapper.flop_counter.CSEAwareFlopCounter()
+
+        return sum(counter.rec(insn.expression)+1 for insn in insns)
+
+    track_op_count.unit = "ops"
+    track_op_count.timeout = 300.0
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import subprocess
+import sys
+
+
+# The time (in seconds) that ``import sumpy`` may take in a fresh interpreter.
+# This only covers :mod:`sumpy` itself: the code generation machinery
+# (:mod:`loopy`, :mod:`pyopencl`, :mod:`sympy`) is loaded on first use.
+IMPORT_TIME_BUDGET = 0.1
+
+HEAVY_MODULES = ("loopy", "pyopencl", "sympy", "symengine", "sumpy.e2e")
+
+
+def get_import_time(module):
+    """Return the cumulative time (in seconds) spent importing *module* in a
+    fresh interpreter, as reported by ``python -X importtime``.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True)
+
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+
+        _, cumulative, name = (field.strip() for field in line.split("|"))
+        if name == module:
+            return int(cumulative) * 1e-6
+
+    raise RuntimeError(f"no import time reported for '{module}'")
+
+
+class ImportBenchmarkSuite:
+    """Tracks the time taken by importing :mod:`sumpy` and some of its
+    submodules, which is dominated by the dependencies they load eagerly.
+    """
+
+    params = ("sumpy", "sumpy.kernel", "sumpy.p2p", "sumpy.fmm")
+    param_names = ("module",)
+
+    def timeraw_import(self, module):
+        return f"import {module}"
+
+    def track_import_time(self, module):
+        return get_import_time(module)
+
+    track_import_time.unit = "seconds"
+
+    def track_import_time_over_budget(self, module):
+        """The ratio of the time taken by ``import sumpy`` to
+        :data:`IMPORT_TIME_BUDGET`, which should stay below 1.
+        """
+        return get_import_time(module) / IMPORT_TIME_BUDGET
+
+    track_import_time_over_budget.unit = "budget"
+
+    def track_heavy_modules_loaded(self, module):
+        """The number of :data:`HEAVY_MODULES` loaded by importing *module*."""
+        result = subprocess.run(
+            [sys.executable, "-c",
+             (f"import sys; import {module}; "
+              f"print(sum(m in sys.modules for m in {HEAVY_MODULES!r}))")],
+            capture_output=True, text=True, check=True)
+
+        return int(result.stdout)
+
+    track_heavy_modules_loaded.unit = "modules"
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import numpy as np
+
+from pytools import generate_nonnegative_integer_tuples_summing_to_at_most as gnitstam
+
+from sumpy.kernel import BiharmonicKernel, LaplaceKernel, StokesletKernel
+from sumpy.tools import (
+    _reduced_row_echelon_form_generic,
+    add_mi,
+    nullspace,
+    reduced_row_echelon_form,
+)
+
+
+class Param:
+    def __init__(self, knl, order):
+        self.knl = knl
+        self.order = order
+
+    def __repr__(self):
+        return f"{self.knl}_order_{self.order}"
+
+
+def make_pde_matrix(knl, order):
+    """Return the matrix of the linear relations between the Taylor
+    coefficients up to *order* implied by the PDE satisfied by *knl*. Each row
+    corresponds to a derivative of the PDE.
+    """
+    deriv_id_to_coeff, = knl.get_pde_as_diff_op().eqs
+    pde_order = max(sum(ident.mi) for ident in deriv_id_to_coeff)
+
+    mis = sorted(gnitstam(order, knl.dim), key=sum)
+    mi_to_index = {mi: i for i, mi in enumerate(mis)}
+
+    rows = []
+    for shift in gnitstam(order - pde_order, knl.dim):
+        row = [0] * len(mis)
+        for ident, coeff in deriv_id_to_coeff.items():
+            row[mi_to_index[add_mi(ident.mi, shift)]] = coeff
+        rows.append(row)
+
+    return np.array(rows, dtype=object)
+
+
+class NullspaceBenchmarkSuite:
+    """Compares the exact fraction-free elimination used by
+    :func:`sumpy.tools.reduced_row_echelon_form` for rational matrices with
+    the generic elimination on the matrices of PDE relations between Taylor
+    coefficients.
+    """
+
+    params = (
+        (
+            Param(LaplaceKernel(2), 20),
+            Param(LaplaceKernel(3), 8),
+            Param(LaplaceKernel(3), 12),
+            Param(BiharmonicKernel(3), 10),
+            Param(StokesletKernel(3, 0, 0), 10),
+        ),
+        ("fraction_free", "generic"),
+    )
+
+    param_names = ("pde", "engine")
+
+    def setup(self, param, engine):
+        self.mat = make_pde_matrix(param.knl, param.order)
+
+    def time_reduced_row_echelon_form(self, param, engine):
+        if engine == "fraction_free":
+            reduced_row_echelon_form(self.mat)
+        else:
+            _reduced_row_echelon_form_generic(self.mat)
+
+    time_reduced_row_echelon_form.timeout = 600.0
+
+    def track_nullspace_dim(self, param, engine):
+        return nullspace(self.mat).shape[1]
+
+    track_nullspace_dim.unit = "vectors"
@@ -24,23 +24,7 @@ THE SOFTWARE.
 """
 
 import os
-from typing import TYPE_CHECKING
-
-from pytools.persistent_dict import WriteOncePersistentDict
-
-from sumpy.e2e import (
-    E2EFromChildren,
-    E2EFromCSR,
-    E2EFromParent,
-    M2LGenerateTranslationClassesDependentData,
-    M2LPostprocessLocal,
-    M2LPreprocessMultipole,
-    M2LUsingTranslationClassesDependentData,
-)
-from sumpy.e2p import E2PFromCSR, E2PFromSingleBox
-from sumpy.p2e import P2EFromCSR, P2EFromSingleBox
-from sumpy.p2p import P2P, P2PFromCSR
-from sumpy.version import VERSION_TEXT
+from typing import TYPE_CHECKING, Any
 
 
 if TYPE_CHECKING:
@@ -48,6 +32,25 @@ if TYPE_CHECKING:
 
     import loopy as lp
 
+    from sumpy.cache import SumpyCodeCache
+    from sumpy.e2e import (
+        E2EFromChildren,
+        E2EFromCSR,
+        E2EFromParent,
+        M2LGenerateTranslationClassesDependentData,
+        M2LPostprocessLocal,
+        M2LPreprocessMultipole,
+        M2LUsingTranslationClassesDependentData,
+    )
+    from sumpy.e2p import E2PFromCSR, E2PFromSingleBox
+    from sumpy.p2e import P2EFromCSR, P2EFromSingleBox
+    from sumpy.p2p import P2P, P2PFromCSR
+
+    code_cache: SumpyCodeCache[Hashable, lp.TranslationUnit]
+    binary_cache: SumpyCodeCache[Hashable, tuple[Any, ...]]
+    m2l_precompute_cache: SumpyCodeCache[Hashable, Any]
+    autotune_cache: SumpyCodeCache[Hashable, dict[str, Hashable]]
+
 
 __all__ = [
     "P2P",
@@ -66,8 +69,67 @@ __all__ = [
 ]
 
 
-code_cache: WriteOncePersistentDict[Hashable, lp.TranslationUnit] = \
-        WriteOncePersistentDict("sumpy-code-cache-v6-"+VERSION_TEXT, safe_sync=False)
+# {{{ lazy attribute loading
+
+# Importing the translation classes pulls in :mod:`loopy`, :mod:`pyopencl` and
+# the code generation machinery, which dominates the time taken by
+# ``import sumpy``. They (and the code caches) are therefore only loaded on
+# first access, see :pep:`562`.
+_LAZY_ATTRIBUTES = {
+    "E2EFromCSR": "sumpy.e2e",
+    "E2EFromChildren": "sumpy.e2e",
+    "E2EFromParent": "sumpy.e2e",
+    "M2LGenerateTranslationClassesDependentData": "sumpy.e2e",
+    "M2LPostprocessLocal": "sumpy.e2e",
+    "M2LPreprocessMultipole": "sumpy.e2e",
+    "M2LUsingTranslationClassesDependentData": "sumpy.e2e",
+    "E2PFromCSR": "sumpy.e2p",
+    "E2PFromSingleBox": "sumpy.e2p",
+    "P2EFromCSR": "sumpy.p2e",
+    "P2EFromSingleBox": "sumpy.p2e",
+    "P2P": "sumpy.p2p",
+    "P2PFromCSR": "sumpy.p2p",
+    }
+
+# Maps the name of a code cache to the prefix of its on-disk directory name.
+# :data:`binary_cache` maps a code cache key, the argument types and the
+# devices of a context to the compiled program binaries and the loopy invoker,
+# see :class:`sumpy.tools.BinaryCachingExecutor`. :data:`m2l_precompute_cache`
+# holds the translation-class dependent data of the levels of a tree, see
+# :attr:`sumpy.fmm.SumpyExpansionWrangler.persist_m2l_precompute`.
+# :data:`autotune_cache` holds the tuning parameters selected for a kernel on
+# a device, see :mod:`sumpy.autotune`. :data:`projection_matrix_cache` holds
+# the stored coefficients and unscaled projection matrices of the PDE-based
+# expansions, see
+# :class:`sumpy.expansion.LinearPDEBasedExpansionTermsWrangler`.
+_CODE_CACHES = {
+    "code_cache": "sumpy-code-cache-v6-",
+    "binary_cache": "sumpy-binary-cache-v1-",
+    "m2l_precompute_cache": "sumpy-m2l-precompute-cache-v1-",
+    "autotune_cache": "sumpy-autotune-cache-v1-",
+    "projection_matrix_cache": "sumpy-projection-matrix-cache-v1-",
+    }
+
+
+def __getattr__(name: str) -> Any:
+    if name in _LAZY_ATTRIBUTES:
+        import importlib
+        value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name]), name)
+    elif name in _CODE_CACHES:
+        from sumpy.cache import make_code_cache
+        from sumpy.version import VERSION_TEXT
+        value = make_code_cache(_CODE_CACHES[name] + VERSION_TEXT)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted({*globals(), *_LAZY_ATTRIBUTES, *_CODE_CACHES})
+
+# }}}
 
 
 # {{{ optimization control
@@ -85,6 +147,41 @@ def set_optimization_enabled(flag):
 # }}}
 
 
+# {{{ common subexpression elimination
+
+CSE_ENGINE = os.environ.get("SUMPY_CSE_ENGINE", "sympy")
+
+
+def set_cse_engine(engine):
+    """Set the engine used for common subexpression elimination in
+    :meth:`~sumpy.assignment_collection.SymbolicAssignmentCollection.run_global_cse`,
+    either ``"sympy"`` (the default, see :mod:`sumpy.cse`) or ``"dag"`` (see
+    :mod:`sumpy.dag_cse`).
+    """
+    if engine not in ("sympy", "dag"):
+        raise ValueError(f"unknown CSE engine: '{engine}'")
+
+    global CSE_ENGINE
+    CSE_ENGINE = engine
+
+# }}}
+
+
+# {{{ auto-tuning
+
+AUTOTUNE_ENABLED = "SUMPY_AUTOTUNE" in os.environ
+
+
+def set_autotuning_enabled(flag):
+    """Set whether kernels are benchmarked on first use to select their
+    tuning parameters, see :mod:`sumpy.autotune`.
+    """
+    global AUTOTUNE_ENABLED
+    AUTOTUNE_ENABLED = flag
+
+# }}}
+
+
 # {{{ cache control
 
 CACHING_ENABLED = True
@@ -179,14 +179,26 @@ class SymbolicAssignmentCollection:
         new_name = self.symbol_generator(name_base).name
         return self.add_assignment(new_name, expr, retain_name=False)
 
-    def run_global_cse(self, extra_exprs=None):
+    def run_global_cse(self, extra_exprs=None, engine=None):
+        """Perform common subexpression elimination on all assignments.
+
+        :arg extra_exprs: a list of additional expressions to include in the
+            elimination. Their reduced forms are returned.
+        :arg engine: ``"sympy"`` to use :func:`sumpy.cse.cse`, or ``"dag"``
+            to use :func:`sumpy.dag_cse.dag_cse`. Defaults to
+            :data:`sumpy.CSE_ENGINE`.
+        """
         if extra_exprs is None:
             extra_exprs = []
 
+        if engine is None:
+            from sumpy import CSE_ENGINE
+            engine = CSE_ENGINE
+
         import time
         start_time = time.time()
 
-        logger.info("common subexpression elimination: start")
+        logger.info("common subexpression elimination (%s): start", engine)
 
         assign_names = list(self.assignments.keys())
         assign_exprs = [self.assignments[name] for name in assign_names]
@@ -198,9 +210,19 @@ class SymbolicAssignmentCollection:
         # - sumpy.cse.cse: Based on sympy, designed to go faster.
         # from sumpy.symbolic import checked_cse
 
-        from sumpy.cse import cse
-        new_assignments, new_exprs = cse(assign_exprs + extra_exprs,
-                symbols=self.symbol_generator)
+        if engine == "sympy":
+            from sumpy.cse import cse
+        elif engine == "dag":
+            from sumpy.dag_cse import dag_cse as cse
+        else:
+            raise ValueError(f"unknown CSE engine: '{engine}'")
+
+        from sumpy.build_profile import build_phase
+        with build_phase("run_global_cse") as counts:
+            counts["nexprs"] = len(assign_exprs) + len(extra_exprs)
+            new_assignments, new_exprs = cse(assign_exprs + extra_exprs,
+                    symbols=self.symbol_generator)
+            counts["ncse_assignments"] = len(new_assignments)
 
         new_assign_exprs = new_exprs[:len(assign_exprs)]
         new_extra_exprs = new_exprs[len(assign_exprs):]
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+
+__copyright__ = "Copyright (C) 2024 University of Illinois Board of Trustees"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import logging
+import time
+from typing import TYPE_CHECKING, Any
+
+import pyopencl as cl
+
+import loopy as lp
+
+
+if TYPE_CHECKING:
+    from collections.abc import Hashable, Mapping
+
+    from sumpy.tools import KernelCacheMixin
+
+
+logger = logging.getLogger(__name__)
+
+
+__doc__ = """
+Kernel Auto-Tuning
+------------------
+
+The work-group sizes and blockings used by :class:`~sumpy.p2p.P2PFromCSR`
+and the P2E and E2P kernels (see :mod:`sumpy.p2e` and :mod:`sumpy.e2p`) are
+chosen by heuristics that do not suit every device. If auto-tuning is enabled
+through :func:`sumpy.set_autotuning_enabled` or by setting the environment
+variable ``SUMPY_AUTOTUNE``, each candidate of
+:meth:`~sumpy.tools.KernelCacheMixin.get_tuning_space` is benchmarked with the
+arguments of the first call of the kernel on a device. The fastest parameters
+are stored in :data:`sumpy.autotune_cache`, keyed on the code cache key of
+the kernel (see :meth:`~sumpy.tools.KernelCacheMixin.get_code_cache_key`) and
+the device, and used without benchmarking from then on.
+
+Benchmarking writes to copies of the output arguments, so the call that
+triggers it computes the same result as with auto-tuning disabled.
+
+.. autofunction:: find_best_parameters
+"""
+
+
+# Number of timed launches of each candidate, after an untimed one that
+# includes the compilation.
+NREPEATS = 3
+
+# Maps the hash of a key to the tuning parameters found in this process, also
+# used if caching is disabled.
+_TUNED_PARAMETERS: dict[str, dict[str, Hashable]] = {}
+
+
+def _copy_output(ary: Any) -> Any:
+    from pytools.obj_array import make_obj_array
+
+    from sumpy.tools import is_obj_array_like
+
+    if is_obj_array_like(ary):
+        return make_obj_array([subary.copy() for subary in ary])
+    else:
+        return ary.copy()
+
+
+def _time_executor(executor: lp.ExecutorBase,
+                   queue: cl.CommandQueue,
+                   call_kwargs: Mapping[str, Any]) -> float:
+    call_kwargs = {
+        name: _copy_output(value) if name in executor.output_names else value
+        for name, value in call_kwargs.items()}
+
+    executor(queue, **call_kwargs)
+    queue.finish()
+
+    timings = []
+    for _ in range(NREPEATS):
+        start = time.perf_counter()
+        executor(queue, **call_kwargs)
+        queue.finish()
+        timings.append(time.perf_counter() - start)
+
+    return min(timings)
+
+
+def find_best_parameters(
+        knl: KernelCacheMixin,
+        queue: cl.CommandQueue,
+        call_kwargs: Mapping[str, Any],
+        **kwargs: Hashable) -> dict[str, Hashable]:
+    """Find the fastest of the tuning parameters in
+    :meth:`~sumpy.tools.KernelCacheMixin.get_tuning_space` of *knl* on the
+    device of *queue*, benchmarking them if they are not cached.
+
+    :arg call_kwargs: the arguments that the kernel executor is called with.
+    :arg kwargs: the arguments of
+        :meth:`~sumpy.tools.KernelCacheMixin.get_cached_kernel_executor`.
+    :returns: a :class:`dict` of tuning parameters to be passed to
+        :meth:`~sumpy.tools.KernelCacheMixin.get_cached_kernel_executor`
+        in addition to *kwargs*.
+    """
+    tuning_space = knl.get_tuning_space(**kwargs)
+    if len(tuning_space) <= 1:
+        return {}
+
+    from sumpy import autotune_cache
+
+    device_id = queue.device.hashable_model_and_version_identifier
+    cache_key = knl.get_code_cache_key(**kwargs)
+    if cache_key is None:
+        key: Hashable = (
+            knl.get_cache_key() + tuple(sorted(kwargs.items())), device_id)
+    else:
+        key = (cache_key, device_id)
+
+    from pytools.persistent_dict import KeyBuilder
+    keyhash = KeyBuilder()(key)
+
+    try:
+        return _TUNED_PARAMETERS[keyhash]
+    except KeyError:
+        pass
+
+    if cache_key is not None:
+        try:
+            result = autotune_cache[key]
+        except KeyError:
+            pass
+        else:
+            logger.debug("%s: autotune cache hit [params=%s]", knl.name, result)
+            _TUNED_PARAMETERS[keyhash] = result
+            return result
+
+    timings = []
+    for params in tuning_space:
+        executor = knl._get_cached_kernel_executor(**kwargs, **params)
+        try:
+            timing = _time_executor(executor, queue, call_kwargs)
+        except (cl.Error, lp.LoopyError) as exc:
+            logger.info("%s: skipping tuning parameters %s: %s",
+                        knl.name, params, exc)
+            continue
+
+        logger.debug("%s: %s took %.3e s", knl.name, params, timing)
+        timings.append((timing, params))
+
+    if not timings:
+        raise RuntimeError(f"{knl.name}: no candidate tuning parameters ran")
+
+    _, result = min(timings, key=lambda timing_params: timing_params[0])
+    logger.info("%s: selected tuning parameters %s", knl.name, result)
+
+    _TUNED_PARAMETERS[keyhash] = result
+    if cache_key is not None:
+        autotune_cache.store_if_not_present(key, result)
+
+    return result
+
+# vim: foldmethod=marker
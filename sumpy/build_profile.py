@@ -0,0 +1,324 @@
+from __future__ import annotations
+
+
+__copyright__ = "Copyright (C) 2024 University of Illinois Board of Trustees"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import TYPE_CHECKING
+
+
+if TYPE_CHECKING:
+    from collections.abc import Generator
+
+    from typing_extensions import Self
+
+
+__doc__ = """
+Kernel Build Profiling
+----------------------
+
+Generating a kernel goes through several phases: building the symbolic
+expressions, common subexpression elimination, conversion to :mod:`loopy`
+instructions, :mod:`loopy` transformations and, on first use, scheduling, code
+generation and compilation. While a :class:`KernelBuildProfile` is active,
+the time (and optionally the peak memory) spent in each of these phases is
+recorded for every kernel.
+
+.. code-block:: python
+
+    from sumpy.build_profile import KernelBuildProfile
+
+    with KernelBuildProfile() as profile:
+        drive_fmm(wrangler, (weights,))
+
+    print(profile)
+    profile.to_json()
+
+.. autoclass:: PhaseRecord
+.. autoclass:: KernelBuildRecord
+.. autoclass:: KernelBuildProfile
+
+.. autofunction:: kernel_build
+.. autofunction:: build_phase
+"""
+
+
+# {{{ records
+
+@dataclass
+class PhaseRecord:
+    """
+    .. attribute:: name
+    .. attribute:: depth
+
+        Nesting depth of the phase within its kernel build. Times of nested
+        phases are included in those of the enclosing phases.
+
+    .. attribute:: elapsed
+
+        Wall time in seconds.
+
+    .. attribute:: peak_memory
+
+        Peak memory (in bytes) allocated by Python while in this phase, as
+        measured by :mod:`tracemalloc`, or *None* if memory is not traced.
+
+    .. attribute:: counts
+
+        A :class:`dict` of phase-specific counts, e.g. numbers of
+        expressions.
+    """
+
+    name: str
+    depth: int
+    elapsed: float = 0.0
+    peak_memory: int | None = None
+    counts: dict[str, int] = field(default_factory=dict)
+
+
+@dataclass
+class KernelBuildRecord:
+    """
+    .. attribute:: name
+
+        Name of the kernel.
+
+    .. attribute:: class_name
+
+        Name of the class generating the kernel.
+
+    .. attribute:: stage
+
+        ``"generate"`` for obtaining the :mod:`loopy` kernel in
+        :meth:`~sumpy.tools.KernelCacheMixin.get_cached_kernel_executor`, or
+        ``"compile"`` for turning it into device code on first use.
+
+    .. attribute:: cache_hit
+
+        Whether the result was found in :data:`sumpy.code_cache` (for
+        ``"generate"``) or :data:`sumpy.binary_cache` (for ``"compile"``), or
+        *None* if caching is disabled.
+
+    .. attribute:: elapsed
+    .. attribute:: peak_memory
+    .. attribute:: phases
+
+        A :class:`list` of :class:`PhaseRecord`.
+    """
+
+    name: str
+    class_name: str
+    stage: str
+    cache_hit: bool | None = None
+    elapsed: float = 0.0
+    peak_memory: int | None = None
+    phases: list[PhaseRecord] = field(default_factory=list)
+
+    def phase_elapsed(self, name: str) -> float:
+        """Total time spent in phases called *name*."""
+        return sum(phase.elapsed for phase in self.phases if phase.name == name)
+
+# }}}
+
+
+# {{{ profile
+
+class _Frame:
+    def __init__(self, record: KernelBuildRecord | PhaseRecord) -> None:
+        self.record = record
+        self.start = time.perf_counter()
+        self.peak_memory = 0
+
+
+_ACTIVE_PROFILES: list[KernelBuildProfile] = []
+
+
+class KernelBuildProfile:
+    """A context manager that collects a :class:`KernelBuildRecord` for each
+    kernel built while it is active.
+
+    .. attribute:: records
+
+    .. automethod:: to_json
+    .. automethod:: by_kernel
+    """
+
+    def __init__(self, trace_memory: bool = False) -> None:
+        """
+        :arg trace_memory: if *True*, use :mod:`tracemalloc` to record peak
+            memory. This slows down kernel generation noticeably.
+        """
+        self.trace_memory = trace_memory
+        self.records: list[KernelBuildRecord] = []
+
+        self._stack: list[_Frame] = []
+        self._started_tracemalloc = False
+
+    def __enter__(self) -> Self:
+        if self.trace_memory:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracemalloc = True
+
+        _ACTIVE_PROFILES.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        _ACTIVE_PROFILES.remove(self)
+
+        if self._started_tracemalloc:
+            import tracemalloc
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    # {{{ frame handling
+
+    def _current_peak_memory(self) -> int | None:
+        if not self.trace_memory:
+            return None
+
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            return None
+
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+
+        # the peak was reached while all frames on the stack were active
+        for frame in self._stack:
+            frame.peak_memory = max(frame.peak_memory, peak)
+
+        return peak
+
+    def _push(self, record: KernelBuildRecord | PhaseRecord) -> None:
+        self._current_peak_memory()
+        self._stack.append(_Frame(record))
+
+    def _pop(self) -> None:
+        self._current_peak_memory()
+        frame = self._stack.pop()
+
+        frame.record.elapsed = time.perf_counter() - frame.start
+        if self.trace_memory:
+            frame.record.peak_memory = frame.peak_memory
+
+    def _current_kernel_record(self) -> KernelBuildRecord | None:
+        for frame in reversed(self._stack):
+            if isinstance(frame.record, KernelBuildRecord):
+                return frame.record
+
+        return None
+
+    # }}}
+
+    def by_kernel(self) -> dict[tuple[str, str], float]:
+        """
+        :returns: a mapping from ``(class_name, stage)`` to the total time
+            spent building kernels of that class, most expensive first.
+        """
+        result: dict[tuple[str, str], float] = {}
+        for rec in self.records:
+            key = (rec.class_name, rec.stage)
+            result[key] = result.get(key, 0) + rec.elapsed
+
+        return dict(sorted(result.items(), key=lambda kv: kv[1], reverse=True))
+
+    def to_json(self) -> str:
+        import json
+        return json.dumps([asdict(rec) for rec in self.records], indent=2)
+
+    def __str__(self) -> str:
+        lines = []
+        for rec in self.records:
+            cached = {None: "-", True: "hit", False: "miss"}[rec.cache_hit]
+            lines.append(f"{rec.name} [{rec.class_name}, {rec.stage}, "
+                         f"cache {cached}]: {rec.elapsed:.3f}s")
+            for phase in rec.phases:
+                counts = ", ".join(f"{k}={v}" for k, v in phase.counts.items())
+                lines.append(f"{'  ' * (phase.depth + 1)}{phase.name}: "
+                             f"{phase.elapsed:.3f}s"
+                             + (f" ({counts})" if counts else ""))
+
+        return "\n".join(lines)
+
+# }}}
+
+
+# {{{ instrumentation
+
+@contextmanager
+def kernel_build(name: str, class_name: str,
+                 stage: str) -> Generator[KernelBuildRecord | None, None, None]:
+    """Record the build of a kernel in the innermost active
+    :class:`KernelBuildProfile`. Yields a :class:`KernelBuildRecord` on
+    which, for example, :attr:`KernelBuildRecord.cache_hit` may be set, or
+    *None* if no profile is active.
+    """
+    if not _ACTIVE_PROFILES:
+        yield None
+        return
+
+    profile = _ACTIVE_PROFILES[-1]
+    record = KernelBuildRecord(name=name, class_name=class_name, stage=stage)
+    profile._push(record)
+
+    try:
+        yield record
+    finally:
+        profile._pop()
+        profile.records.append(record)
+
+
+@contextmanager
+def build_phase(name: str) -> Generator[dict[str, int], None, None]:
+    """Record a phase of the current kernel build in the innermost active
+    :class:`KernelBuildProfile`. Yields a :class:`dict` into which counts
+    for :attr:`PhaseRecord.counts` may be entered.
+
+    This may also be used as a function decorator.
+    """
+    counts: dict[str, int] = {}
+
+    profile = _ACTIVE_PROFILES[-1] if _ACTIVE_PROFILES else None
+    kernel_record = (
+        None if profile is None else profile._current_kernel_record())
+    if profile is None or kernel_record is None:
+        yield counts
+        return
+
+    record = PhaseRecord(name=name, depth=len(profile._stack) - 1)
+    kernel_record.phases.append(record)
+    profile._push(record)
+
+    try:
+        yield counts
+    finally:
+        record.counts.update(counts)
+        profile._pop()
+
+# }}}
+
+# vim: foldmethod=marker
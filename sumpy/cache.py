@@ -0,0 +1,377 @@
+from __future__ import annotations
+
+
+__copyright__ = "Copyright (C) 2024 University of Illinois Board of Trustees"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, TypeVar
+
+from pytools.persistent_dict import WriteOncePersistentDict
+
+
+if TYPE_CHECKING:
+    from collections.abc import Hashable, Iterable, Sequence
+
+
+logger = logging.getLogger(__name__)
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+__doc__ = """
+Code Cache Management
+---------------------
+
+:data:`sumpy.code_cache`, :data:`sumpy.binary_cache`,
+:data:`sumpy.m2l_precompute_cache` and :data:`sumpy.autotune_cache` are
+instances of :class:`SumpyCodeCache`, which keeps track of the size and the
+last access time of each entry. If the environment variable
+``SUMPY_CODE_CACHE_MAX_SIZE`` is set (in bytes, with an optional suffix of
+``K``, ``M`` or ``G``), the least recently used entries are evicted once the
+size of a cache exceeds it.
+
+The caches can be inspected and managed from the command line through
+``python -m sumpy.manage_cache``, see ``python -m sumpy.manage_cache --help``.
+
+.. autoclass:: CacheEntryInfo
+.. autoclass:: SumpyCodeCache
+"""
+
+
+# {{{ key introspection
+
+def _describe_key(key: Any) -> tuple[str | None, int | None, str | None]:
+    """Extract a kernel class name, an order and the kernel version from a
+    key of the form used by
+    :meth:`sumpy.tools.KernelCacheMixin.get_code_cache_key`.
+    """
+    # keys of the binary cache wrap the code cache key
+    while isinstance(key, tuple) and key and isinstance(key[0], tuple):
+        key = key[0]
+
+    if not isinstance(key, tuple) or len(key) < 3:
+        return None, None, None
+
+    name = key[0] if isinstance(key[0], str) else None
+
+    order = None
+    for entry in key:
+        entry_order = getattr(entry, "order", None)
+        if isinstance(entry_order, int):
+            order = entry_order
+
+    return name, order, repr(key[-2])
+
+
+def parse_size(size: str) -> int:
+    """Parse a size in bytes with an optional suffix of ``K``, ``M`` or ``G``
+    (powers of 1024).
+    """
+    size = size.strip().upper().removesuffix("B")
+    factors = {"K": 2**10, "M": 2**20, "G": 2**30}
+    if size and size[-1] in factors:
+        return int(float(size[:-1]) * factors[size[-1]])
+    else:
+        return int(size)
+
+# }}}
+
+
+# {{{ cache
+
+@dataclass(frozen=True)
+class CacheEntryInfo:
+    """
+    .. attribute:: keyhash
+    .. attribute:: name
+
+        The name of the :class:`~sumpy.tools.KernelCacheMixin` subclass that
+        generated the entry, if known.
+
+    .. attribute:: order
+
+        The order of the (target) expansion, if any.
+
+    .. attribute:: kernel_version
+
+        A string representation of :data:`sumpy.version.KERNEL_VERSION` at
+        the time the entry was stored.
+
+    .. attribute:: nbytes
+    .. attribute:: created
+    .. attribute:: last_access
+
+        Times in seconds since the epoch. The access time is updated at most
+        once per process.
+    """
+
+    keyhash: str
+    name: str | None
+    order: int | None
+    kernel_version: str | None
+    nbytes: int
+    created: float
+    last_access: float
+
+
+class SumpyCodeCache(WriteOncePersistentDict[K, V]):
+    """A :class:`~pytools.persistent_dict.WriteOncePersistentDict` that
+    records the size and the last access time of its entries, so that it can
+    be bounded in size and pruned.
+
+    .. attribute:: max_size
+
+        The maximum total size of the entries in bytes, or *None*.
+
+    .. automethod:: entries
+    .. automethod:: total_size
+    .. automethod:: remove_entries
+    .. automethod:: evict
+    .. automethod:: prune_stale
+    .. automethod:: export_bundle
+    .. automethod:: import_bundle
+    """
+
+    def __init__(self, identifier: str, *,
+                 max_size: int | None = None,
+                 **kwargs: Any) -> None:
+        super().__init__(identifier, **kwargs)
+
+        self.max_size = max_size
+        self._exec_sql(
+            "CREATE TABLE IF NOT EXISTS sumpy_entry_info "
+            "(keyhash TEXT NOT NULL PRIMARY KEY, name TEXT, order_ INTEGER, "
+            "kernel_version TEXT, nbytes INTEGER NOT NULL, "
+            "created REAL NOT NULL, last_access REAL NOT NULL)")
+
+    # {{{ bookkeeping
+
+    def store(self, key: K, value: V, _skip_if_present: bool = False) -> None:
+        super().store(key, value, _skip_if_present=_skip_if_present)
+
+        keyhash = self.key_builder(key)
+        name, order, kernel_version = _describe_key(key)
+        now = time.time()
+        self._exec_sql(
+            "INSERT OR IGNORE INTO sumpy_entry_info "
+            "SELECT keyhash, ?, ?, ?, length(key_value), ?, ? FROM dict "
+            "WHERE keyhash=?",
+            (name, order, kernel_version, now, now, keyhash))
+
+        if self.max_size is not None:
+            self.evict(self.max_size)
+
+    def _fetch_uncached(self, keyhash: str) -> tuple[K, V]:
+        result = super()._fetch_uncached(keyhash)
+
+        self._exec_sql(
+            "UPDATE sumpy_entry_info SET last_access=? WHERE keyhash=?",
+            (time.time(), keyhash))
+
+        return result
+
+    def _add_missing_entry_info(self) -> None:
+        # Entries may have been stored by a version of sumpy that did not
+        # record their info or imported from a bundle.
+        import pickle
+
+        rows = list(self._exec_sql(
+            "SELECT keyhash, key_value FROM dict WHERE keyhash NOT IN "
+            "(SELECT keyhash FROM sumpy_entry_info)"))
+
+        now = time.time()
+        for keyhash, key_value in rows:
+            try:
+                key, _ = pickle.loads(key_value)
+            except (pickle.UnpicklingError, AttributeError, ImportError):
+                name, order, kernel_version = None, None, None
+            else:
+                name, order, kernel_version = _describe_key(key)
+
+            self._exec_sql(
+                "INSERT OR IGNORE INTO sumpy_entry_info VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (keyhash, name, order, kernel_version, len(key_value), now, now))
+
+    # }}}
+
+    def entries(self) -> list[CacheEntryInfo]:
+        """
+        :returns: a :class:`list` of :class:`CacheEntryInfo` for all entries,
+            least recently used first.
+        """
+        self._add_missing_entry_info()
+        return [CacheEntryInfo(*row) for row in self._exec_sql(
+            "SELECT keyhash, name, order_, kernel_version, nbytes, created, "
+            "last_access FROM sumpy_entry_info ORDER BY last_access")]
+
+    def total_size(self) -> int:
+        """
+        :returns: the total size of all entries in bytes. Unlike
+            :meth:`~pytools.persistent_dict.WriteOncePersistentDict.nbytes`,
+            this does not include the overhead of the database.
+        """
+        self._add_missing_entry_info()
+        result, = next(self._exec_sql(
+            "SELECT COALESCE(SUM(nbytes), 0) FROM sumpy_entry_info"))
+        return result
+
+    def remove_entries(self, keyhashes: Iterable[str]) -> int:
+        """Remove the entries with the given key hashes.
+
+        :returns: the number of removed entries.
+        """
+        count = 0
+        for keyhash in keyhashes:
+            self._exec_sql("DELETE FROM dict WHERE keyhash=?", (keyhash,))
+            self._exec_sql("DELETE FROM sumpy_entry_info WHERE keyhash=?",
+                           (keyhash,))
+            count += 1
+
+        if count:
+            self.clear_in_mem_cache()
+
+        return count
+
+    def evict(self, max_size: int) -> int:
+        """Remove the least recently used entries until the total size is
+        at most *max_size* bytes.
+
+        :returns: the number of removed entries.
+        """
+        total_size = self.total_size()
+        if total_size <= max_size:
+            return 0
+
+        to_remove = []
+        for entry in self.entries():
+            if total_size <= max_size:
+                break
+            to_remove.append(entry.keyhash)
+            total_size -= entry.nbytes
+
+        logger.info("%s: evicting %d entries", self.identifier, len(to_remove))
+        return self.remove_entries(to_remove)
+
+    def prune_stale(self, kernel_version: Hashable | None = None) -> int:
+        """Remove all entries that were stored with a kernel version
+        different from *kernel_version*, which defaults to the current
+        :data:`sumpy.version.KERNEL_VERSION`.
+
+        :returns: the number of removed entries.
+        """
+        if kernel_version is None:
+            from sumpy.version import KERNEL_VERSION
+            kernel_version = KERNEL_VERSION
+
+        current = repr(kernel_version)
+        return self.remove_entries(
+            entry.keyhash for entry in self.entries()
+            if entry.kernel_version is not None
+            and entry.kernel_version != current)
+
+    def export_bundle(self, filename: str,
+                      names: Sequence[str] | None = None) -> int:
+        """Copy the entries of this cache into the bundle *filename*, which is
+        created if it does not exist. A bundle can hold entries of several
+        caches.
+
+        :arg names: if given, only entries generated by one of these
+            :class:`~sumpy.tools.KernelCacheMixin` subclasses are exported.
+        :returns: the number of exported entries.
+        """
+        import sqlite3
+
+        self._add_missing_entry_info()
+
+        if names is None:
+            query = "SELECT keyhash, key_value FROM dict"
+            params: tuple[str, ...] = ()
+        else:
+            query = (
+                "SELECT keyhash, key_value FROM dict WHERE keyhash IN "
+                "(SELECT keyhash FROM sumpy_entry_info WHERE name IN "
+                f"({', '.join('?' * len(names))}))")
+            params = tuple(names)
+
+        rows = list(self._exec_sql(query, params))
+
+        with sqlite3.connect(filename) as bundle:
+            bundle.execute(
+                "CREATE TABLE IF NOT EXISTS bundle "
+                "(cache TEXT NOT NULL, keyhash TEXT NOT NULL, "
+                "key_value TEXT NOT NULL, PRIMARY KEY (cache, keyhash))")
+            bundle.executemany(
+                "INSERT OR IGNORE INTO bundle VALUES (?, ?, ?)",
+                [(self.identifier, keyhash, key_value)
+                 for keyhash, key_value in rows])
+        bundle.close()
+
+        return len(rows)
+
+    def import_bundle(self, filename: str) -> int:
+        """Copy the entries for this cache from the bundle *filename* (see
+        :meth:`export_bundle`). Entries for other caches, e.g. from a
+        different version of :mod:`sumpy`, are ignored.
+
+        :returns: the number of entries found in the bundle for this cache.
+        """
+        import sqlite3
+
+        with sqlite3.connect(filename) as bundle:
+            rows = bundle.execute(
+                "SELECT keyhash, key_value FROM bundle WHERE cache=?",
+                (self.identifier,)).fetchall()
+        bundle.close()
+
+        for keyhash, key_value in rows:
+            self._exec_sql("INSERT OR IGNORE INTO dict VALUES (?, ?)",
+                           (keyhash, key_value))
+
+        self._add_missing_entry_info()
+        if self.max_size is not None:
+            self.evict(self.max_size)
+
+        return len(rows)
+
+    def clear(self) -> None:
+        super().clear()
+        self._exec_sql("DELETE FROM sumpy_entry_info")
+
+
+def make_code_cache(identifier: str) -> SumpyCodeCache[Any, Any]:
+    """Create a :class:`SumpyCodeCache` with the maximum size taken from the
+    environment variable ``SUMPY_CODE_CACHE_MAX_SIZE``.
+    """
+    max_size = os.environ.get("SUMPY_CODE_CACHE_MAX_SIZE")
+    return SumpyCodeCache(
+        identifier,
+        max_size=None if max_size is None else parse_size(max_size),
+        safe_sync=False)
+
+# }}}
+
+# vim: foldmethod=marker
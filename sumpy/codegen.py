@@ -685,6 +685,17 @@ def combine_mappers(*mappers):
 
 def to_loopy_insns(assignments, vector_names=frozenset(), pymbolic_expr_maps=(),
                    complex_dtype=None, retain_names=frozenset()):
+    from sumpy.build_profile import build_phase
+    with build_phase("to_loopy_insns") as counts:
+        result = _to_loopy_insns(assignments, vector_names, pymbolic_expr_maps,
+                                 complex_dtype, retain_names)
+        counts["ninsns"] = len(result)
+
+    return result
+
+
+def _to_loopy_insns(assignments, vector_names, pymbolic_expr_maps,
+                    complex_dtype, retain_names):
     logger.info("loopy instruction generation: start")
     assignments = list(assignments)
 
@@ -0,0 +1,401 @@
+from __future__ import annotations
+
+
+__copyright__ = "Copyright (C) 2024 University of Illinois Board of Trustees"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+from collections import Counter
+from typing import TYPE_CHECKING, Any
+
+from sumpy.symbolic import (
+    Add,
+    Basic,
+    Derivative,
+    Integer,
+    Mul,
+    Pow,
+    Subs,
+    Symbol,
+    _coeff_isneg,
+)
+
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Hashable, Iterable, Iterator
+
+
+__doc__ = """
+DAG-based common subexpression elimination
+------------------------------------------
+
+An alternative to :func:`sumpy.cse.cse` whose cost grows (nearly) linearly
+with the size of the expressions. The expressions are hash-consed into a
+directed acyclic graph, in which structurally equal subexpressions are
+represented by a single node. Any node with more than one use is then
+assigned to a temporary.
+
+In addition to exact matches, this finds
+
+* subexpressions that only differ in sign, and powers that only differ in
+  the sign of the exponent,
+* common subsets of the arguments of sums and products, where each sum or
+  product is only compared with the *max_candidates* most recently seen ones
+  sharing an argument, and
+* pairs of arguments that several sums or products (with at most
+  *max_pair_arity* arguments) have in common.
+
+The graph is built directly from the (:mod:`sympy` or :mod:`symengine`)
+expressions, so that the result can be used in place of that of
+:func:`sumpy.cse.cse`. Since the search for common subsets is bounded, the
+result may contain a few more operations than that of :func:`sumpy.cse.cse`,
+whose cost grows superlinearly with the number of sums and products.
+
+.. autofunction:: dag_cse
+"""
+
+
+# Don't CSE child nodes of these classes.
+CSE_NO_DESCEND_CLASSES = (Derivative, Subs)
+
+
+class _ExpressionDAG:
+    """Nodes are numbered consecutively. A node has a *func* and a tuple of
+    argument node numbers; leaves have *func* set to *None* and store their
+    expression.
+    """
+
+    def __init__(self) -> None:
+        self.funcs: list[Callable[..., Any] | None] = []
+        self.args: list[tuple[int, ...]] = []
+        self.exprs: list[Any] = []
+
+        self.key_to_node: dict[Hashable, int] = {}
+        self.expr_to_node: dict[Any, int] = {}
+        self.symbols: set[Any] = set()
+
+    def intern(self, func, args, expr=None, key=None) -> int:
+        if key is None:
+            if func is Add or func is Mul:
+                key = (func, tuple(sorted(args)))
+            else:
+                key = (func, args)
+
+        try:
+            return self.key_to_node[key]
+        except KeyError:
+            pass
+
+        node = len(self.funcs)
+        self.funcs.append(func)
+        self.args.append(args)
+        self.exprs.append(expr)
+        self.key_to_node[key] = node
+
+        return node
+
+    def add(self, expr) -> int:
+        try:
+            return self.expr_to_node[expr]
+        except KeyError:
+            pass
+
+        if expr.is_Atom or isinstance(expr, CSE_NO_DESCEND_CLASSES):
+            if expr.is_Symbol:
+                self.symbols.add(expr)
+            node = self.intern(None, (), expr, key=(None, expr))
+
+        elif self._is_negated(expr):
+            node = self.intern(Mul, (self.add(Integer(-1)), self.add(-expr)),
+                               expr)
+
+        elif (isinstance(expr, Pow) and _coeff_isneg(expr.exp)
+                and expr.exp != -1):
+            base, exp = expr.args
+            node = self.intern(Pow, (self.add(Pow(base, -exp)),
+                                     self.add(Integer(-1))), expr)
+
+        else:
+            node = self.intern(expr.func, tuple(self.add(arg) for arg in expr.args),
+                               expr)
+
+        self.expr_to_node[expr] = node
+        return node
+
+    def _is_negated(self, expr) -> bool:
+        """Whether *expr* is to be represented as the negation of ``-expr``,
+        so that both share a node.
+        """
+        if _coeff_isneg(expr):
+            return not (-expr).is_Atom
+
+        # Negating a sum changes the signs of its terms, which may hide
+        # common subexpressions among them, so only do this if the negated
+        # sum has been seen before.
+        return isinstance(expr, Add) and (-expr) in self.expr_to_node
+
+    def is_leaf(self, node: int) -> bool:
+        return self.funcs[node] is None
+
+    def is_number(self, node: int) -> bool:
+        return self.is_leaf(node) and self.exprs[node].is_Number
+
+
+# {{{ common argument subsets
+
+def _factor_common_subsets(dag: _ExpressionDAG, nodes: list[int],
+                           max_candidates: int) -> None:
+    """Rewrite sums and products that have at least two arguments in common
+    with another sum or product in terms of a node for the common arguments.
+    Only the *max_candidates* most recently visited nodes containing an
+    argument are considered, which bounds the cost per argument.
+    """
+    # current arguments of the nodes
+    node_to_args = {node: frozenset(dag.args[node]) for node in nodes}
+
+    # maps (func, arg) to the nodes containing arg
+    index: dict[tuple[Any, int], list[int]] = {}
+
+    def add_to_index(node):
+        for arg in node_to_args[node]:
+            index.setdefault((dag.funcs[node], arg), []).append(node)
+
+    def set_args(node, args):
+        for arg in args - node_to_args[node]:
+            index.setdefault((dag.funcs[node], arg), []).append(node)
+
+        node_to_args[node] = args
+        dag.args[node] = tuple(sorted(args))
+        dag.exprs[node] = None
+
+    for node in sorted(nodes, key=lambda node: len(node_to_args[node])):
+        func = dag.funcs[node]
+        args = node_to_args[node]
+
+        # Factoring out common arguments may expose further common subsets,
+        # so repeat until nothing changes.
+        changed = True
+        while changed and len(args) >= 2:
+            changed = False
+
+            nhits: Counter[int] = Counter()
+            for arg in args:
+                nhits.update(index.get((func, arg), ())[-max_candidates:])
+
+            for other, count in nhits.most_common():
+                if count < 2 or len(args) < 2:
+                    break
+
+                other_args = node_to_args[other]
+                common_args = args & other_args
+                if len(common_args) < 2 or common_args == args:
+                    continue
+
+                if common_args == other_args:
+                    # all of other's arguments are contained in node's
+                    common = other
+                else:
+                    common = dag.intern(func, tuple(sorted(common_args)))
+                    if common in (node, other):
+                        continue
+
+                    if common not in node_to_args:
+                        node_to_args[common] = common_args
+                        add_to_index(common)
+
+                    set_args(other, (other_args - common_args) | {common})
+
+                args = (args - common_args) | {common}
+                changed = True
+
+        if args != node_to_args[node]:
+            set_args(node, args)
+
+        add_to_index(node)
+
+# }}}
+
+
+# {{{ common argument pairs
+
+def _factor_common_pairs(dag: _ExpressionDAG, nodes: list[int],
+                         max_pair_arity: int) -> None:
+    """Assign pairs of arguments that several sums or products have in common
+    to new nodes.
+    """
+    def get_candidate_args(node):
+        return sorted(set(dag.args[node]))
+
+    nodes = [node for node in nodes
+             if 2 <= len(dag.args[node]) <= max_pair_arity]
+
+    pair_counts: Counter[tuple[Any, int, int]] = Counter()
+    for node in nodes:
+        func = dag.funcs[node]
+        args = get_candidate_args(node)
+        for i, arg_i in enumerate(args):
+            for arg_j in args[i+1:]:
+                pair_counts[func, arg_i, arg_j] += 1
+
+    for node in nodes:
+        func = dag.funcs[node]
+        args = get_candidate_args(node)
+        if len(args) < 3:
+            continue
+
+        pairs = sorted(
+            ((pair_counts[func, arg_i, arg_j], arg_i, arg_j)
+             for i, arg_i in enumerate(args) for arg_j in args[i+1:]),
+            reverse=True)
+
+        taken: set[int] = set()
+        new_args = list(dag.args[node])
+        for count, arg_i, arg_j in pairs:
+            if count < 2:
+                break
+            if arg_i in taken or arg_j in taken:
+                continue
+            if len(new_args) <= 2:
+                break
+
+            taken.update((arg_i, arg_j))
+            new_args.remove(arg_i)
+            new_args.remove(arg_j)
+            new_args.append(dag.intern(func, (arg_i, arg_j)))
+
+        if taken:
+            dag.args[node] = tuple(new_args)
+            dag.exprs[node] = None
+
+# }}}
+
+
+def _postorder(dag: _ExpressionDAG, roots: Iterable[int]) -> Iterator[int]:
+    visited: set[int] = set()
+    for root in roots:
+        if root in visited:
+            continue
+
+        visited.add(root)
+        stack = [(root, iter(dag.args[root]))]
+        while stack:
+            node, args_iter = stack[-1]
+            for arg in args_iter:
+                if arg not in visited:
+                    visited.add(arg)
+                    stack.append((arg, iter(dag.args[arg])))
+                    break
+            else:
+                stack.pop()
+                yield node
+
+
+def dag_cse(exprs, symbols=None, *,
+            max_candidates: int = 32, max_pair_arity: int = 8):
+    """Perform common subexpression elimination on *exprs*. The interface is
+    the same as that of :func:`sumpy.cse.cse`.
+
+    :arg symbols: an infinite iterator yielding unique symbols used to label
+        the common subexpressions.
+    :arg max_candidates: the number of sums or products containing a given
+        argument that are compared with each sum or product when looking for
+        common subsets of arguments. Set to zero to disable this search.
+    :arg max_pair_arity: the maximum number of arguments of a sum or product
+        for which common pairs of arguments are looked for. The cost of this
+        grows quadratically with *max_pair_arity*.
+
+    :returns: a tuple ``(replacements, reduced_exprs)``, see
+        :func:`sumpy.cse.cse`.
+    """
+    if isinstance(exprs, Basic):
+        exprs = [exprs]
+
+    exprs = list(exprs)
+
+    if symbols is None:
+        from sympy.utilities.iterables import numbered_symbols
+        symbols = numbered_symbols(cls=Symbol)
+    else:
+        symbols = iter(symbols)
+
+    dag = _ExpressionDAG()
+    roots = [dag.add(expr) for expr in exprs if isinstance(expr, Basic)]
+
+    nodes = [node for node in _postorder(dag, roots)
+             if dag.funcs[node] is Add or dag.funcs[node] is Mul]
+    if max_candidates > 0:
+        _factor_common_subsets(dag, nodes, max_candidates)
+    if max_pair_arity >= 2:
+        _factor_common_pairs(dag, nodes, max_pair_arity)
+
+    # {{{ count uses
+
+    nuses = [0] * len(dag.funcs)
+    for root in roots:
+        nuses[root] += 1
+
+    order = list(_postorder(dag, roots))
+    for node in order:
+        for arg in dag.args[node]:
+            nuses[arg] += 1
+
+    # }}}
+
+    # {{{ rebuild expressions
+
+    symbols = (symbol for symbol in symbols if symbol not in dag.symbols)
+
+    replacements = []
+    node_to_expr: dict[int, Any] = {}
+    for node in order:
+        if dag.is_leaf(node):
+            expr = dag.exprs[node]
+        else:
+            args = [node_to_expr[arg] for arg in dag.args[node]]
+            orig_expr = dag.exprs[node]
+            if orig_expr is not None and all(
+                    new_arg is dag.exprs[arg]
+                    for new_arg, arg in zip(args, dag.args[node], strict=True)):
+                expr = orig_expr
+            else:
+                expr = dag.funcs[node](*args)
+
+        if nuses[node] > 1 and not expr.is_Atom:
+            try:
+                symbol = next(symbols)
+            except StopIteration:
+                raise ValueError("Symbols iterator ran out of symbols.") from None
+
+            replacements.append((symbol, expr))
+            expr = symbol
+
+        node_to_expr[node] = expr
+
+    # }}}
+
+    root_iter = iter(roots)
+    reduced_exprs = [
+        node_to_expr[next(root_iter)] if isinstance(expr, Basic) else expr
+        for expr in exprs]
+
+    return replacements, reduced_exprs
+
+# vim: foldmethod=marker
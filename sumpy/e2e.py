@@ -34,6 +34,7 @@ from loopy.version import MOST_RECENT_LANGUAGE_VERSION
 from pytools import memoize_method
 
 import sumpy.symbolic as sym
+from sumpy.build_profile import build_phase
 from sumpy.codegen import register_optimization_preambles
 from sumpy.tools import KernelCacheMixin, to_complex_dtype
 
@@ -110,6 +111,7 @@ class E2EBase(KernelCacheMixin, ABC):
         pass
 
     @memoize_method
+    @build_phase("get_translation_loopy_insns")
     def get_translation_loopy_insns(self):
         from sumpy.symbolic import make_sym_vector
         dvec = make_sym_vector("d", self.dim)
@@ -178,6 +180,7 @@ class E2EFromCSR(E2EBase):
     def default_name(self):
         return "e2e_from_csr"
 
+    @build_phase("get_translation_loopy_insns")
     def get_translation_loopy_insns(self):
         from sumpy.symbolic import make_sym_vector
         dvec = make_sym_vector("d", self.dim)
@@ -327,6 +330,7 @@ class M2LUsingTranslationClassesDependentData(E2EFromCSR):
     def default_name(self):
         return "m2l_using_translation_classes_dependent_data"
 
+    @build_phase("get_translation_loopy_insns")
     def get_translation_loopy_insns(self, result_dtype):
         from sumpy.symbolic import make_sym_vector
         dvec = make_sym_vector("d", self.dim)
@@ -546,11 +550,14 @@ class M2LUsingTranslationClassesDependentData(E2EFromCSR):
         :arg centers:
         """
         centers = kwargs.pop("centers")
-        # "1" may be passed for rscale, which won't have its type
-        # meaningfully inferred. Make the type of rscale explicit.
-        src_rscale = centers.dtype.type(kwargs.pop("src_rscale"))
-        tgt_rscale = centers.dtype.type(kwargs.pop("tgt_rscale"))
         src_expansions = kwargs.pop("src_expansions")
+        # "1" may be passed for rscale, which won't have its type
+        # meaningfully inferred. Make the type of rscale explicit, and match
+        # it to the expansions so that the translation is computed in their
+        # precision.
+        rscale_dtype = np.finfo(src_expansions.dtype).dtype
+        src_rscale = rscale_dtype.type(kwargs.pop("src_rscale"))
+        tgt_rscale = rscale_dtype.type(kwargs.pop("tgt_rscale"))
 
         knl = self.get_cached_kernel_executor(result_dtype=src_expansions.dtype)
 
@@ -580,6 +587,10 @@ class M2LGenerateTranslationClassesDependentData(E2EBase):
             m2l_translation.loopy_translation_classes_dependent_data(
                 self.tgt_expansion, self.src_expansion, result_dtype)
 
+        # The translation vectors are converted to the (real) type of the
+        # result, so that the data is computed in its precision.
+        vector_dtype = np.finfo(result_dtype).dtype
+
         from sumpy.tools import gather_loopy_arguments
         loopy_knl = lp.make_kernel(
                 [
@@ -587,17 +598,17 @@ class M2LGenerateTranslationClassesDependentData(E2EBase):
                     "{[idim]: 0<=idim<dim}",
                     "{[idata]: 0<=idata<m2l_translation_classes_dependent_ndata}",
                     ],
-                ["""
+                [f"""
                 for itr_class
-                    <> d[idim] = m2l_translation_vectors[idim, \
+                    <{vector_dtype.name}> d[idim] = m2l_translation_vectors[idim, \
                             itr_class + translation_classes_level_start] \
-                            {id=set_d,dup=idim}
+                            {{id=set_d,dup=idim}}
                     [idata]: m2l_translation_classes_dependent_data[
                             itr_class, idata] = \
                         m2l_data(
                             src_rscale,
                             [idim]: d[idim],
-                        ) {id=update,dep=set_d}
+                        ) {{id=update,dep=set_d}}
                 end
                 """],
                 [
@@ -656,14 +667,14 @@ class M2LGenerateTranslationClassesDependentData(E2EBase):
         :arg m2l_translation_vectors:
         """
         m2l_translation_vectors = kwargs.pop("m2l_translation_vectors")
-        # "1" may be passed for rscale, which won't have its type
-        # meaningfully inferred. Make the type of rscale explicit.
-        src_rscale = m2l_translation_vectors.dtype.type(kwargs.pop("src_rscale"))
-
         m2l_translation_classes_dependent_data = kwargs.pop(
                 "m2l_translation_classes_dependent_data")
         result_dtype = m2l_translation_classes_dependent_data.dtype
 
+        # "1" may be passed for rscale, which won't have its type
+        # meaningfully inferred. Make the type of rscale explicit.
+        src_rscale = np.finfo(result_dtype).dtype.type(kwargs.pop("src_rscale"))
+
         knl = self.get_cached_kernel_executor(result_dtype=result_dtype)
 
         return knl(queue,
@@ -760,10 +771,14 @@ class M2LPreprocessMultipole(E2EBase):
         """
         preprocessed_src_expansions = kwargs.pop("preprocessed_src_expansions")
         result_dtype = preprocessed_src_expansions.dtype
+        # Make the type of rscale explicit, see
+        # M2LUsingTranslationClassesDependentData.__call__.
+        src_rscale = np.finfo(result_dtype).dtype.type(kwargs.pop("src_rscale"))
         knl = self.get_cached_kernel_executor(result_dtype=result_dtype)
 
         return knl(queue,
-                preprocessed_src_expansions=preprocessed_src_expansions, **kwargs)
+                preprocessed_src_expansions=preprocessed_src_expansions,
+                src_rscale=src_rscale, **kwargs)
 
 # }}}
 
@@ -861,9 +876,15 @@ class M2LPostprocessLocal(E2EBase):
         """
         tgt_expansions = kwargs.pop("tgt_expansions")
         result_dtype = tgt_expansions.dtype
+        # Make the type of rscale explicit, see
+        # M2LUsingTranslationClassesDependentData.__call__.
+        rscale_dtype = np.finfo(result_dtype).dtype
+        src_rscale = rscale_dtype.type(kwargs.pop("src_rscale"))
+        tgt_rscale = rscale_dtype.type(kwargs.pop("tgt_rscale"))
         knl = self.get_cached_kernel_executor(result_dtype=result_dtype)
 
-        return knl(queue, tgt_expansions=tgt_expansions, **kwargs)
+        return knl(queue, tgt_expansions=tgt_expansions,
+                src_rscale=src_rscale, tgt_rscale=tgt_rscale, **kwargs)
 
 # }}}
 
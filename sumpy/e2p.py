@@ -30,6 +30,7 @@ import numpy as np
 import loopy as lp
 from loopy.version import MOST_RECENT_LANGUAGE_VERSION
 
+from sumpy.build_profile import build_phase
 from sumpy.codegen import register_optimization_preambles
 from sumpy.tools import KernelCacheMixin, gather_loopy_arguments
 
@@ -91,6 +92,7 @@ class E2PBase(KernelCacheMixin, ABC):
     def get_cache_key(self):
         return (type(self).__name__, self.expansion, tuple(self.kernels))
 
+    @build_phase("expansion_evaluation")
     def add_loopy_eval_callable(
             self, loopy_knl: lp.TranslationUnit) -> lp.TranslationUnit:
         inner_knl = self.expansion.loopy_evaluator(self.kernels)
@@ -105,6 +107,30 @@ class E2PBase(KernelCacheMixin, ABC):
     def get_loopy_args(self):
         return gather_loopy_arguments((self.expansion, *tuple(self.kernels)))
 
+    def get_tuning_space(self):
+        return [{}] + [
+            {"box_chunk_size": box_chunk_size}
+            for box_chunk_size in [4, 16]]
+
+    def get_optimized_kernel(self, box_chunk_size=None):
+        """
+        :arg box_chunk_size: the number of target boxes handled by a work
+            group. By default, each work group handles a single box.
+        """
+        # FIXME
+        knl = self.get_kernel()
+        knl = lp.add_inames_to_insn(knl, "itgt_box", "id:kernel_scaling")
+        if box_chunk_size is None:
+            knl = lp.tag_inames(knl, {"itgt_box": "g.0"})
+        else:
+            knl = lp.split_iname(knl, "itgt_box", box_chunk_size,
+                    outer_tag="g.0")
+        knl = lp.set_options(knl,
+                enforce_variable_access_ordered="no_check")
+        knl = register_optimization_preambles(knl, self.device)
+
+        return knl
+
     def get_kernel_scaling_assignment(self):
         from sumpy.symbolic import SympyToPymbolicMapper
         sympy_conv = SympyToPymbolicMapper()
@@ -198,17 +224,6 @@ class E2PFromSingleBox(E2PBase):
 
         return loopy_knl
 
-    def get_optimized_kernel(self):
-        # FIXME
-        knl = self.get_kernel()
-        knl = lp.tag_inames(knl, {"itgt_box": "g.0"})
-        knl = lp.add_inames_to_insn(knl, "itgt_box", "id:kernel_scaling")
-        knl = lp.set_options(knl,
-                enforce_variable_access_ordered="no_check")
-        knl = register_optimization_preambles(knl, self.device)
-
-        return knl
-
     def __call__(self, queue, **kwargs):
         """
         :arg expansions:
@@ -218,14 +233,13 @@ class E2PFromSingleBox(E2PBase):
         :arg centers:
         :arg targets:
         """
-        knl = self.get_cached_kernel_executor()
-
-        centers = kwargs.pop("centers")
         # "1" may be passed for rscale, which won't have its type
         # meaningfully inferred. Make the type of rscale explicit.
-        rscale = centers.dtype.type(kwargs.pop("rscale"))
+        kwargs["rscale"] = kwargs["centers"].dtype.type(kwargs["rscale"])
 
-        return knl(queue, centers=centers, rscale=rscale, **kwargs)
+        knl = self.get_tuned_kernel_executor(queue, kwargs)
+
+        return knl(queue, **kwargs)
 
 # }}}
 
@@ -325,26 +339,14 @@ class E2PFromCSR(E2PBase):
 
         return loopy_knl
 
-    def get_optimized_kernel(self):
-        # FIXME
-        knl = self.get_kernel()
-        knl = lp.tag_inames(knl, {"itgt_box": "g.0"})
-        knl = lp.add_inames_to_insn(knl, "itgt_box", "id:kernel_scaling")
-        knl = lp.set_options(knl,
-                enforce_variable_access_ordered="no_check")
-        knl = register_optimization_preambles(knl, self.device)
-
-        return knl
-
     def __call__(self, queue, **kwargs):
-        knl = self.get_cached_kernel_executor()
-
-        centers = kwargs.pop("centers")
         # "1" may be passed for rscale, which won't have its type
         # meaningfully inferred. Make the type of rscale explicit.
-        rscale = centers.dtype.type(kwargs.pop("rscale"))
+        kwargs["rscale"] = kwargs["centers"].dtype.type(kwargs["rscale"])
+
+        knl = self.get_tuned_kernel_executor(queue, kwargs)
 
-        return knl(queue, centers=centers, rscale=rscale, **kwargs)
+        return knl(queue, **kwargs)
 
 # }}}
 
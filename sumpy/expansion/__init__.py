@@ -25,6 +25,7 @@ THE SOFTWARE.
 
 import logging
 from abc import ABC, abstractmethod
+from collections import OrderedDict
 from typing import TYPE_CHECKING, Any, ClassVar
 
 import pymbolic.primitives as prim
@@ -518,6 +519,17 @@ class LinearPDEBasedExpansionTermsWrangler(ExpansionTermsWrangler):
 
     init_arg_names = ("order", "dim", "knl", "max_mi")
 
+    # The projection matrices only depend on the PDE satisfied by the kernel,
+    # so they are shared between the wranglers of all kernels satisfying the
+    # same PDE (e.g. the components of a Stokeslet or the derivatives of a
+    # kernel), see _get_projection_cache_key. The least recently used entries
+    # are evicted once there are more than projection_matrix_cache_max_entries.
+    # The unscaled projection matrices are also kept in the on-disk cache
+    # sumpy.projection_matrix_cache, the ones scaled by an rscale are not.
+    projection_matrix_cache: ClassVar[OrderedDict[Hashable, Any]] = \
+            OrderedDict()
+    projection_matrix_cache_max_entries: ClassVar[int] = 128
+
     def __init__(self,
             order: int, dim: int, knl: Kernel,
             max_mi: tuple[int, ...] | None = None) -> None:
@@ -529,6 +541,23 @@ class LinearPDEBasedExpansionTermsWrangler(ExpansionTermsWrangler):
         super().__init__(order, dim, max_mi)
         self.knl = knl
 
+    def _get_projection_cache_key(self, *extra: Hashable) -> Hashable:
+        return (type(self).__name__, self.order, self.dim, self.max_mi,
+                self.knl.get_pde_as_diff_op(), *extra)
+
+    def _lookup_projection_cache(self, key: Hashable) -> Any:
+        cache = type(self).projection_matrix_cache
+        result = cache[key]
+        cache.move_to_end(key)
+        return result
+
+    def _store_projection_cache(self, key: Hashable, result: Any) -> None:
+        cls = type(self)
+        cls.projection_matrix_cache[key] = result
+        while (len(cls.projection_matrix_cache)
+                > cls.projection_matrix_cache_max_entries):
+            cls.projection_matrix_cache.popitem(last=False)
+
     def get_coefficient_identifiers(self):
         return self.stored_identifiers
 
@@ -576,9 +605,9 @@ class LinearPDEBasedExpansionTermsWrangler(ExpansionTermsWrangler):
         axis to the fastest varying axis of the multi-indices when sorted.
         """
         dim = self.dim
-        deriv_id_to_coeff, = self.knl.get_pde_as_diff_op().eqs
+        eqs = self.knl.get_pde_as_diff_op().eqs
         slowest_varying_index = dim - 1
-        for ident in deriv_id_to_coeff:
+        for ident in (ident for eq in eqs for ident in eq):
             if ident.mi.count(0) == dim - 1:
                 non_zero_index = next(i for i in range(self.dim) if ident.mi[i] != 0)
                 slowest_varying_index = min(slowest_varying_index, non_zero_index)
@@ -606,9 +635,13 @@ class LinearPDEBasedExpansionTermsWrangler(ExpansionTermsWrangler):
         mi_to_index = {mi: i for i, mi in enumerate(mis)}
 
         hyperplanes = []
-        deriv_id_to_coeff, = self.knl.get_pde_as_diff_op().eqs
+        eqs = self.knl.get_pde_as_diff_op().eqs
 
-        if not all(ident.mi in mi_to_index for ident in deriv_id_to_coeff):
+        if len(eqs) != 1:
+            # The stored multi-indices of a system of PDEs need not lie on
+            # hyperplanes. Treat as if full expansion.
+            hyperplanes = super()._get_mi_hyperpplanes()
+        elif not all(ident.mi in mi_to_index for ident in eqs[0]):
             # The order of the expansion is less than the order of the PDE.
             # Treat as if full expansion.
             hyperplanes = super()._get_mi_hyperpplanes()
@@ -617,7 +650,7 @@ class LinearPDEBasedExpansionTermsWrangler(ExpansionTermsWrangler):
             # the degree lexicographic order given by
             # _get_mi_ordering_key_and_axis_permutation.
             ordering_key, _ = self._get_mi_ordering_key_and_axis_permutation()
-            max_mi = max(deriv_id_to_coeff, key=ordering_key).mi
+            max_mi = max(eqs[0], key=ordering_key).mi
             hyperplanes = [(d, const)
                 for d in range(self.dim)
                 for const in range(max_mi[d])]
@@ -635,8 +668,11 @@ class LinearPDEBasedExpansionTermsWrangler(ExpansionTermsWrangler):
 
         ordering_key, axis_permutation = \
                 self._get_mi_ordering_key_and_axis_permutation()
-        deriv_id_to_coeff, = self.knl.get_pde_as_diff_op().eqs
-        max_mi = max(deriv_id_to_coeff, key=ordering_key).mi
+        eqs = self.knl.get_pde_as_diff_op().eqs
+        if len(eqs) != 1:
+            raise NotImplementedError("systems of PDEs")
+
+        max_mi = max(eqs[0], key=ordering_key).mi
 
         if all(m != 0 for m in max_mi):
             raise NotImplementedError("non-elliptic PDEs")
@@ -676,6 +712,32 @@ class LinearPDEBasedExpansionTermsWrangler(ExpansionTermsWrangler):
 
     @memoize_method
     def get_stored_ids_and_unscaled_projection_matrix(self):
+        key = self._get_projection_cache_key()
+        try:
+            return self._lookup_projection_cache(key)
+        except KeyError:
+            pass
+
+        from sumpy import CACHING_ENABLED
+        if CACHING_ENABLED:
+            # The coefficients of the PDE are :mod:`sympy` expressions, which
+            # have no persistent hash, so key the on-disk cache by their
+            # (canonical) string representation instead.
+            from sumpy import projection_matrix_cache
+            from sumpy.version import KERNEL_VERSION
+            disk_key = (repr(key), KERNEL_VERSION)
+            try:
+                result = projection_matrix_cache[disk_key]
+            except KeyError:
+                result = self._compute_stored_ids_and_unscaled_projection_matrix()
+                projection_matrix_cache.store_if_not_present(disk_key, result)
+        else:
+            result = self._compute_stored_ids_and_unscaled_projection_matrix()
+
+        self._store_projection_cache(key, result)
+        return result
+
+    def _compute_stored_ids_and_unscaled_projection_matrix(self):
         from pytools import ProcessLogger
         plog = ProcessLogger(logger, "compute PDE for Taylor coefficients")
 
@@ -684,7 +746,10 @@ class LinearPDEBasedExpansionTermsWrangler(ExpansionTermsWrangler):
                                             (i, mi) in enumerate(mis)}
 
         diff_op = self.knl.get_pde_as_diff_op()
-        assert len(diff_op.eqs) == 1
+        if len(diff_op.eqs) != 1:
+            plog.done()
+            return self._compute_projection_by_elimination()
+
         mi_to_coeff = {k.mi: v for k, v in diff_op.eqs[0].items()}
         for ident in mi_to_coeff:
             if ident not in coeff_ident_enumerate_dict:
@@ -752,6 +817,80 @@ class LinearPDEBasedExpansionTermsWrangler(ExpansionTermsWrangler):
                                from_output_coeffs_by_row, shape)
         return stored_identifiers, op
 
+    def _compute_projection_by_elimination(self):
+        """Computes the stored coefficients and the projection matrix from the
+        nullspace of the relations between the full coefficients implied by
+        the PDE, expressing each coefficient that is not stored directly in
+        terms of the stored ones. Unlike
+        :meth:`_compute_stored_ids_and_unscaled_projection_matrix`, this also
+        applies to PDEs given by more than one equation.
+
+        For the multi-indices to be stored, the columns of the relations are
+        ordered from the largest to the smallest multi-index, so that the
+        pivot columns of its reduced row echelon form are the largest
+        multi-indices that can be eliminated. For a single equation, these
+        are the multi-indices that are not stored by
+        :meth:`_compute_stored_ids_and_unscaled_projection_matrix`, and the
+        result represents the same matrix. Relations with exact rational
+        coefficients use the fraction-free elimination of
+        :func:`sumpy.tools.reduced_row_echelon_form`.
+        """
+        from pytools import ProcessLogger
+
+        from sumpy.tools import reduced_row_echelon_form
+        plog = ProcessLogger(logger, "compute PDE relations for Taylor coefficients")
+
+        mis = [tuple(mi) for mi in self.get_full_coefficient_identifiers()]
+        ordering_key, _ = self._get_mi_ordering_key_and_axis_permutation()
+        cols = sorted(range(len(mis)),
+                      key=lambda i: ordering_key(mis[i]), reverse=True)
+        mi_to_col = {mis[i]: icol for icol, i in enumerate(cols)}
+
+        diff_op = self.knl.get_pde_as_diff_op()
+        assert all(ident.vec_idx == 0 for eq in diff_op.eqs for ident in eq)
+
+        relations = []
+        for eq in diff_op.eqs:
+            mi_to_coeff = {k.mi: v for k, v in eq.items()}
+            for shift in mis:
+                row = [0]*len(mis)
+                for mi, coeff in mi_to_coeff.items():
+                    col = mi_to_col.get(add_mi(mi, shift))
+                    if col is None:
+                        break
+                    row[col] = coeff
+                else:
+                    relations.append(row)
+
+        if relations:
+            rref, pivot_cols = reduced_row_echelon_form(relations)
+        else:
+            rref, pivot_cols = None, []
+
+        col_to_pivot_row = {col: i for i, col in enumerate(pivot_cols)}
+        stored_identifiers = [mi for mi in mis if mi_to_col[mi] not in
+                              col_to_pivot_row]
+        mi_to_stored_index = {mi: i for i, mi in enumerate(stored_identifiers)}
+
+        from_input_coeffs_by_row = []
+        for mi in mis:
+            if mi in mi_to_stored_index:
+                from_input_coeffs_by_row.append([(mi_to_stored_index[mi], 1)])
+                continue
+
+            pivot_row = rref[col_to_pivot_row[mi_to_col[mi]]]
+            from_input_coeffs_by_row.append([
+                (idx, -pivot_row[mi_to_col[stored_mi]])
+                for idx, stored_mi in enumerate(stored_identifiers)
+                if pivot_row[mi_to_col[stored_mi]] != 0])
+
+        plog.done()
+
+        shape = (len(mis), len(stored_identifiers))
+        op = CSEMatVecOperator(from_input_coeffs_by_row,
+                               [[] for _ in mis], shape)
+        return stored_identifiers, op
+
     @memoize_method
     def get_projection_matrix(self, rscale):
         r"""
@@ -780,11 +919,32 @@ class LinearPDEBasedExpansionTermsWrangler(ExpansionTermsWrangler):
             c^{\text{local}}_{\text{full}} = M^T c^{\text{local}}_{\text{stored}}.\\
             c^{\text{mpole}}_{\text{stored}} = M c^{\text{mpole}}_{\text{full}}.
         """
+        key = self._get_projection_cache_key(rscale)
+        try:
+            return self._lookup_projection_cache(key)
+        except KeyError:
+            result = self._compute_projection_matrix(rscale)
+            self._store_projection_cache(key, result)
+            return result
+
+    def _compute_projection_matrix(self, rscale):
         _, projection_matrix = \
             self.get_stored_ids_and_unscaled_projection_matrix()
 
+        stored_coeffs = self.get_coefficient_identifiers()
         full_coeffs = self.get_full_coefficient_identifiers()
 
+        # Rows may also combine stored coefficients of a different order,
+        # see _compute_projection_by_elimination.
+        from_input_with_rscale = []
+        for row, assignment in \
+                enumerate(projection_matrix.from_input_coeffs_by_row):
+            row_rscale = sum(full_coeffs[row])
+            from_input_with_rscale.append([
+                (k, coeff * rscale**(row_rscale - sum(stored_coeffs[k]))
+                 if row_rscale != sum(stored_coeffs[k]) else coeff)
+                for k, coeff in assignment])
+
         projection_with_rscale = []
         for row, assignment in \
                 enumerate(projection_matrix.from_output_coeffs_by_row):
@@ -801,7 +961,7 @@ class LinearPDEBasedExpansionTermsWrangler(ExpansionTermsWrangler):
             projection_with_rscale.append(from_output_coeffs_with_rscale)
 
         shape = projection_matrix.shape
-        return CSEMatVecOperator(projection_matrix.from_input_coeffs_by_row,
+        return CSEMatVecOperator(from_input_with_rscale,
                                  projection_with_rscale, shape)
 
 
@@ -33,6 +33,15 @@ import math
 import numpy as np
 
 
+def _limit_tol_to_dtype(tol, dtype):
+    # Expansions cannot be more accurate than their floating point type, so
+    # higher orders only add work.
+    if dtype is None:
+        return tol
+
+    return max(tol, float(np.finfo(dtype).eps))
+
+
 class FMMLibExpansionOrderFinder:
     r"""Return expansion orders that meet the tolerance for a given level
     using routines wrapped from ``pyfmmlib``.
@@ -41,13 +50,16 @@ class FMMLibExpansionOrderFinder:
     .. automethod:: __call__
     """
 
-    def __init__(self, tol, extra_order=0):
+    def __init__(self, tol, extra_order=0, expansion_dtype=None):
         """
         :arg tol: error tolerance
         :arg extra_order: order increase to accommodate, say, the taking of
             derivatives of the FMM expansions.
+        :arg expansion_dtype: if given, the type of the expansions (see
+            :attr:`sumpy.fmm.SumpyExpansionWrangler.expansion_dtype`). The
+            tolerance is then limited to its machine epsilon.
         """
-        self.tol = tol
+        self.tol = _limit_tol_to_dtype(tol, expansion_dtype)
         self.extra_order = extra_order
 
     def __call__(self, kernel, kernel_args, tree, level):
@@ -121,12 +133,13 @@ class SimpleExpansionOrderFinder:
 
     def __init__(self, tol, err_const_laplace=0.01, err_const_helmholtz=100,
             scaling_const_helmholtz=4,
-            extra_order=1):
+            extra_order=1, expansion_dtype=None):
         """
         :arg extra_order: order increase to accommodate, say, the taking of
             derivatives of the FMM expansions.
+        :arg expansion_dtype: see :class:`FMMLibExpansionOrderFinder`.
         """
-        self.tol = tol
+        self.tol = _limit_tol_to_dtype(tol, expansion_dtype)
 
         self.err_const_laplace = err_const_laplace
         self.err_const_helmholtz = err_const_helmholtz
@@ -237,3 +237,629 @@ def make_p2e_loopy_kernel(
         loopy_knl = kernel.prepare_loopy_kernel(loopy_knl)
 
     return loopy_knl
+
+
+# {{{ recurrence-based kernels for volume Taylor multipole expansions
+
+def _get_graded_mis(dim: int, order: int) -> list[tuple[int, ...]]:
+    from pytools import (
+        generate_nonnegative_integer_tuples_summing_to_at_most as gnitstam,
+    )
+    return sorted(gnitstam(order, dim), key=lambda mi: (sum(mi), mi[::-1]))
+
+
+def _make_table(name: str, values, dtype) -> lp.TemporaryVariable:
+    ary = np.array(values, dtype=dtype)
+    if ary.size == 0:
+        # loopy does not support empty arrays
+        ary = np.zeros((1,) * ary.ndim, dtype=dtype)
+
+    return lp.TemporaryVariable(name,
+            dtype=ary.dtype, shape=ary.shape, initializer=ary,
+            read_only=True, address_space=lp.AddressSpace.GLOBAL)
+
+
+def _get_target_derivative_axis(kernel: Kernel, base_kernel: Kernel) -> int | None:
+    from sumpy.kernel import AxisTargetDerivative
+    if kernel == base_kernel:
+        return None
+    elif (isinstance(kernel, AxisTargetDerivative)
+            and kernel.inner_kernel == base_kernel):
+        return kernel.axis
+    else:
+        raise ValueError(f"unsupported kernel: '{kernel}'")
+
+
+def _get_derivative_recurrence_kind(kernel: Kernel) -> str | None:
+    from sumpy.kernel import HelmholtzKernel, LaplaceKernel
+    if kernel.dim not in (2, 3):
+        return None
+
+    if isinstance(kernel, LaplaceKernel):
+        return "laplace"
+    elif isinstance(kernel, HelmholtzKernel):
+        return "helmholtz"
+    else:
+        return None
+
+
+def supports_recurrence_m2p(
+        expansion: ExpansionBase, kernels: Sequence[Kernel]) -> bool:
+    """
+    :returns: *True* if :func:`make_m2p_loopy_kernel_for_volume_taylor`
+        supports *expansion* and *kernels*.
+    """
+    if _get_derivative_recurrence_kind(expansion.kernel) is None:
+        return False
+
+    try:
+        for knl in kernels:
+            _get_target_derivative_axis(knl, expansion.kernel)
+    except ValueError:
+        return False
+
+    return True
+
+
+def supports_recurrence_p2m(
+        expansion: ExpansionBase, kernels: Sequence[Kernel]) -> bool:
+    """
+    :returns: *True* if :func:`make_p2m_loopy_kernel_for_volume_taylor`
+        supports *expansion* and *kernels*.
+    """
+    return (_get_derivative_recurrence_kind(expansion.kernel) is not None
+            and all(knl == expansion.kernel for knl in kernels))
+
+
+def _get_symbolic_insns(
+        assignments: Sequence[tuple[str, int, sym.Basic]],
+        sac: SymbolicAssignmentCollection,
+        vector_names: set[str],
+        code_transformers) -> list[lp.Assignment]:
+    """Convert the symbolic expressions in *assignments*, given as tuples
+    ``(array_name, index, expr)``, into :mod:`loopy` instructions assigning
+    to ``array_name[index]``. The instruction writing ``array_name[index]``
+    has the id ``array_name_index``.
+    """
+    name_to_target = {}
+    for array_name, index, expr in assignments:
+        name = sac.add_assignment(f"{array_name}_{index}", expr)
+        name_to_target[name] = (array_name, index)
+
+    sac.run_global_cse()
+
+    from sumpy.codegen import to_loopy_insns
+    insns = to_loopy_insns(
+            sac.assignments.items(),
+            vector_names=vector_names,
+            pymbolic_expr_maps=code_transformers,
+            retain_names=set(name_to_target),
+            complex_dtype=np.complex128  # FIXME
+            )
+
+    for i, insn in enumerate(insns):
+        if (isinstance(insn, lp.Assignment)
+                and isinstance(insn.assignee, pymbolic.var)
+                and insn.assignee.name in name_to_target):
+            array_name, index = name_to_target[insn.assignee.name]
+            insns[i] = insn.copy(
+                    assignee=pymbolic.var(array_name)[index],
+                    id=f"{array_name}_{index}",
+                    temp_var_type=lp.Optional())
+
+    return insns
+
+
+def _make_derivative_insns(
+        kernel: Kernel, order: int, rscale, code_transformers):
+    r"""Generate instructions that compute the scaled derivatives
+    :math:`\alpha^{|\nu|} \partial^\nu G(b)` of the kernel *G* of
+    *kernel* for all multi-indices :math:`|\nu| \le` *order*, using the
+    recurrences of :class:`~sumpy.derivative_taker.LaplaceDerivativeTaker`
+    or :class:`~sumpy.derivative_taker.HelmholtzDerivativeTaker` as loops
+    over precomputed index tables. The size of the generated code does not
+    depend on *order*.
+
+    Expects the vector from the center to the target to be available as
+    ``b[idim]``.
+
+    :returns: a tuple ``(domains, insns, temporaries, fixed_parameters,
+        mi_to_index, name)``, where the derivative for multi-index *mi* is
+        stored in ``name[mi_to_index[mi]]``.
+    """
+    from pymbolic import var
+
+    dim = kernel.dim
+    kind = _get_derivative_recurrence_kind(kernel)
+
+    bvec = sym.make_sym_vector("b", dim)
+    sac = SymbolicAssignmentCollection()
+    taker = kernel.get_derivative_taker(bvec, rscale, sac)
+
+    mis = _get_graded_mis(dim, order)
+    rscale_expr = rscale if isinstance(rscale, int) else var("rscale")
+
+    domains = []
+
+    if kind == "laplace":
+        # Derivatives with no multi-index entry larger than one are computed
+        # symbolically, all others through the recurrence in
+        # LaplaceDerivativeTaker.diff.
+        base_mis = [mi for mi in mis if max(mi) <= 1]
+        rec_mis = [mi for mi in mis if max(mi) > 1]
+        mi_to_index = {mi: i for i, mi in enumerate(base_mis + rec_mis)}
+
+        lap_a = np.zeros((len(rec_mis), dim))
+        lap_b = np.zeros((len(rec_mis), dim))
+        lap_c = np.zeros(len(rec_mis))
+        lap_i1 = np.zeros((len(rec_mis), dim), dtype=np.int32)
+        lap_i2 = np.zeros((len(rec_mis), dim), dtype=np.int32)
+        for irec, mi in enumerate(rec_mis):
+            d = next(i for i in range(dim) if mi[i] >= 2)
+            for i in range(dim):
+                n = mi[i]
+                if n >= 1:
+                    lap_i1[irec, i] = mi_to_index[
+                        (*mi[:i], n - 1, *mi[i+1:])]
+                if n >= 2:
+                    lap_i2[irec, i] = mi_to_index[
+                        (*mi[:i], n - 2, *mi[i+1:])]
+
+                if i == d:
+                    if dim == 3:
+                        lap_a[irec, i] = -(2*n - 1)
+                        lap_b[irec, i] = -(n - 1)**2
+                    else:
+                        lap_a[irec, i] = -2*(n - 1)
+                        lap_b[irec, i] = -(n - 1)*(n - 2)
+                        if n == 2 and sum(mi) == 2:
+                            lap_c[irec] = 1
+                else:
+                    lap_a[irec, i] = -2*n
+                    lap_b[irec, i] = -n*(n - 1)
+
+        insns = _get_symbolic_insns(
+                [("derivs", mi_to_index[mi], taker.diff(mi)) for mi in base_mis],
+                sac, {"b"}, code_transformers)
+
+        temporaries = [
+            lp.TemporaryVariable("derivs", shape=(len(mis),)),
+            _make_table("lap_a", lap_a, np.float64),
+            _make_table("lap_b", lap_b, np.float64),
+            _make_table("lap_c", lap_c, np.float64),
+            _make_table("lap_i1", lap_i1, np.int32),
+            _make_table("lap_i2", lap_i2, np.int32),
+            ]
+
+        if rec_mis:
+            domains.append("{[irec]: 0<=irec<nrec}")
+            nbase = len(base_mis)
+            irec = var("irec")
+            derivs = var("derivs")
+            insns += [
+                lp.Assignment(
+                    assignee="lap_rs2",
+                    expression=sum(
+                        (var("b")[j] / rscale_expr)**2 for j in range(dim)),
+                    id="lap_rs2",
+                    temp_var_type=lp.Optional(None)),
+                lp.Assignment(
+                    assignee=derivs[nbase + irec],
+                    expression=(
+                        var("lap_c")[irec]
+                        + sum(
+                            var("lap_a")[irec, j] * var("b")[j] / rscale_expr
+                            * derivs[var("lap_i1")[irec, j]]
+                            + var("lap_b")[irec, j]
+                            * derivs[var("lap_i2")[irec, j]]
+                            for j in range(dim)))
+                        / var("lap_rs2"),
+                    id="derivs_rec",
+                    happens_after=frozenset(
+                        {"lap_rs2"}
+                        | {f"derivs_{i}" for i in range(nbase)}),
+                    ),
+                ]
+            fixed_parameters = {"nrec": len(rec_mis)}
+        else:
+            fixed_parameters = {}
+
+        return domains, insns, temporaries, fixed_parameters, mi_to_index, "derivs"
+
+    elif kind == "helmholtz":
+        # D(mi, q) as in RadialDerivativeTaker.diff, computed level by level
+        # in q from q = order down to q = 0. helm_derivs holds the radial
+        # derivatives D(0, q) for all q, followed by two buffers for the
+        # other multi-indices, which are used for the levels in alternation.
+        # The recurrence is a single loop over all entries of all levels.
+        mi_to_index = {mi: i for i, mi in enumerate(mis)}
+        zero_mi = (0,) * dim
+        nradial = order + 1
+
+        def get_offset(ilev, mi):
+            if mi == zero_mi:
+                return order - ilev
+            return nradial + (ilev % 2) * len(mis) + mi_to_index[mi]
+
+        helm_out = []
+        helm_a2 = []
+        helm_ax = []
+        helm_i1 = []
+        helm_i2 = []
+        for ilev in range(1, order + 1):
+            # multi-indices needed at level q = order - ilev
+            for mi in mis:
+                if not 0 < sum(mi) <= ilev:
+                    continue
+
+                ax = min(range(dim), key=lambda j: (mi[j] != 1, mi[j] == 0, j))
+                mi1 = (*mi[:ax], mi[ax] - 1, *mi[ax+1:])
+                mi2 = (*mi[:ax], mi[ax] - 2, *mi[ax+1:]) if mi[ax] >= 2 else mi1
+
+                helm_out.append(get_offset(ilev, mi))
+                helm_a2.append(mi[ax] - 1)
+                helm_ax.append(ax)
+                helm_i1.append(get_offset(ilev - 1, mi1))
+                helm_i2.append(get_offset(ilev - 1, mi2))
+
+        mi_to_index = {mi: get_offset(order, mi) for mi in mis}
+
+        insns = _get_symbolic_insns(
+                [("helm_derivs", q, taker.diff(zero_mi, q))
+                 for q in range(min(order, 1) + 1)],
+                sac, {"b"}, code_transformers)
+        radial_ids = frozenset(
+            f"helm_derivs_{q}" for q in range(min(order, 1) + 1))
+
+        temporaries = [
+            lp.TemporaryVariable("helm_derivs", shape=(nradial + 2*len(mis),)),
+            _make_table("helm_out", helm_out, np.int32),
+            _make_table("helm_a2", helm_a2, np.float64),
+            _make_table("helm_ax", helm_ax, np.int32),
+            _make_table("helm_i1", helm_i1, np.int32),
+            _make_table("helm_i2", helm_i2, np.int32),
+            ]
+
+        k = var(kernel.helmholtz_k_name)
+        derivs = var("helm_derivs")
+        b = var("b")
+
+        if order >= 2:
+            domains.append("{[iq]: 2<=iq<=order}")
+            iq = var("iq")
+            insns += [
+                lp.Assignment(
+                    assignee="helm_r2",
+                    expression=sum(b[j]**2 for j in range(dim)),
+                    id="helm_r2",
+                    temp_var_type=lp.Optional(None)),
+                lp.Assignment(
+                    assignee=derivs[iq],
+                    expression=(
+                        -(2*iq - (2 if dim == 2 else 1)) * derivs[iq - 1]
+                        - k**2 * derivs[iq - 2]) / var("helm_r2"),
+                    id="helm_radial_rec",
+                    happens_after=radial_ids | {"helm_r2"}),
+                ]
+            radial_ids = radial_ids | {"helm_radial_rec"}
+
+        fixed_parameters = {"order": order}
+        if helm_out:
+            domains.append("{[irec]: 0<=irec<nrec}")
+            irec = var("irec")
+            insns.append(
+                lp.Assignment(
+                    assignee=derivs[var("helm_out")[irec]],
+                    expression=(
+                        var("helm_a2")[irec] * rscale_expr**2
+                        * derivs[var("helm_i2")[irec]]
+                        + rscale_expr * b[var("helm_ax")[irec]]
+                        * derivs[var("helm_i1")[irec]]),
+                    id="helm_derivs_rec",
+                    happens_after=radial_ids))
+            fixed_parameters["nrec"] = len(helm_out)
+
+        return (domains, insns, temporaries, fixed_parameters,
+                mi_to_index, "helm_derivs")
+
+    else:
+        raise ValueError(f"unsupported kernel: '{kernel}'")
+
+
+def make_m2p_loopy_kernel_for_volume_taylor(
+        expansion: ExpansionBase, kernels: Sequence[Kernel]) -> lp.TranslationUnit:
+    """
+    Create a :mod:`loopy` kernel with the same interface as
+    :func:`make_e2p_loopy_kernel` that evaluates a Taylor multipole expansion
+    of a Laplace or Helmholtz kernel. The derivatives of the kernel are
+    computed through recurrences over precomputed index tables, so that the
+    size of the generated code, and hence the compile time, does not grow
+    with the order of the expansion.
+
+    *kernels* may contain the kernel of the expansion and
+    :class:`~sumpy.kernel.AxisTargetDerivative` instances of it, see
+    :func:`supports_recurrence_m2p`.
+    """
+    from pymbolic import var
+
+    dim = expansion.dim
+    base_kernel = expansion.kernel
+    coeff_ids = expansion.get_coefficient_identifiers()
+    ncoeffs = len(coeff_ids)
+
+    axes = [_get_target_derivative_axis(knl, base_kernel) for knl in kernels]
+    deriv_order = expansion.order + (
+        1 if any(axis is not None for axis in axes) else 0)
+
+    rscale = sym.Symbol("rscale") if expansion.use_rscale else 1
+    code_transformers = [expansion.get_code_transformer()] \
+        + [kernel.get_code_transformer() for kernel in kernels]
+
+    domains, deriv_insns, temporaries, fixed_parameters, mi_to_index, derivs = \
+        _make_derivative_insns(base_kernel, deriv_order, rscale, code_transformers)
+
+    # The target derivative of a scaled derivative adds a factor of 1/rscale,
+    # see DifferentiatedExprDerivativeTaker.diff.
+    deriv_index = np.empty((len(kernels), ncoeffs), dtype=np.int32)
+    rscale_power = np.zeros(len(kernels), dtype=np.int32)
+    for iknl, axis in enumerate(axes):
+        for icoeff, mi in enumerate(coeff_ids):
+            if axis is not None:
+                mi = (*mi[:axis], mi[axis] + 1, *mi[axis+1:])
+            deriv_index[iknl, icoeff] = mi_to_index[mi]
+        if axis is not None:
+            rscale_power[iknl] = 1
+
+    temporaries += [
+        _make_table("m2p_deriv_index", deriv_index, np.int32),
+        _make_table("m2p_rscale_power", rscale_power, np.int32),
+        ]
+
+    iknl = var("iknl")
+    icoeff = var("icoeff")
+    result = var("result")
+    rscale_expr = var("rscale") if expansion.use_rscale else 1
+
+    insns = [
+        lp.Assignment(
+            assignee="b[idim]",
+            expression="target[idim]-center[idim]",
+            id="b",
+            temp_var_type=lp.Optional(None),
+        ),
+        *[insn.copy(happens_after=frozenset(insn.happens_after) | {"b"})
+          for insn in deriv_insns],
+        lp.Assignment(
+            assignee=result[iknl],
+            expression=result[iknl] + lp.Reduction("sum", "icoeff",
+                var("coeffs")[icoeff]
+                * var(derivs)[var("m2p_deriv_index")[iknl, icoeff]])
+                / rscale_expr**var("m2p_rscale_power")[iknl],
+            id="result",
+            happens_after=frozenset(
+                insn.id for insn in deriv_insns if insn.id is not None)),
+        ]
+
+    target_args = gather_loopy_arguments((expansion, *tuple(kernels)))
+
+    loopy_knl = lp.make_function(
+            [*domains,
+             "{[idim]: 0<=idim<dim}",
+             "{[iknl]: 0<=iknl<nresults}",
+             "{[icoeff]: 0<=icoeff<ncoeffs}"],
+            insns,
+            kernel_data=[
+                lp.GlobalArg("result", shape=(len(kernels),), is_input=True,
+                    is_output=True),
+                lp.GlobalArg("coeffs",
+                    shape=(ncoeffs,), is_input=True, is_output=False),
+                lp.GlobalArg("center, target",
+                    shape=(dim,), is_input=True, is_output=False),
+                lp.ValueArg("rscale", is_input=True),
+                lp.ValueArg("itgt", is_input=True),
+                lp.ValueArg("ntargets", is_input=True),
+                lp.GlobalArg("targets",
+                    shape=(dim, "ntargets"), is_input=True, is_output=False),
+                *target_args,
+                *temporaries,
+                ...],
+            name="e2p",
+            lang_version=lp.MOST_RECENT_LANGUAGE_VERSION,
+            fixed_parameters={
+                "dim": dim, "nresults": len(kernels), "ncoeffs": ncoeffs,
+                **fixed_parameters},
+            )
+
+    loopy_knl = lp.tag_inames(loopy_knl, "idim*:unr")
+    for kernel in kernels:
+        loopy_knl = kernel.prepare_loopy_kernel(loopy_knl)
+
+    return loopy_knl
+
+
+def make_p2m_loopy_kernel_for_volume_taylor(
+        expansion: ExpansionBase, kernels: Sequence[Kernel],
+        strength_usage: Sequence[int], nstrengths: int) -> lp.TranslationUnit:
+    """
+    Create a :mod:`loopy` kernel with the same interface as
+    :func:`make_p2e_loopy_kernel` that forms a Taylor multipole expansion of
+    a Laplace or Helmholtz kernel. The full coefficients are computed
+    through a recurrence over precomputed index tables and then compressed
+    by applying the (transposed) projection matrix of the expansion row by
+    row, so that the size of the generated code, and hence the compile
+    time, does not grow with the order of the expansion.
+
+    All of *kernels* must be the kernel of the expansion, see
+    :func:`supports_recurrence_p2m`.
+    """
+    from pymbolic import var
+
+    from sumpy.expansion import LinearPDEBasedExpansionTermsWrangler
+
+    dim = expansion.dim
+    wrangler = expansion.expansion_terms_wrangler
+    full_ids = wrangler.get_full_coefficient_identifiers()
+    nfull = len(full_ids)
+    ncoeffs = len(expansion.get_coefficient_identifiers())
+    rscale = sym.Symbol("rscale") if expansion.use_rscale else 1
+
+    if isinstance(wrangler, LinearPDEBasedExpansionTermsWrangler):
+        _, projection = wrangler.get_stored_ids_and_unscaled_projection_matrix()
+        input_rows = projection.from_input_coeffs_by_row
+        output_rows = projection.from_output_coeffs_by_row
+    else:
+        input_rows = [[(i, 1)] for i in range(nfull)]
+        output_rows = [[] for _ in range(nfull)]
+
+    # {{{ tables
+
+    # full[i] = full[parent[i]] * a[axis[i]] / (rscale * mi[axis[i]])
+    full_id_to_index = {mi: i for i, mi in enumerate(full_ids)}
+    parent = np.zeros(nfull, dtype=np.int32)
+    axis = np.zeros(nfull, dtype=np.int32)
+    inv_mi = np.zeros(nfull)
+    for i, mi in enumerate(full_ids[1:], 1):
+        ax = next(j for j in range(dim) if mi[j] > 0)
+        parent[i] = full_id_to_index[(*mi[:ax], mi[ax] - 1, *mi[ax+1:])]
+        axis[i] = ax
+        inv_mi[i] = 1 / mi[ax]
+
+    stored_to_full = np.zeros(ncoeffs, dtype=np.int32)
+    for i, row in enumerate(input_rows):
+        for j, coeff in row:
+            assert coeff == 1
+            stored_to_full[j] = i
+
+    # Rows expressed in terms of other rows, in the reverse order of
+    # CSEMatVecOperator.transpose_matvec. Each such row is given by
+    # (output index, coefficient index) slots, where unused slots add zero
+    # to the row itself.
+    pde_coeffs = [sym.Integer(0)]
+    pde_coeff_to_index = {pde_coeffs[0]: 0}
+    proj_rows = [i for i in reversed(range(nfull)) if output_rows[i]]
+    nslots = max((len(output_rows[i]) for i in proj_rows), default=0)
+    proj_out = np.zeros((len(proj_rows), nslots), dtype=np.int32)
+    proj_coeff = np.zeros((len(proj_rows), nslots), dtype=np.int32)
+    for irow, i in enumerate(proj_rows):
+        proj_out[irow, :] = i
+        for islot, (j, coeff) in enumerate(output_rows[i]):
+            value = (sym.sympify(coeff)
+                     * rscale**(sum(full_ids[i]) - sum(full_ids[j])))
+            if value not in pde_coeff_to_index:
+                pde_coeff_to_index[value] = len(pde_coeffs)
+                pde_coeffs.append(value)
+
+            proj_out[irow, islot] = j
+            proj_coeff[irow, islot] = pde_coeff_to_index[value]
+
+    temporaries = [
+        lp.TemporaryVariable("p2m_full", shape=(nfull,)),
+        lp.TemporaryVariable("p2m_pde_coeffs", shape=(len(pde_coeffs),)),
+        _make_table("p2m_parent", parent, np.int32),
+        _make_table("p2m_axis", axis, np.int32),
+        _make_table("p2m_inv_mi", inv_mi, np.float64),
+        _make_table("p2m_stored_to_full", stored_to_full, np.int32),
+        _make_table("p2m_proj_row", proj_rows, np.int32),
+        _make_table("p2m_proj_out", proj_out, np.int32),
+        _make_table("p2m_proj_coeff", proj_coeff, np.int32),
+        ]
+
+    # }}}
+
+    code_transformers = [expansion.get_code_transformer()] \
+        + [kernel.get_code_transformer() for kernel in kernels]
+    coeff_insns = _get_symbolic_insns(
+            [("p2m_pde_coeffs", i, value) for i, value in enumerate(pde_coeffs)],
+            SymbolicAssignmentCollection(), set(), code_transformers)
+
+    full = var("p2m_full")
+    ifull = var("ifull")
+    rscale_expr = var("rscale") if expansion.use_rscale else 1
+    strength = var("strength")
+
+    insns = [
+        lp.Assignment(
+            assignee="a[idim]",
+            expression="center[idim]-source[idim]",
+            id="a",
+            temp_var_type=lp.Optional(None),
+        ),
+        lp.Assignment(
+            assignee=full[0],
+            expression=sum(strength[i] for i in strength_usage),
+            id="p2m_full_0"),
+        lp.Assignment(
+            assignee=full[ifull],
+            expression=(
+                full[var("p2m_parent")[ifull]]
+                * var("a")[var("p2m_axis")[ifull]] / rscale_expr
+                * var("p2m_inv_mi")[ifull]),
+            id="p2m_full",
+            happens_after=frozenset({"a", "p2m_full_0"})),
+        *coeff_insns,
+        ]
+
+    domains = [
+        "{[idim]: 0<=idim<dim}",
+        "{[ifull]: 1<=ifull<nfull}",
+        "{[icoeff]: 0<=icoeff<ncoeffs}",
+        ]
+    proj_ids = frozenset()
+    if proj_rows:
+        domains.append("{[irow, islot]: 0<=irow<nrows and 0<=islot<nslots}")
+        irow = var("irow")
+        islot = var("islot")
+        out = full[var("p2m_proj_out")[irow, islot]]
+        insns.append(
+            lp.Assignment(
+                assignee=out,
+                expression=out
+                    + full[var("p2m_proj_row")[irow]]
+                    * var("p2m_pde_coeffs")[var("p2m_proj_coeff")[irow, islot]],
+                id="p2m_proj",
+                happens_after=frozenset(
+                    {"p2m_full"}
+                    | {insn.id for insn in coeff_insns if insn.id is not None})))
+        proj_ids = frozenset({"p2m_proj"})
+
+    coeffs = var("coeffs")
+    icoeff = var("icoeff")
+    insns.append(
+        lp.Assignment(
+            assignee=coeffs[icoeff],
+            expression=coeffs[icoeff] + full[var("p2m_stored_to_full")[icoeff]],
+            id="coeffs",
+            happens_after=proj_ids | {"p2m_full", "p2m_full_0"}))
+
+    source_args = gather_loopy_source_arguments((expansion, *tuple(kernels)))
+
+    loopy_knl = lp.make_function(domains, insns,
+            kernel_data=[
+                lp.GlobalArg("coeffs",
+                    shape=(ncoeffs,), is_input=True, is_output=True),
+                lp.GlobalArg("center, source",
+                    shape=(dim,), is_input=True, is_output=False),
+                lp.GlobalArg("strength",
+                    shape=(nstrengths,), is_input=True, is_output=False),
+                lp.ValueArg("rscale", is_input=True),
+                lp.ValueArg("isrc", is_input=True),
+                lp.ValueArg("nsources", is_input=True),
+                lp.GlobalArg("sources",
+                    shape=(dim, "nsources"), is_input=True, is_output=False),
+                *source_args,
+                *temporaries,
+                ...],
+            name="p2e",
+            lang_version=lp.MOST_RECENT_LANGUAGE_VERSION,
+            fixed_parameters={
+                "dim": dim, "nfull": nfull, "ncoeffs": ncoeffs,
+                "nrows": len(proj_rows), "nslots": nslots},
+            )
+
+    loopy_knl = lp.tag_inames(loopy_knl, "idim*:unr")
+    for kernel in kernels:
+        loopy_knl = kernel.prepare_loopy_kernel(loopy_knl)
+
+    return loopy_knl
+
+# }}}
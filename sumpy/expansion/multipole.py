@@ -94,6 +94,18 @@ class VolumeTaylorMultipoleExpansionBase(
         return self.coefficients_from_source_vec((kernel,), avec, bvec,
                 rscale, (1,), sac=sac)
 
+    def loopy_expansion_formation(self, kernels, strength_usage, nstrengths):
+        from sumpy.expansion.loopy import (
+            make_p2m_loopy_kernel_for_volume_taylor,
+            supports_recurrence_p2m,
+        )
+        if supports_recurrence_p2m(self, kernels):
+            return make_p2m_loopy_kernel_for_volume_taylor(
+                self, kernels, strength_usage, nstrengths)
+
+        return super().loopy_expansion_formation(
+            kernels, strength_usage, nstrengths)
+
     def evaluate(self, kernel, coeffs, bvec, rscale, sac=None):
         from sumpy.derivative_taker import DifferentiatedExprDerivativeTaker
         if not self.use_rscale:
@@ -115,6 +127,16 @@ class VolumeTaylorMultipoleExpansionBase(
         result = sym.Add(*tuple(result))
         return result
 
+    def loopy_evaluator(self, kernels):
+        from sumpy.expansion.loopy import (
+            make_m2p_loopy_kernel_for_volume_taylor,
+            supports_recurrence_m2p,
+        )
+        if supports_recurrence_m2p(self, kernels):
+            return make_m2p_loopy_kernel_for_volume_taylor(self, kernels)
+
+        return super().loopy_evaluator(kernels)
+
     def translate_from(self, src_expansion, src_coeff_exprs, src_rscale,
             dvec, tgt_rscale, sac=None, _fast_version=True):
         if not isinstance(src_expansion, type(self)):
@@ -27,10 +27,15 @@ __doc__ = """Integrates :mod:`boxtree` with :mod:`sumpy`.
 
 .. autoclass:: SumpyTreeIndependentDataForWrangler
 .. autoclass:: SumpyExpansionWrangler
+.. autoclass:: FMMResourceEstimate
+.. autofunction:: drive_fmm_delta
 """
 
 
-from typing import Protocol, cast
+from collections import OrderedDict
+from contextlib import suppress
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, ClassVar, Protocol, cast
 
 from boxtree.fmm import ExpansionWranglerInterface, TreeIndependentDataForWrangler
 
@@ -52,6 +57,7 @@ from sumpy import (
     P2EFromSingleBox,
     P2PFromCSR,
 )
+from sumpy.fmm_profile import fmm_stage, kernel_launch
 from sumpy.tools import (
     AggregateProfilingEvent,
     get_native_event,
@@ -61,6 +67,12 @@ from sumpy.tools import (
 )
 
 
+if TYPE_CHECKING:
+    from collections.abc import Hashable
+
+    import numpy as np
+
+
 # {{{ tree-independent data for wrangler
 
 class SumpyTreeIndependentDataForWrangler(TreeIndependentDataForWrangler):
@@ -73,6 +85,8 @@ class SumpyTreeIndependentDataForWrangler(TreeIndependentDataForWrangler):
     Timing results returned by this wrangler contain the values *wall_elapsed*
     which measures elapsed wall time. This requires a command queue with
     profiling enabled.
+
+    .. automethod:: build_all
     """
 
     def __init__(self, cl_context,
@@ -193,11 +207,81 @@ class SumpyTreeIndependentDataForWrangler(TreeIndependentDataForWrangler):
                           exclude_self=self.exclude_self,
                           strength_usage=self.strength_usage, name="p2p")
 
+    @memoize_method
+    def p2p_matrix_subset(self, istrength):
+        """
+        :returns: a :class:`~sumpy.p2p.P2PMatrixSubsetGenerator` for the
+            interactions of the source kernels of :meth:`p2p` that use the
+            source strength *istrength*, or *None* if there are none.
+        """
+        p2p = self.p2p()
+        source_kernels = [
+                knl for knl, usage in zip(
+                    p2p.source_kernels, p2p.strength_usage, strict=True)
+                if usage == istrength]
+        if not source_kernels:
+            return None
+
+        from sumpy.p2p import P2PMatrixSubsetGenerator
+        return P2PMatrixSubsetGenerator(self.cl_context,
+                target_kernels=p2p.target_kernels,
+                source_kernels=source_kernels,
+                exclude_self=self.exclude_self, name="p2p_matrix_subset")
+
+    @memoize_method
+    def p2p_matrix_blocks(self):
+        from sumpy.p2p import P2PFromCSRMatrixBlocks
+        return P2PFromCSRMatrixBlocks(self.cl_context,
+                target_kernels=self.target_kernels,
+                source_kernels=self.source_kernels,
+                exclude_self=self.exclude_self,
+                strength_usage=self.strength_usage, name="p2p_matrix_blocks")
+
+    @memoize_method
+    def p2p_symmetric(self):
+        # The self interactions are excluded by P2PFromSymmetricBoxPairs
+        # itself, without a target_to_source mapping.
+        from sumpy.p2p import P2PFromSymmetricBoxPairs
+        return P2PFromSymmetricBoxPairs(self.cl_context,
+                target_kernels=self.target_kernels,
+                source_kernels=self.source_kernels,
+                exclude_self=False,
+                strength_usage=self.strength_usage, name="p2p_symmetric")
+
+    @memoize_method
+    def p2p_sparsity_pattern(self):
+        from sumpy.p2p import P2PFromCSRSparsityPattern
+        return P2PFromCSRSparsityPattern(self.cl_context,
+                target_kernels=self.target_kernels,
+                source_kernels=self.source_kernels,
+                exclude_self=self.exclude_self,
+                strength_usage=self.strength_usage,
+                name="p2p_sparsity_pattern")
+
     @memoize_method
     def opencl_fft_app(self, shape, dtype, inverse):
         with cl.CommandQueue(self.cl_context) as queue:
             return get_opencl_fft_app(queue, shape, dtype, inverse)
 
+    def build_all(self, level_orders, dtype, *,
+            expansion_dtype=None, box_sizes=(), use_translation_classes=None,
+            nprocs=None):
+        """Generate all kernels needed by a :class:`SumpyExpansionWrangler`
+        for a tree whose level *i* uses the order ``level_orders[i]`` ahead
+        of time, by default in a pool of processes with one process per
+        processor.
+
+        See :func:`sumpy.prewarm.prewarm_fmm_levels` for the arguments.
+
+        :returns: a :class:`sumpy.prewarm.PrewarmReport`.
+        """
+        from sumpy.prewarm import prewarm_fmm_levels
+        return prewarm_fmm_levels(self, level_orders, dtype,
+                expansion_dtype=expansion_dtype,
+                box_sizes=box_sizes,
+                use_translation_classes=use_translation_classes,
+                nprocs=nprocs)
+
 # }}}
 
 
@@ -262,6 +346,97 @@ class SumpyTimingFuture:
 # }}}
 
 
+# {{{ memory tracking
+
+class _MemoryTracker:
+    """An allocator for :mod:`pyopencl` arrays that keeps track of the peak
+    total size of the buffers it allocated that are alive at the same time.
+    """
+
+    def __init__(self, context):
+        from pyopencl.tools import ImmediateAllocator, MemoryPool
+        self.pool = MemoryPool(ImmediateAllocator(cl.CommandQueue(context)))
+        # Release buffers to the device once they are freed instead of
+        # holding on to them for reuse.
+        self.pool.stop_holding()
+
+        self.peak_nbytes = 0
+
+    def __call__(self, nbytes):
+        result = self.pool.allocate(nbytes)
+        self.peak_nbytes = max(self.peak_nbytes, self.pool.active_bytes)
+        return result
+
+    def reset_peak(self):
+        self.peak_nbytes = self.pool.active_bytes
+
+# }}}
+
+
+# {{{ resource estimation
+
+@dataclass(frozen=True)
+class FMMResourceEstimate:
+    """The resources needed for evaluating an FMM with a
+    :class:`SumpyExpansionWrangler`, as returned by
+    :meth:`SumpyExpansionWrangler.estimate_resources`.
+
+    .. attribute:: nbytes
+
+        A :class:`dict` mapping the kinds of device arrays allocated by the
+        wrangler to their total size in bytes:
+        ``"multipole_expansions"``, ``"local_expansions"`` and
+        ``"potentials"``, as well as
+        ``"preprocessed_multipole_expansions"``, ``"m2l_work_array"``,
+        ``"translation_classes_dependent_data"`` and ``"fft_workspace"``
+        (the outputs of the out-of-place FFTs) used by
+        :meth:`SumpyExpansionWrangler.multipole_to_local`. The latter are
+        only needed for one level at a time with
+        :attr:`SumpyExpansionWrangler.lean_memory`. ``"near_field_matrix"``
+        is the size of the stored near-field interactions, see
+        :attr:`SumpyExpansionWrangler.near_field_matrix_budget`, if they fit
+        into the budget. Temporary arrays, such as
+        the sums formed by :func:`boxtree.fmm.drive_fmm`, are not included.
+
+    .. attribute:: ninteractions
+
+        A :class:`dict` mapping the names of the FMM stages (see
+        :func:`sumpy.fmm_profile.fmm_stage`) to the number of interactions
+        computed by their kernels, as in
+        :attr:`sumpy.fmm_profile.KernelLaunchRecord.ninteractions`. For the
+        preprocessing and postprocessing of the multipole-to-local
+        translations, each box of a level counts as one interaction.
+
+    .. attribute:: flops
+
+        A :class:`dict` mapping the names of the FMM stages to the estimated
+        number of floating point operations of their kernels, i.e. the number
+        of interactions times the
+        :attr:`~sumpy.fmm_profile.KernelLaunchRecord.op_count` of the
+        generated kernels. FFTs and the computation of the translation-class
+        dependent data are not included.
+
+    .. autoattribute:: total_nbytes
+    .. autoattribute:: total_flops
+    """
+
+    nbytes: dict[str, int]
+    ninteractions: dict[str, int]
+    flops: dict[str, int]
+
+    @property
+    def total_nbytes(self) -> int:
+        """Total size in bytes of the arrays in :attr:`nbytes`."""
+        return sum(self.nbytes.values())
+
+    @property
+    def total_flops(self) -> int:
+        """Total number of floating point operations in :attr:`flops`."""
+        return sum(self.flops.values())
+
+# }}}
+
+
 # {{{ expansion wrangler
 
 class SumpyExpansionWrangler(ExpansionWranglerInterface):
@@ -284,31 +459,198 @@ class SumpyExpansionWrangler(ExpansionWranglerInterface):
         self interactions (source and target particles are the same),
         provided special handling is needed
 
+    .. attribute:: expansion_dtype
+
+        Type of the multipole and local expansions, *dtype* unless given.
+        It may be of lower precision than *dtype* (e.g.
+        :class:`numpy.float32` for :class:`numpy.float64`), in which case
+        the expansions are stored in lower precision, and the
+        multipole-to-local translations using translation classes (as well
+        as their translation-class dependent data) are also computed in
+        lower precision. The other translations, the near field
+        (:meth:`eval_direct`) and the potentials are computed in *dtype*.
+        The expansion orders should then not ask for more accuracy than
+        the expansions can hold, see e.g. the *expansion_dtype* argument of
+        :class:`sumpy.expansion.level_to_order.SimpleExpansionOrderFinder`.
+
     .. attribute:: preprocessed_mpole_dtype
 
         Type for the preprocessed multipole expansion if used for M2L.
+
+    .. attribute:: overlap_stages
+
+        If *True*, the near-field interactions with the boxes of list 1
+        (:meth:`eval_direct`) and the local expansions formed from sources
+        (:meth:`form_locals`) are computed on separate in-order command
+        queues on the same device as the queue of the source weights, so that
+        they can overlap with each other, the upward pass and the
+        multipole-to-local translations on multi-core devices. The returned
+        arrays still refer to the queue of the source weights.
+
+        The queues wait for each other through barriers waiting for markers,
+        without blocking the host. The separate queues wait for the queue of
+        the source weights after :meth:`reorder_sources`. The queue of the
+        source weights waits for the near field after
+        :meth:`eval_multipoles`, for :meth:`form_locals` at its end and for
+        both after :meth:`eval_locals`. This is where
+        :func:`boxtree.fmm.drive_fmm` first uses their results, so the
+        results of :meth:`eval_direct` may only be used after
+        :meth:`eval_multipoles`. The timing data of each stage refers to the
+        queue it ran on.
+
+    .. attribute:: lean_memory
+
+        If *True*, the buffers that are only needed while translating the
+        multipole expansions of one level to local expansions (the
+        preprocessed multipole expansions, the M2L work arrays and the
+        translation-class dependent data) are allocated by
+        :meth:`multipole_to_local` just before the level is processed and
+        released right after, rather than for all the levels at once. The
+        translation-class dependent data is then not kept between runs, but
+        still shared through :attr:`m2l_precompute_cache` if possible. This
+        reduces the peak memory use (see :attr:`peak_memory_nbytes`) at the
+        cost of recomputing or copying the translation-class dependent data
+        for every run. The reduction is only partial: the multipole and local
+        expansions (and the potentials) are still allocated for the whole
+        tree, so the savings are limited to the size of the M2L buffers of
+        all but the largest level.
+
+    .. attribute:: near_field_matrix_budget
+
+        If not *None*, a size in bytes. The interactions of the targets with
+        the sources in their list of neighbor source boxes (list 1) are then
+        computed once, as a dense matrix block for each target box and each
+        source box in its list, and kept on the device if the blocks take at
+        most this many bytes. :meth:`eval_direct` then applies the blocks to
+        the source weights (see :class:`~sumpy.p2p.P2PFromCSRMatrixBlocks`)
+        instead of evaluating the kernel, which pays off if the FMM is
+        applied many times with the same sources and targets, e.g. in an
+        iterative solver. If the blocks take more memory, the interactions
+        are evaluated on the fly as usual. The blocks are computed on the
+        first call of :meth:`eval_direct` with list 1 of the traversal and
+        are included in :meth:`estimate_resources`, but not in
+        :attr:`peak_memory_nbytes`.
+
+    .. attribute:: symmetric_p2p
+
+        If *True*, the interactions of the targets with the sources in their
+        list of neighbor source boxes (list 1) are evaluated only once for
+        each pair of particles and added to the potentials of both, see
+        :class:`~sumpy.p2p.P2PFromSymmetricBoxPairs`, which modestly reduces
+        the cost of :meth:`eval_direct`. This requires the sources of the
+        tree to be its targets, the self interactions to be excluded (where
+        target ``i`` is assumed to be source ``i`` in tree order), a single
+        symmetric kernel and a CPU device. To avoid races, the pairs of
+        boxes are grouped so that no box occurs twice in a group, with a
+        kernel launch for each group. The interactions are evaluated from
+        both sides as usual if list 1 is not symmetric or if
+        :attr:`near_field_matrix_budget` is used.
+
+    .. attribute:: peak_memory_nbytes
+
+        With :attr:`lean_memory`, the peak total size in bytes of the device
+        arrays allocated by the wrangler (the expansions, potentials, M2L work
+        arrays and translation-class dependent data, and arrays computed from
+        them, such as their sums in :func:`boxtree.fmm.drive_fmm`) that were
+        alive at the same time since the start of the last run, i.e. the last
+        call to :meth:`reorder_sources`. Arrays allocated by the caller or
+        internally by the kernels are not included. Otherwise *None*, as
+        the arrays are then allocated by the default allocator of
+        :mod:`pyopencl` without tracking, see :meth:`estimate_resources`
+        instead.
+
+    .. attribute:: persist_m2l_precompute
+
+        If *True*, the translation-class dependent data computed by
+        :meth:`multipole_to_local_precompute` is also stored in (and looked
+        up from) the on-disk cache :data:`sumpy.m2l_precompute_cache`, so
+        that it is reused across processes. In any case, it is shared between
+        wranglers in the same process through
+        :attr:`m2l_precompute_cache`.
+
+    .. attribute:: m2l_precompute_cache
+
+        A class-level in-memory cache of the translation-class dependent data
+        of a level, keyed on the M2L translation, the expansions, the scaling,
+        the translation vectors of the level and :attr:`kernel_extra_kwargs`.
+        At most :attr:`m2l_precompute_cache_max_entries` levels are kept,
+        least recently used first to be evicted.
+
+    If the kernel is homogeneous (see
+    :attr:`sumpy.kernel.Kernel.homogeneity_degree`) and the multipole-to-local
+    translation uses translation classes with
+    :class:`~sumpy.expansion.m2l.VolumeTaylorM2LTranslation`, the
+    translation-class dependent data of all the levels with the same order
+    is derived from that of a reference level (the coarsest of them), see
+    :meth:`m2l_scale_invariant_reference_levels`. It is then only computed
+    and stored once for each order.
     """
 
+    m2l_precompute_cache: ClassVar[OrderedDict[Hashable, np.ndarray]] = \
+            OrderedDict()
+    m2l_precompute_cache_max_entries: ClassVar[int] = 128
+
     def __init__(self, tree_indep, traversal, dtype, fmm_level_to_order,
             source_extra_kwargs=None,
             kernel_extra_kwargs=None,
             self_extra_kwargs=None,
             translation_classes_data=None,
             preprocessed_mpole_dtype=None,
-            *, _disable_translation_classes=False):
+            *, _disable_translation_classes=False,
+            _disable_scale_invariant_m2l=False,
+            overlap_stages=False,
+            persist_m2l_precompute=False,
+            expansion_dtype=None,
+            lean_memory=False,
+            near_field_matrix_budget=None,
+            symmetric_p2p=False):
         super().__init__(tree_indep, traversal)
         self.issued_timing_data_warning = False
 
+        self.lean_memory = lean_memory
+        self.near_field_matrix_budget = near_field_matrix_budget
+
+        if symmetric_p2p:
+            if not traversal.tree.sources_are_targets:
+                raise ValueError(
+                        "symmetric_p2p requires the sources to be the targets")
+            if not tree_indep.exclude_self:
+                raise ValueError(
+                        "symmetric_p2p requires the self interactions "
+                        "to be excluded")
+            # raises if the kernels or the device are not supported
+            tree_indep.p2p_symmetric()
+        self.symmetric_p2p = symmetric_p2p
+
+        self._memory_tracker = (
+            _MemoryTracker(tree_indep.cl_context) if lean_memory else None)
+
+        self.overlap_stages = overlap_stages
+        self.persist_m2l_precompute = persist_m2l_precompute
+        # maps a command queue to the queues used for its overlapped stages
+        self._stage_queues: dict[cl.CommandQueue,
+                                 dict[str, cl.CommandQueue]] = {}
+
         self.dtype = dtype
 
+        if expansion_dtype is None:
+            expansion_dtype = dtype
+        else:
+            import numpy as np
+            if np.dtype(expansion_dtype).kind != np.dtype(dtype).kind:
+                raise ValueError(
+                    f"expansion_dtype '{np.dtype(expansion_dtype)}' must be "
+                    f"of the same kind as dtype '{np.dtype(dtype)}'")
+        self.expansion_dtype = expansion_dtype
+
         if not self.tree_indep.m2l_translation.use_fft:
             # If not FFT, we don't need complex dtypes
-            self.preprocessed_mpole_dtype = dtype
+            self.preprocessed_mpole_dtype = expansion_dtype
         elif preprocessed_mpole_dtype is not None:
             self.preprocessed_mpole_dtype = preprocessed_mpole_dtype
         else:
             # FIXME: It is weird that the wrangler has to compute this.
-            self.preprocessed_mpole_dtype = to_complex_dtype(dtype)
+            self.preprocessed_mpole_dtype = to_complex_dtype(expansion_dtype)
 
         if source_extra_kwargs is None:
             source_extra_kwargs = {}
@@ -347,6 +689,64 @@ class SumpyExpansionWrangler(ExpansionWranglerInterface):
             self.supports_translation_classes = True
 
         self.translation_classes_data = translation_classes_data
+        self._disable_scale_invariant_m2l = _disable_scale_invariant_m2l
+
+    @property
+    def peak_memory_nbytes(self):
+        if self._memory_tracker is None:
+            return None
+
+        return self._memory_tracker.peak_nbytes
+
+    # {{{ overlapped execution of stages
+
+    _OVERLAPPED_STAGES = ("near_field", "form_locals")
+
+    def _get_stage_queue(self, queue, stage):
+        """Return the command queue on which the work of *stage* (one of
+        :attr:`_OVERLAPPED_STAGES`) is enqueued if it would otherwise be
+        enqueued on *queue*.
+        """
+        if not self.overlap_stages:
+            return queue
+
+        try:
+            stage_queues = self._stage_queues[queue]
+        except KeyError:
+            stage_queues = self._stage_queues[queue] = {
+                    name: cl.CommandQueue(queue.context, queue.device,
+                                          properties=queue.properties)
+                    for name in self._OVERLAPPED_STAGES}
+
+        return stage_queues[stage]
+
+    def _stage_queues_wait_for(self, queue):
+        """Make the work enqueued on the stage queues of *queue* from now on
+        wait for all the work enqueued on *queue* so far.
+        """
+        if not self.overlap_stages:
+            return
+
+        marker = cl.enqueue_marker(queue)
+        for stage in self._OVERLAPPED_STAGES:
+            cl.enqueue_barrier(self._get_stage_queue(queue, stage),
+                               wait_for=[marker])
+
+    def _wait_for_stage_queues(self, queue, stages=_OVERLAPPED_STAGES):
+        """Make the work enqueued on *queue* from now on wait for all the work
+        enqueued on the queues of *stages* so far. The stage queues themselves
+        do not wait, so that stages enqueued later can still overlap with the
+        work on *queue*.
+        """
+        if not self.overlap_stages:
+            return
+
+        markers = [
+                cl.enqueue_marker(self._get_stage_queue(queue, stage))
+                for stage in stages]
+        cl.enqueue_barrier(queue, wait_for=markers)
+
+    # }}}
 
     def level_to_rscale(self, level):
         tree = self.tree
@@ -389,16 +789,17 @@ class SumpyExpansionWrangler(ExpansionWranglerInterface):
             data = self.translation_classes_data
             return data.from_sep_siblings_translation_classes_level_starts.get(queue)
 
+    def _m2l_translation_classes_dependent_ndata(self, order):
+        mpole_expn = self.tree_indep.multipole_expansion(order)
+        local_expn = self.tree_indep.local_expansion(order)
+        m2l_translation = local_expn.m2l_translation
+        return m2l_translation.translation_classes_dependent_ndata(
+                local_expn, mpole_expn)
+
     @memoize_method
     def m2l_translation_classes_dependent_data_level_starts(self):
-        def order_to_size(order):
-            mpole_expn = self.tree_indep.multipole_expansion(order)
-            local_expn = self.tree_indep.local_expansion(order)
-            m2l_translation = local_expn.m2l_translation
-            return m2l_translation.translation_classes_dependent_ndata(
-                    local_expn, mpole_expn)
-
-        return build_csr_level_starts(self.level_orders, order_to_size,
+        return build_csr_level_starts(self.level_orders,
+                self._m2l_translation_classes_dependent_ndata,
                 level_starts=self.m2l_translation_class_level_start_box_nrs())
 
     def multipole_expansion_zeros(self, template_ary):
@@ -413,7 +814,8 @@ class SumpyExpansionWrangler(ExpansionWranglerInterface):
         return cl_array.zeros(
                 template_ary.queue,
                 self.multipole_expansions_level_starts()[-1],
-                dtype=self.dtype)
+                dtype=self.expansion_dtype,
+                allocator=self._memory_tracker)
 
     def local_expansion_zeros(self, template_ary):
         """Return an expansions array (which must support addition)
@@ -427,21 +829,25 @@ class SumpyExpansionWrangler(ExpansionWranglerInterface):
         return cl_array.zeros(
                 template_ary.queue,
                 self.local_expansions_level_starts()[-1],
-                dtype=self.dtype)
+                dtype=self.expansion_dtype,
+                allocator=self._memory_tracker)
 
     def m2l_translation_classes_dependent_data_zeros(self, queue):
-        result = []
-        for level in range(self.tree.nlevels):
-            expn_start, expn_stop = \
-                self.m2l_translation_classes_dependent_data_level_starts()[
-                    level:level+2]
-            translation_class_start, translation_class_stop = \
-                self.m2l_translation_class_level_start_box_nrs()[level:level+2]
-            exprs_level = cl_array.zeros(queue, expn_stop - expn_start,
-                                 dtype=self.preprocessed_mpole_dtype)
-            result.append(exprs_level.reshape(
-                            translation_class_stop - translation_class_start, -1))
-        return result
+        return [
+            self._m2l_translation_classes_dependent_data_level_zeros(queue, level)
+            for level in range(self.tree.nlevels)]
+
+    def _m2l_translation_classes_dependent_data_level_zeros(self, queue, level):
+        expn_start, expn_stop = \
+            self.m2l_translation_classes_dependent_data_level_starts()[
+                level:level+2]
+        translation_class_start, translation_class_stop = \
+            self.m2l_translation_class_level_start_box_nrs()[level:level+2]
+        exprs_level = cl_array.zeros(queue, expn_stop - expn_start,
+                             dtype=self.preprocessed_mpole_dtype,
+                             allocator=self._memory_tracker)
+        return exprs_level.reshape(
+                translation_class_stop - translation_class_start, -1)
 
     def multipole_expansions_view(self, mpole_exps, level):
         expn_start, expn_stop = \
@@ -461,8 +867,11 @@ class SumpyExpansionWrangler(ExpansionWranglerInterface):
 
     def m2l_translation_classes_dependent_data_view(self,
                 m2l_translation_classes_dependent_data, level):
-        translation_class_start, _ = \
-            self.m2l_translation_class_level_start_box_nrs()[level:level+2]
+        if self.m2l_scale_invariant_reference_levels() is not None:
+            translation_class_start = 0
+        else:
+            translation_class_start, _ = \
+                self.m2l_translation_class_level_start_box_nrs()[level:level+2]
         exprs_level = m2l_translation_classes_dependent_data[level]
         return (translation_class_start, exprs_level)
 
@@ -479,15 +888,18 @@ class SumpyExpansionWrangler(ExpansionWranglerInterface):
                 level_starts=self.tree.level_start_box_nrs)
 
     def m2l_preproc_mpole_expansion_zeros(self, template_ary):
-        result = []
-        for level in range(self.tree.nlevels):
-            expn_start, expn_stop = \
-                self.m2l_preproc_mpole_expansions_level_starts()[level:level+2]
-            box_start, box_stop = self.tree.level_start_box_nrs[level:level+2]
-            exprs_level = cl_array.zeros(template_ary.queue, expn_stop - expn_start,
-                                 dtype=self.preprocessed_mpole_dtype)
-            result.append(exprs_level.reshape(box_stop - box_start, -1))
-        return result
+        return [
+            self._m2l_preproc_mpole_expansion_level_zeros(template_ary, level)
+            for level in range(self.tree.nlevels)]
+
+    def _m2l_preproc_mpole_expansion_level_zeros(self, template_ary, level):
+        expn_start, expn_stop = \
+            self.m2l_preproc_mpole_expansions_level_starts()[level:level+2]
+        box_start, box_stop = self.tree.level_start_box_nrs[level:level+2]
+        exprs_level = cl_array.zeros(template_ary.queue, expn_stop - expn_start,
+                             dtype=self.preprocessed_mpole_dtype,
+                             allocator=self._memory_tracker)
+        return exprs_level.reshape(box_stop - box_start, -1)
 
     def m2l_preproc_mpole_expansions_view(self, mpole_exps, level):
         box_start, _ = self.tree.level_start_box_nrs[level:level+2]
@@ -514,11 +926,20 @@ class SumpyExpansionWrangler(ExpansionWranglerInterface):
                 cl_array.zeros(
                     template_ary.queue,
                     self.tree.ntargets,
-                    dtype=self.dtype)
+                    dtype=self.dtype,
+                    allocator=self._memory_tracker)
                 for k in self.tree_indep.target_kernels])
 
     def reorder_sources(self, source_array):
-        return source_array.with_queue(source_array.queue)[self.tree.user_source_ids]
+        if self._memory_tracker is not None:
+            self._memory_tracker.reset_peak()
+
+        result = source_array.with_queue(source_array.queue)[
+                self.tree.user_source_ids]
+        # the overlapped stages read the reordered weights
+        self._stage_queues_wait_for(result.queue)
+
+        return result
 
     def reorder_potentials(self, potentials):
         import numpy as np
@@ -578,6 +999,355 @@ class SumpyExpansionWrangler(ExpansionWranglerInterface):
             inverse)
         return run_opencl_fft(app, queue, input_vec, inverse, wait_for)
 
+    # {{{ profiling
+
+    def _interaction_counter(self, target_boxes, starts=None, lists=None, *,
+            per_box=None, per_list_box=None):
+        """Return a callable that counts the interactions of a kernel launched
+        for *target_boxes*, for
+        :attr:`sumpy.fmm_profile.KernelLaunchRecord.ninteractions`.
+
+        If *starts* and *lists* are given, each target box interacts with the
+        boxes in its part of the CSR list *lists*, otherwise with itself.
+
+        :arg per_box: *None* if each target box counts once, or
+            ``"sources"``, ``"targets"`` or ``"children"`` if it counts once
+            for each of its sources, targets or children.
+        :arg per_list_box: *None* if each box in *lists* counts once, or
+            ``"sources"`` if it counts once for each of its sources.
+        """
+        import numpy as np
+
+        def get_box_weights(queue, kind, boxes):
+            if kind is None:
+                return np.ones(len(boxes), dtype=np.int64)
+            elif kind == "sources":
+                counts = self.box_source_list_kwargs()["box_source_counts_nonchild"]
+            elif kind == "targets":
+                counts = self.box_target_list_kwargs()["box_target_counts_nonchild"]
+            elif kind == "children":
+                child_ids = self.tree.box_child_ids.get(queue)
+                return np.sum(child_ids[:, boxes] != 0, axis=0)
+            else:
+                raise ValueError(f"unknown interaction weight: '{kind}'")
+
+            return counts.get(queue)[boxes].astype(np.int64)
+
+        def count_interactions():
+            with cl.CommandQueue(self.tree_indep.cl_context) as queue:
+                boxes = target_boxes.get(queue)
+                box_weights = get_box_weights(queue, per_box, boxes)
+                if starts is None:
+                    return int(np.sum(box_weights))
+
+                starts_host = starts.get(queue)
+                lists_host = lists.get(queue)
+                list_weights = np.cumsum(
+                        get_box_weights(queue, per_list_box, lists_host))
+                list_weights = np.concatenate([[0], list_weights])
+
+                return int(np.sum(box_weights * (
+                    list_weights[starts_host[1:]]
+                    - list_weights[starts_host[:-1]])))
+
+        return count_interactions
+
+    # }}}
+
+    # {{{ resource estimation
+
+    def _get_kernel_launches(self):
+        """Yield a tuple ``(stage, knl, kwargs, count_interactions)`` for each
+        kernel launched by :func:`boxtree.fmm.drive_fmm`,
+        where *kwargs* are the arguments of
+        :meth:`~sumpy.tools.KernelCacheMixin.get_cached_kernel_executor` that
+        the stage uses for *knl* and *count_interactions* is as in
+        :meth:`_interaction_counter`.
+        """
+        import numpy as np
+
+        from sumpy.tools import is_obj_array_like
+
+        tree = self.tree
+        trav = self.traversal
+        tree_indep = self.tree_indep
+        orders = self.level_orders
+
+        def count_boxes(nboxes):
+            return lambda: int(nboxes)
+
+        p2e_kwargs = {
+                "sources_is_obj_array": is_obj_array_like(
+                    self.box_source_list_kwargs()["sources"]),
+                "centers_is_obj_array": False}
+
+        for lev in range(tree.nlevels):
+            start, stop = trav.level_start_source_box_nrs[lev:lev+2]
+            if start == stop:
+                continue
+
+            yield ("form_multipoles", tree_indep.p2m(orders[lev]), p2e_kwargs,
+                    self._interaction_counter(
+                        trav.source_boxes[start:stop], per_box="sources"))
+
+        for source_level in range(tree.nlevels-1, 2, -1):
+            target_level = source_level - 1
+            start, stop = trav.level_start_source_parent_box_nrs[
+                            target_level:target_level+2]
+            if start == stop:
+                continue
+
+            yield ("coarsen_multipoles",
+                    tree_indep.m2m(orders[source_level], orders[target_level]), {},
+                    self._interaction_counter(
+                        trav.source_parent_boxes[start:stop], per_box="children"))
+
+        p2p = tree_indep.p2p()
+        if p2p.is_gpu:
+            source_dtype = np.dtype(tree.coord_dtype)
+            strength_dtype = np.dtype(self.dtype)
+        else:
+            source_dtype = strength_dtype = None
+        p2p_kwargs = {
+                "max_nsources_in_one_box": self.max_nsources_in_one_box,
+                "max_ntargets_in_one_box": self.max_ntargets_in_one_box,
+                "source_dtype": source_dtype,
+                "strength_dtype": strength_dtype}
+
+        use_near_field_matrix = (
+                self.near_field_matrix_budget is not None
+                and 0 < self._near_field_matrix_nbytes()
+                <= self.near_field_matrix_budget)
+
+        for starts, lists in [
+                (trav.neighbor_source_boxes_starts,
+                    trav.neighbor_source_boxes_lists),
+                (trav.from_sep_close_smaller_starts,
+                    trav.from_sep_close_smaller_lists),
+                (trav.from_sep_close_bigger_starts,
+                    trav.from_sep_close_bigger_lists)]:
+            if starts is None:
+                continue
+
+            is_list1 = lists is trav.neighbor_source_boxes_lists
+            symmetric_pairs = (
+                    self._symmetric_p2p_pairs()
+                    if self.symmetric_p2p and is_list1
+                    and not use_near_field_matrix else None)
+
+            if symmetric_pairs is not None:
+                color_starts, _, _, pair_ninteractions = symmetric_pairs
+                for start, stop in zip(
+                        color_starts[:-1], color_starts[1:], strict=True):
+                    ninteractions = int(np.sum(pair_ninteractions[start:stop]))
+                    yield ("eval_direct", tree_indep.p2p_symmetric(),
+                            {"sources_is_obj_array": is_obj_array_like(
+                                tree.sources)},
+                            lambda ninteractions=ninteractions: ninteractions)
+                continue
+
+            if use_near_field_matrix and is_list1:
+                knl, kwargs = tree_indep.p2p_matrix_blocks(), {}
+            else:
+                knl, kwargs = p2p, p2p_kwargs
+
+            yield ("eval_direct", knl, kwargs,
+                    self._interaction_counter(trav.target_boxes, starts, lists,
+                        per_box="targets", per_list_box="sources"))
+
+        use_preprocessing = tree_indep.m2l_translation.use_preprocessing
+        for lev in range(tree.nlevels):
+            start, stop = trav.level_start_target_or_target_parent_box_nrs[
+                    lev:lev+2]
+            if start == stop:
+                continue
+
+            order = orders[lev]
+            nboxes_level = (tree.level_start_box_nrs[lev + 1]
+                            - tree.level_start_box_nrs[lev])
+
+            if self.supports_translation_classes:
+                tr_classes = self.m2l_translation_class_level_start_box_nrs()
+                if tr_classes[lev] == tr_classes[lev + 1]:
+                    # There is no M2L happening in this level
+                    continue
+
+            if use_preprocessing:
+                yield ("multipole_to_local",
+                        tree_indep.m2l_preprocess_mpole_kernel(order, order),
+                        {"result_dtype": np.dtype(self.preprocessed_mpole_dtype)},
+                        count_boxes(nboxes_level))
+
+            if not self.supports_translation_classes:
+                m2l_kwargs = {}
+            elif use_preprocessing:
+                m2l_kwargs = {
+                    "result_dtype": np.dtype(self.preprocessed_mpole_dtype)}
+            else:
+                m2l_kwargs = {"result_dtype": np.dtype(self.expansion_dtype)}
+
+            yield ("multipole_to_local",
+                    tree_indep.m2l(order, order, self.supports_translation_classes),
+                    m2l_kwargs,
+                    self._interaction_counter(
+                        trav.target_or_target_parent_boxes[start:stop],
+                        trav.from_sep_siblings_starts[start:stop+1],
+                        trav.from_sep_siblings_lists))
+
+            if use_preprocessing:
+                yield ("multipole_to_local",
+                        tree_indep.m2l_postprocess_local_kernel(order, order),
+                        {"result_dtype": np.dtype(self.expansion_dtype)},
+                        count_boxes(nboxes_level))
+
+        for isrc_level, ssn in enumerate(trav.from_sep_smaller_by_level):
+            target_boxes = trav.target_boxes_sep_smaller_by_source_level[isrc_level]
+            if len(target_boxes) == 0:
+                continue
+
+            yield ("eval_multipoles", tree_indep.m2p(orders[isrc_level]), {},
+                    self._interaction_counter(target_boxes,
+                        ssn.starts, ssn.lists, per_box="targets"))
+
+        for lev in range(tree.nlevels):
+            start, stop = trav.level_start_target_or_target_parent_box_nrs[
+                    lev:lev+2]
+            if start == stop:
+                continue
+
+            yield ("form_locals", tree_indep.p2l(orders[lev]), p2e_kwargs,
+                    self._interaction_counter(
+                        trav.target_or_target_parent_boxes[start:stop],
+                        trav.from_sep_bigger_starts[start:stop+1],
+                        trav.from_sep_bigger_lists, per_list_box="sources"))
+
+        for target_lev in range(1, tree.nlevels):
+            start, stop = trav.level_start_target_or_target_parent_box_nrs[
+                    target_lev:target_lev+2]
+            if start == stop:
+                continue
+
+            yield ("refine_locals",
+                    tree_indep.l2l(orders[target_lev - 1], orders[target_lev]), {},
+                    self._interaction_counter(
+                        trav.target_or_target_parent_boxes[start:stop]))
+
+        for lev in range(tree.nlevels):
+            start, stop = trav.level_start_target_box_nrs[lev:lev+2]
+            if start == stop:
+                continue
+
+            yield ("eval_locals", tree_indep.l2p(orders[lev]), {},
+                    self._interaction_counter(
+                        trav.target_boxes[start:stop], per_box="targets"))
+
+    def _estimate_nbytes(self):
+        import numpy as np
+
+        expansion_itemsize = np.dtype(self.expansion_dtype).itemsize
+        preproc_itemsize = np.dtype(self.preprocessed_mpole_dtype).itemsize
+
+        result = {
+            "multipole_expansions": (expansion_itemsize
+                * int(self.multipole_expansions_level_starts()[-1])),
+            "local_expansions": (expansion_itemsize
+                * int(self.local_expansions_level_starts()[-1])),
+            "preprocessed_multipole_expansions": 0,
+            "m2l_work_array": 0,
+            "translation_classes_dependent_data": 0,
+            "fft_workspace": 0,
+            "potentials": (np.dtype(self.dtype).itemsize
+                * len(self.tree_indep.target_kernels) * self.tree.ntargets),
+            "near_field_matrix": 0,
+            }
+
+        if self.near_field_matrix_budget is not None:
+            near_field_matrix_nbytes = self._near_field_matrix_nbytes()
+            if near_field_matrix_nbytes <= self.near_field_matrix_budget:
+                result["near_field_matrix"] = near_field_matrix_nbytes
+
+        if not self.supports_translation_classes:
+            return result
+
+        tr_classes = self.m2l_translation_class_level_start_box_nrs()
+        levels_with_m2l = [lev for lev in range(self.tree.nlevels)
+                           if tr_classes[lev] < tr_classes[lev + 1]]
+        if not levels_with_m2l:
+            return result
+
+        reference_levels = self.m2l_scale_invariant_reference_levels()
+        if reference_levels is None:
+            level_data_nbytes = preproc_itemsize * np.diff(
+                self.m2l_translation_classes_dependent_data_level_starts())
+            data_nbytes = int(np.sum(level_data_nbytes))
+            level_data_nbytes = [int(level_data_nbytes[lev])
+                                 for lev in levels_with_m2l]
+        else:
+            _, reference_vectors = self._m2l_scale_invariant_translation_classes()
+            reference_nbytes = {
+                ref_lev: preproc_itemsize * vectors.shape[1]
+                * self._m2l_translation_classes_dependent_ndata(
+                    self.level_orders[ref_lev])
+                for ref_lev, vectors in reference_vectors.items()}
+            data_nbytes = sum(reference_nbytes.values())
+            level_data_nbytes = [reference_nbytes[reference_levels[lev]]
+                                 for lev in levels_with_m2l]
+
+        if self.tree_indep.m2l_translation.use_preprocessing:
+            level_preproc_nbytes = preproc_itemsize * np.diff(
+                self.m2l_preproc_mpole_expansions_level_starts())
+            preproc_nbytes = int(np.sum(level_preproc_nbytes))
+            level_preproc_nbytes = [int(level_preproc_nbytes[lev])
+                                    for lev in levels_with_m2l]
+        else:
+            preproc_nbytes = 0
+            level_preproc_nbytes = [0]
+
+        if self.lean_memory:
+            data_nbytes = max(level_data_nbytes)
+            preproc_nbytes = max(level_preproc_nbytes)
+
+        result["preprocessed_multipole_expansions"] = preproc_nbytes
+        result["m2l_work_array"] = preproc_nbytes
+        result["translation_classes_dependent_data"] = data_nbytes
+        if self.tree_indep.m2l_translation.use_fft:
+            result["fft_workspace"] = max(
+                    level_data_nbytes + level_preproc_nbytes)
+
+        return result
+
+    def estimate_resources(self):
+        """Estimate the device memory and the floating point operations needed
+        for evaluating the FMM with :func:`boxtree.fmm.drive_fmm`, without
+        allocating any of the arrays of the expansions or potentials.
+
+        The operation counts are obtained from the kernels the FMM will use,
+        which are generated (and stored in :data:`sumpy.code_cache`) if
+        needed, but not compiled.
+
+        :returns: a :class:`FMMResourceEstimate`.
+        """
+        from sumpy.fmm_profile import _get_op_count
+
+        ninteractions = {}
+        flops = {}
+        for stage, knl, kwargs, count_interactions in \
+                self._get_kernel_launches():
+            op_count = _get_op_count(knl.get_cached_kernel_executor(**kwargs))
+
+            stage_ninteractions = count_interactions()
+            ninteractions[stage] = \
+                    ninteractions.get(stage, 0) + stage_ninteractions
+            flops[stage] = flops.get(stage, 0) + op_count * stage_ninteractions
+
+        return FMMResourceEstimate(
+                nbytes=self._estimate_nbytes(),
+                ninteractions=ninteractions,
+                flops=flops)
+
+    # }}}
+
+    @fmm_stage("form_multipoles")
     def form_multipoles(self,
             level_start_source_box_nrs, source_boxes,
             src_weight_vecs):
@@ -598,22 +1368,27 @@ class SumpyExpansionWrangler(ExpansionWranglerInterface):
             level_start_ibox, mpoles_view = self.multipole_expansions_view(
                     mpoles, lev)
 
-            evt, (mpoles_res,) = p2m(
-                    queue,
-                    source_boxes=source_boxes[start:stop],
-                    centers=self.tree.box_centers,
-                    strengths=src_weight_vecs,
-                    tgt_expansions=mpoles_view,
-                    tgt_base_ibox=level_start_ibox,
-                    rscale=self.level_to_rscale(lev),
-
-                    **kwargs)
+            with kernel_launch(level=lev, order=self.level_orders[lev],
+                    nboxes=stop - start,
+                    count_interactions=self._interaction_counter(
+                        source_boxes[start:stop], per_box="sources")):
+                evt, (mpoles_res,) = p2m(
+                        queue,
+                        source_boxes=source_boxes[start:stop],
+                        centers=self.tree.box_centers,
+                        strengths=src_weight_vecs,
+                        tgt_expansions=mpoles_view,
+                        tgt_base_ibox=level_start_ibox,
+                        rscale=self.level_to_rscale(lev),
+
+                        **kwargs)
             events.append(evt)
 
             assert mpoles_res is mpoles_view
 
         return (mpoles, SumpyTimingFuture(queue, events))
 
+    @fmm_stage("coarsen_multipoles")
     def coarsen_multipoles(self,
             level_start_source_parent_box_nrs,
             source_parent_boxes,
@@ -636,7 +1411,6 @@ class SumpyExpansionWrangler(ExpansionWranglerInterface):
             start, stop = level_start_source_parent_box_nrs[
                             target_level:target_level+2]
             if start == stop:
-                print("source", source_level, "empty")
                 continue
 
             m2m = self.tree_indep.m2m(
@@ -648,21 +1422,26 @@ class SumpyExpansionWrangler(ExpansionWranglerInterface):
             target_level_start_ibox, target_mpoles_view = \
                     self.multipole_expansions_view(mpoles, target_level)
 
-            evt, (mpoles_res,) = m2m(
-                    queue,
-                    src_expansions=source_mpoles_view,
-                    src_base_ibox=source_level_start_ibox,
-                    tgt_expansions=target_mpoles_view,
-                    tgt_base_ibox=target_level_start_ibox,
-
-                    target_boxes=source_parent_boxes[start:stop],
-                    box_child_ids=self.tree.box_child_ids,
-                    centers=self.tree.box_centers,
-
-                    src_rscale=self.level_to_rscale(source_level),
-                    tgt_rscale=self.level_to_rscale(target_level),
-
-                    **self.kernel_extra_kwargs)
+            with kernel_launch(level=target_level,
+                    order=self.level_orders[target_level],
+                    nboxes=stop - start,
+                    count_interactions=self._interaction_counter(
+                        source_parent_boxes[start:stop], per_box="children")):
+                evt, (mpoles_res,) = m2m(
+                        queue,
+                        src_expansions=source_mpoles_view,
+                        src_base_ibox=source_level_start_ibox,
+                        tgt_expansions=target_mpoles_view,
+                        tgt_base_ibox=target_level_start_ibox,
+
+                        target_boxes=source_parent_boxes[start:stop],
+                        box_child_ids=self.tree.box_child_ids,
+                        centers=self.tree.box_centers,
+
+                        src_rscale=self.level_to_rscale(source_level),
+                        tgt_rscale=self.level_to_rscale(target_level),
+
+                        **self.kernel_extra_kwargs)
             events.append(evt)
 
             assert mpoles_res is target_mpoles_view
@@ -672,9 +1451,19 @@ class SumpyExpansionWrangler(ExpansionWranglerInterface):
 
         return (mpoles, SumpyTimingFuture(queue, events))
 
+    @fmm_stage("eval_direct")
     def eval_direct(self, target_boxes, source_box_starts,
             source_box_lists, src_weight_vecs):
-        pot = self.output_zeros(src_weight_vecs[0])
+        is_list1 = (target_boxes is self.traversal.target_boxes
+                and source_box_lists
+                is self.traversal.neighbor_source_boxes_lists)
+
+        # Only list 1 overlaps with other stages: the results for the other
+        # lists are added to the potentials right away.
+        queue = src_weight_vecs[0].queue
+        if is_list1:
+            queue = self._get_stage_queue(queue, "near_field")
+        pot = self.output_zeros(src_weight_vecs[0].with_queue(queue))
 
         kwargs = self.extra_kwargs.copy()
         kwargs.update(self.self_extra_kwargs)
@@ -682,90 +1471,768 @@ class SumpyExpansionWrangler(ExpansionWranglerInterface):
         kwargs.update(self.box_target_list_kwargs())
 
         events = []
-        queue = src_weight_vecs[0].queue
 
-        evt, pot_res = self.tree_indep.p2p()(queue,
-                target_boxes=target_boxes,
-                source_box_starts=source_box_starts,
-                source_box_lists=source_box_lists,
-                strength=src_weight_vecs,
-                result=pot,
-                max_nsources_in_one_box=self.max_nsources_in_one_box,
-                max_ntargets_in_one_box=self.max_ntargets_in_one_box,
-                **kwargs)
-        events.append(evt)
+        near_field_matrix = symmetric_pairs = None
+        if is_list1:
+            near_field_matrix = self.near_field_matrix_blocks()
+            if near_field_matrix is None and self.symmetric_p2p:
+                symmetric_pairs = self._symmetric_p2p_pairs()
+
+        if symmetric_pairs is not None:
+            evt, pot_res = self._eval_direct_symmetric(
+                    queue, symmetric_pairs, src_weight_vecs, pot, events)
+        else:
+            with kernel_launch(nboxes=len(target_boxes),
+                    count_interactions=self._interaction_counter(
+                        target_boxes, source_box_starts, source_box_lists,
+                        per_box="targets", per_list_box="sources")):
+                if near_field_matrix is None:
+                    evt, pot_res = self.tree_indep.p2p()(queue,
+                            target_boxes=target_boxes,
+                            source_box_starts=source_box_starts,
+                            source_box_lists=source_box_lists,
+                            strength=src_weight_vecs,
+                            result=pot,
+                            max_nsources_in_one_box=(
+                                self.max_nsources_in_one_box),
+                            max_ntargets_in_one_box=(
+                                self.max_ntargets_in_one_box),
+                            **kwargs)
+                else:
+                    block_starts, blocks = near_field_matrix
+                    evt, pot_res = self.tree_indep.p2p_matrix_blocks()(queue,
+                            target_boxes=target_boxes,
+                            source_box_starts=source_box_starts,
+                            source_box_lists=source_box_lists,
+                            block_starts=block_starts,
+                            blocks=blocks,
+                            strength=src_weight_vecs,
+                            result=pot,
+                            box_source_starts=self.tree.box_source_starts,
+                            box_source_counts_nonchild=(
+                                self.tree.box_source_counts_nonchild),
+                            box_target_starts=self.tree.box_target_starts,
+                            box_target_counts_nonchild=(
+                                self.tree.box_target_counts_nonchild))
+            events.append(evt)
 
         for pot_i, pot_res_i in zip(pot, pot_res, strict=True):
             assert pot_i is pot_res_i
             pot_i.add_event(evt)
 
+        if queue is not src_weight_vecs[0].queue:
+            from pytools.obj_array import obj_array_vectorize
+            pot = obj_array_vectorize(
+                    lambda pot_i: pot_i.with_queue(src_weight_vecs[0].queue), pot)
+
         return (pot, SumpyTimingFuture(queue, events))
 
+    # {{{ near-field matrix
+
     @memoize_method
-    def multipole_to_local_precompute(self):
-        result = []
+    def _near_field_matrix_block_starts(self):
+        """
+        :returns: a tuple of host arrays: the start of the matrix block of
+            each entry of list 1 of the traversal, followed by the total size,
+            and the number of sources of each block.
+        """
+        import numpy as np
+
+        tree = self.tree
+        trav = self.traversal
         with cl.CommandQueue(self.tree_indep.cl_context) as queue:
-            m2l_translation_classes_dependent_data = \
-                    self.m2l_translation_classes_dependent_data_zeros(queue)
-            for lev in range(self.tree.nlevels):
-                src_rscale = self.level_to_rscale(lev)
-                order = self.level_orders[lev]
-                precompute_kernel = \
-                    self.tree_indep.m2l_translation_class_dependent_data_kernel(
-                            order, order)
-
-                translation_classes_level_start, \
-                    m2l_translation_classes_dependent_data_view = \
-                        self.m2l_translation_classes_dependent_data_view(
-                                m2l_translation_classes_dependent_data, lev)
-
-                ntranslation_classes = \
-                        m2l_translation_classes_dependent_data_view.shape[0]
-
-                if ntranslation_classes == 0:
-                    result.append(cl_array.empty_like(
-                        m2l_translation_classes_dependent_data_view))
+            target_boxes = trav.target_boxes.get(queue)
+            starts = trav.neighbor_source_boxes_starts.get(queue)
+            lists = trav.neighbor_source_boxes_lists.get(queue)
+            ntargets = tree.box_target_counts_nonchild.get(queue)
+            nsources = tree.box_source_counts_nonchild.get(queue)
+
+        block_ntargets = np.repeat(
+                ntargets[target_boxes], np.diff(starts)).astype(np.int64)
+        block_nsources = nsources[lists].astype(np.int64)
+        block_starts = np.concatenate([
+            [0], np.cumsum(block_ntargets * block_nsources)])
+
+        return block_starts, block_nsources
+
+    def _near_field_matrix_nbytes(self):
+        """
+        :returns: the size in bytes of the matrix blocks of
+            :meth:`near_field_matrix_blocks`.
+        """
+        import numpy as np
+
+        p2p = self.tree_indep.p2p()
+        block_starts, _ = self._near_field_matrix_block_starts()
+        return int(block_starts[-1] * len(p2p.target_kernels)
+                   * p2p.strength_count * np.dtype(self.dtype).itemsize)
+
+    @memoize_method
+    def near_field_matrix_blocks(self):
+        """Compute the matrix blocks of the interactions in list 1, see
+        :attr:`near_field_matrix_budget`.
+
+        :returns: a tuple ``(block_starts, blocks)`` of device arrays as used
+            by :class:`~sumpy.p2p.P2PFromCSRMatrixBlocks`, or *None* if
+            :attr:`near_field_matrix_budget` is *None* or too small.
+        """
+        import numpy as np
+
+        if (self.near_field_matrix_budget is None
+                or self._near_field_matrix_nbytes()
+                > self.near_field_matrix_budget):
+            return None
+
+        block_starts, block_nsources = self._near_field_matrix_block_starts()
+        nentries = int(block_starts[-1])
+        if nentries == 0:
+            return None
+
+        tree = self.tree
+        trav = self.traversal
+        p2p = self.tree_indep.p2p()
+
+        with cl.CommandQueue(self.tree_indep.cl_context) as queue:
+            target_boxes = trav.target_boxes.get(queue)
+            starts = trav.neighbor_source_boxes_starts.get(queue)
+            lists = trav.neighbor_source_boxes_lists.get(queue)
+            box_target_starts = tree.box_target_starts.get(queue)
+            box_source_starts = tree.box_source_starts.get(queue)
+
+            # {{{ (target, source) index pairs of the entries of the blocks
+
+            block_sizes = np.diff(block_starts)
+            entry_blocks = np.repeat(
+                    np.arange(len(block_sizes)), block_sizes)
+            entry_offsets = (np.arange(nentries)
+                             - np.repeat(block_starts[:-1], block_sizes))
+            entry_nsources = block_nsources[entry_blocks]
+
+            block_target_starts = np.repeat(
+                    box_target_starts[target_boxes], np.diff(starts))
+            tgtindices = (block_target_starts[entry_blocks]
+                          + entry_offsets // entry_nsources)
+            srcindices = (box_source_starts[lists][entry_blocks]
+                          + entry_offsets % entry_nsources)
+
+            tgtindices = cl_array.to_device(
+                    queue, tgtindices.astype(tree.particle_id_dtype))
+            srcindices = cl_array.to_device(
+                    queue, srcindices.astype(tree.particle_id_dtype))
+
+            # }}}
+
+            kwargs = self.extra_kwargs.copy()
+            kwargs.update(self.self_extra_kwargs)
+
+            blocks = cl_array.zeros(queue,
+                    (len(p2p.target_kernels), p2p.strength_count, nentries),
+                    dtype=self.dtype)
+            for istrength in range(p2p.strength_count):
+                generator = self.tree_indep.p2p_matrix_subset(istrength)
+                if generator is None:
                     continue
 
-                data = self.translation_classes_data
-                m2l_translation_vectors = (
-                    data.from_sep_siblings_translation_class_to_distance_vector)
+                _, results = generator(queue,
+                        targets=tree.targets,
+                        sources=tree.sources,
+                        tgtindices=tgtindices,
+                        srcindices=srcindices,
+                        **kwargs)
+                for iknl, result in enumerate(results):
+                    blocks[iknl, istrength] = result.astype(self.dtype)
+
+            block_starts = cl_array.to_device(queue, block_starts)
+            blocks.finish()
+
+        return block_starts.with_queue(None), blocks.with_queue(None)
+
+    def near_field_csr_matrix(self, queue, *, max_distance=None,
+            target_kernel_index=0, strength_index=0, host=False):
+        """Compute the interactions of the targets with the sources in their
+        list of neighbor source boxes (list 1) as a sparse matrix, e.g. to
+        build a preconditioner from the near field of the operator.
+
+        The matrix has a row for each target and a column for each source, in
+        the user order of the particles (i.e. not in tree order). Its sparsity
+        pattern and entries are computed on the device by
+        :class:`~sumpy.p2p.P2PFromCSRSparsityPattern` and
+        :class:`~sumpy.p2p.P2PMatrixSubsetGenerator`. The column indices
+        within a row are not sorted. If the interactions exclude the self
+        interactions (see :attr:`self_extra_kwargs`), the entries of the
+        pairs of a target and its own source are present, but zero.
+
+        :arg max_distance: if not *None*, only the pairs of targets and
+            sources at most this distance apart are included.
+        :arg target_kernel_index: the index of the target kernel whose
+            interactions are computed.
+        :arg strength_index: the index of the source strength (see
+            *strength_usage* of :class:`SumpyTreeIndependentDataForWrangler`)
+            whose interactions are computed. Only the source kernels using it
+            contribute.
+        :arg host: if *True*, return a :class:`scipy.sparse.csr_matrix`.
+        :returns: a tuple ``(data, indices, indptr)`` of device arrays, as in
+            :class:`scipy.sparse.csr_matrix`, unless *host* is *True*.
+        """
+        import numpy as np
 
-                evt, _ = precompute_kernel(
-                    queue,
-                    src_rscale=src_rscale,
-                    translation_classes_level_start=translation_classes_level_start,
-                    ntranslation_classes=ntranslation_classes,
-                    m2l_translation_classes_dependent_data=(
-                        m2l_translation_classes_dependent_data_view),
-                    m2l_translation_vectors=m2l_translation_vectors,
-                    ntranslation_vectors=m2l_translation_vectors.shape[1],
-                    **self.kernel_extra_kwargs
-                )
+        tree = self.tree
+        trav = self.traversal
+
+        if len(trav.target_boxes):
+            target_user_ids = cl_array.empty(queue,
+                    tree.ntargets, tree.particle_id_dtype)
+            cl_array.multi_put(
+                    [cl_array.arange(queue,
+                        tree.ntargets, dtype=tree.particle_id_dtype)],
+                    tree.sorted_target_ids,
+                    out=[target_user_ids], queue=queue)
+
+            indptr, indices, tgtindices, srcindices = (
+                    self.tree_indep.p2p_sparsity_pattern()(queue,
+                        targets=tree.targets,
+                        sources=tree.sources,
+                        max_distance=max_distance,
+                        target_boxes=trav.target_boxes,
+                        source_box_starts=trav.neighbor_source_boxes_starts,
+                        source_box_lists=trav.neighbor_source_boxes_lists,
+                        target_user_ids=target_user_ids,
+                        source_user_ids=tree.user_source_ids,
+                        box_source_starts=tree.box_source_starts,
+                        box_source_counts_nonchild=(
+                            tree.box_source_counts_nonchild),
+                        box_target_starts=tree.box_target_starts,
+                        box_target_counts_nonchild=(
+                            tree.box_target_counts_nonchild)))
+        else:
+            indptr = cl_array.zeros(queue, tree.ntargets + 1, np.int64)
+            indices = tgtindices = srcindices = cl_array.empty(
+                    queue, 0, tree.particle_id_dtype)
+
+        data = cl_array.zeros(queue, len(indices), self.dtype)
+        generator = self.tree_indep.p2p_matrix_subset(strength_index)
+        if len(indices) and generator is not None:
+            kwargs = self.extra_kwargs.copy()
+            kwargs.update(self.self_extra_kwargs)
+
+            _, results = generator(queue,
+                    targets=tree.targets,
+                    sources=tree.sources,
+                    tgtindices=tgtindices,
+                    srcindices=srcindices,
+                    **kwargs)
+            data = results[target_kernel_index].astype(self.dtype)
+
+        if not host:
+            return data, indices, indptr
+
+        import scipy.sparse as sp
+        return sp.csr_matrix(
+                (data.get(queue), indices.get(queue), indptr.get(queue)),
+                shape=(tree.ntargets, tree.nsources))
+
+    # }}}
+
+    # {{{ symmetric near field
+
+    @memoize_method
+    def _symmetric_p2p_pairs(self):
+        """Group the pairs of boxes of list 1 for
+        :class:`~sumpy.p2p.P2PFromSymmetricBoxPairs`, see
+        :attr:`symmetric_p2p`.
+
+        :returns: *None* if list 1 is not symmetric, or else a tuple
+            ``(color_starts, pair_boxes_a, pair_boxes_b, pair_ninteractions)``,
+            where the pairs ``color_starts[i] <= ipair < color_starts[i+1]``
+            have no box in common. *pair_boxes_a* and *pair_boxes_b* are
+            device arrays, the others are host arrays.
+        """
+        import numpy as np
+
+        tree = self.tree
+        trav = self.traversal
+        with cl.CommandQueue(self.tree_indep.cl_context) as queue:
+            target_boxes = trav.target_boxes.get(queue)
+            starts = trav.neighbor_source_boxes_starts.get(queue)
+            lists = trav.neighbor_source_boxes_lists.get(queue)
+            nsources = tree.box_source_counts_nonchild.get(queue)
+
+        boxes_a = np.repeat(target_boxes, np.diff(starts)).astype(np.int64)
+        boxes_b = lists.astype(np.int64)
+
+        pair_ids = boxes_a * tree.nboxes + boxes_b
+        if not np.array_equal(
+                np.sort(pair_ids), np.sort(boxes_b * tree.nboxes + boxes_a)):
+            return None
+
+        keep = boxes_a <= boxes_b
+        boxes_a = boxes_a[keep]
+        boxes_b = boxes_b[keep]
+        npairs = len(boxes_a)
+
+        # {{{ group the pairs into matchings
+
+        # Each group is a maximal set of pairs without a box in common, found
+        # in rounds: in each round, the pairs whose (random) priority is the
+        # smallest of all the candidate pairs of both their boxes join the
+        # group, and the pairs of their boxes drop out of the candidates.
+
+        rng = np.random.default_rng(seed=17)
+        priorities = rng.permutation(npairs)
+
+        colors = []
+        remaining = np.arange(npairs)
+        while len(remaining):
+            color = []
+            candidates = remaining
+            while len(candidates):
+                cand_a = boxes_a[candidates]
+                cand_b = boxes_b[candidates]
+                cand_priorities = priorities[candidates]
+
+                box_priorities = np.full(tree.nboxes, npairs)
+                np.minimum.at(box_priorities, cand_a, cand_priorities)
+                np.minimum.at(box_priorities, cand_b, cand_priorities)
+                selected = (
+                        (box_priorities[cand_a] == cand_priorities)
+                        & (box_priorities[cand_b] == cand_priorities))
+                color.append(candidates[selected])
+
+                in_color = np.zeros(tree.nboxes, dtype=bool)
+                in_color[cand_a[selected]] = True
+                in_color[cand_b[selected]] = True
+                candidates = candidates[~(in_color[cand_a] | in_color[cand_b])]
+
+            color = np.sort(np.concatenate(color))
+            colors.append(color)
+
+            in_color = np.zeros(npairs, dtype=bool)
+            in_color[color] = True
+            remaining = remaining[~in_color[remaining]]
+
+        # }}}
+
+        order = np.concatenate(colors)
+        color_starts = np.cumsum([0] + [len(color) for color in colors])
+
+        boxes_a = boxes_a[order]
+        boxes_b = boxes_b[order]
+        na = nsources[boxes_a].astype(np.int64)
+        nb = nsources[boxes_b].astype(np.int64)
+        pair_ninteractions = np.where(
+                boxes_a == boxes_b, na * (na - 1) // 2, na * nb)
+
+        with cl.CommandQueue(self.tree_indep.cl_context) as queue:
+            pair_boxes_a = cl_array.to_device(
+                    queue, boxes_a.astype(tree.box_id_dtype)).with_queue(None)
+            pair_boxes_b = cl_array.to_device(
+                    queue, boxes_b.astype(tree.box_id_dtype)).with_queue(None)
+
+        return color_starts, pair_boxes_a, pair_boxes_b, pair_ninteractions
+
+    def _eval_direct_symmetric(self, queue, symmetric_pairs,
+            src_weight_vecs, pot, events):
+        """Add the interactions of list 1 to *pot*, see :attr:`symmetric_p2p`.
+
+        :returns: the event and the result of the last kernel launch.
+        """
+        import numpy as np
+
+        color_starts, pair_boxes_a, pair_boxes_b, pair_ninteractions = \
+                symmetric_pairs
+        p2p_symmetric = self.tree_indep.p2p_symmetric()
+
+        def count_interactions(start, stop):
+            return lambda: int(np.sum(pair_ninteractions[start:stop]))
+
+        for start, stop in zip(
+                color_starts[:-1], color_starts[1:], strict=True):
+            with kernel_launch(nboxes=stop - start,
+                    count_interactions=count_interactions(start, stop)):
+                evt, pot_res = p2p_symmetric(queue,
+                        sources=self.tree.sources,
+                        pair_boxes_a=pair_boxes_a,
+                        pair_boxes_b=pair_boxes_b,
+                        pair_start=int(start),
+                        pair_end=int(stop),
+                        box_source_starts=self.tree.box_source_starts,
+                        box_source_counts_nonchild=(
+                            self.tree.box_source_counts_nonchild),
+                        strength=src_weight_vecs,
+                        result=pot,
+                        **self.extra_kwargs)
+            events.append(evt)
+
+        return evt, pot_res
+
+    # }}}
+
+    # {{{ M2L precomputation
+
+    def _get_m2l_precompute_cache_key(self, precompute_kernel, src_rscale,
+            dtype, translation_vectors) -> Hashable | None:
+        """
+        :returns: the key under which the translation-class dependent data
+            computed by *precompute_kernel* for the (host) array
+            *translation_vectors* of the translation vectors of a level is
+            cached, or *None* if it cannot be cached.
+        """
+        import numpy as np
+
+        from sumpy.version import KERNEL_VERSION
+
+        extra_kwargs = tuple(sorted(self.kernel_extra_kwargs.items()))
+        try:
+            hash(extra_kwargs)
+        except TypeError:
+            # e.g. array-valued kernel arguments
+            return None
+
+        # The expansions in the key of the kernel need not be hashable, so
+        # use its persistent hash instead.
+        from pytools.persistent_dict import KeyBuilder
+        return KeyBuilder()((
+                *precompute_kernel.get_cache_key(),
+                self.tree_indep.m2l_translation.use_fft,
+                np.dtype(dtype).str,
+                float(src_rscale),
+                extra_kwargs,
+                translation_vectors.dtype.str,
+                translation_vectors.shape,
+                KERNEL_VERSION,
+                translation_vectors.tobytes()))
+
+    def _lookup_m2l_precompute(self, cache_key):
+        cache = type(self).m2l_precompute_cache
+        try:
+            result = cache[cache_key]
+        except KeyError:
+            pass
+        else:
+            cache.move_to_end(cache_key)
+            return result
+
+        from sumpy import CACHING_ENABLED
+        if not (self.persist_m2l_precompute and CACHING_ENABLED):
+            raise KeyError(cache_key)
+
+        from sumpy import m2l_precompute_cache
+        result = m2l_precompute_cache[cache_key]
+        self._store_m2l_precompute(cache_key, result, persist=False)
+
+        return result
+
+    def _store_m2l_precompute(self, cache_key, result, persist=True):
+        cls = type(self)
+        cls.m2l_precompute_cache[cache_key] = result
+        while len(cls.m2l_precompute_cache) > cls.m2l_precompute_cache_max_entries:
+            cls.m2l_precompute_cache.popitem(last=False)
+
+        from sumpy import CACHING_ENABLED
+        if persist and self.persist_m2l_precompute and CACHING_ENABLED:
+            from sumpy import m2l_precompute_cache
+            m2l_precompute_cache.store_if_not_present(cache_key, result)
+
+    @memoize_method
+    def m2l_scale_invariant_reference_levels(self):
+        """
+        :returns: *None* if the translation-class dependent data is computed
+            for each level separately, or else a list mapping each level to
+            its reference level, i.e. the coarsest level with the same kernel
+            order and the same *rscale* relative to the box size. The data of
+            a level is that of its reference level (for the translation
+            vectors scaled to the reference level) scaled by
+            :meth:`m2l_scale_invariant_factor`.
+        """
+        if (not self.supports_translation_classes
+                or self._disable_scale_invariant_m2l):
+            return None
+
+        if self.tree_indep.get_base_kernel().homogeneity_degree is None:
+            return None
+
+        from sumpy.expansion.m2l import VolumeTaylorM2LTranslation
+        if not isinstance(self.tree_indep.m2l_translation,
+                VolumeTaylorM2LTranslation):
+            return None
+
+        # Without rscale, the derivatives of different orders in the data
+        # scale differently between levels.
+        if not all(self.tree_indep.local_expansion(order).use_rscale
+                   for order in set(self.level_orders)):
+            return None
+
+        reference_levels = []
+        key_to_reference_level = {}
+        for lev in range(self.tree.nlevels):
+            # scaling by powers of two is exact
+            key = (self.level_orders[lev],
+                   self.level_to_rscale(lev) * 2**lev)
+            reference_levels.append(key_to_reference_level.setdefault(key, lev))
+
+        return reference_levels
+
+    def m2l_scale_invariant_factor(self, level):
+        """
+        :returns: the factor by which the translation-class dependent data of
+            the reference level of *level* (see
+            :meth:`m2l_scale_invariant_reference_levels`) is scaled to obtain
+            that of *level*.
+        """
+        reference_levels = self.m2l_scale_invariant_reference_levels()
+        if reference_levels is None:
+            return 1
+
+        degree = self.tree_indep.get_base_kernel().homogeneity_degree
+        return 2.0**((reference_levels[level] - level) * degree)
+
+    @memoize_method
+    def _m2l_scale_invariant_translation_classes(self):
+        """
+        :returns: a tuple ``(class_to_reference_class, reference_vectors)`` of
+            a host array mapping each translation class to the index of its
+            translation vector in the data of its reference level and a
+            dictionary mapping each reference level to a host array of these
+            translation vectors.
+        """
+        import numpy as np
 
-                if self.tree_indep.m2l_translation.use_fft:
-                    _, m2l_translation_classes_dependent_data_view = \
-                        self.run_opencl_fft(queue,
-                            m2l_translation_classes_dependent_data_view,
-                            inverse=False, wait_for=[evt])
-                result.append(m2l_translation_classes_dependent_data_view)
+        tree = self.tree
+        reference_levels = self.m2l_scale_invariant_reference_levels()
+        level_starts = self.m2l_translation_class_level_start_box_nrs()
+
+        with cl.CommandQueue(self.tree_indep.cl_context) as queue:
+            vectors = self.translation_classes_data \
+                    .from_sep_siblings_translation_class_to_distance_vector \
+                    .get(queue)
+
+        class_to_reference_class = np.empty(level_starts[-1], dtype=np.int32)
+        reference_vectors = {}
+        for ref_lev in sorted(set(reference_levels)):
+            levels = [lev for lev in range(tree.nlevels)
+                      if reference_levels[lev] == ref_lev]
+
+            # translation vectors in units of the box size of their level
+            int_vectors = np.concatenate([
+                np.rint(vectors[:, level_starts[lev]:level_starts[lev + 1]]
+                        * (2**lev / tree.root_extent)).astype(np.int64)
+                for lev in levels], axis=1)
+
+            if int_vectors.shape[1] == 0:
+                reference_vectors[ref_lev] = vectors[:, :0]
+                continue
+
+            unique_vectors, inverse = np.unique(
+                    int_vectors, axis=1, return_inverse=True)
+            inverse = inverse.reshape(-1)
+
+            offset = 0
+            for lev in levels:
+                start, stop = level_starts[lev:lev + 2]
+                class_to_reference_class[start:stop] = \
+                        inverse[offset:offset + stop - start]
+                offset += stop - start
+
+            reference_vectors[ref_lev] = np.ascontiguousarray(
+                unique_vectors * (tree.root_extent / 2**ref_lev),
+                dtype=vectors.dtype)
+
+        return class_to_reference_class, reference_vectors
+
+    @memoize_method
+    def m2l_translation_classes_lists(self):
+        """
+        :returns: a device array mapping each entry of the list of
+            well-separated siblings (list 2) to the index of its translation
+            class in the data returned by
+            :meth:`multipole_to_local_precompute`, offset by the start of the
+            level returned by
+            :meth:`m2l_translation_classes_dependent_data_view`.
+        """
+        lists = self.translation_classes_data.from_sep_siblings_translation_classes
+        if self.m2l_scale_invariant_reference_levels() is None or lists.size == 0:
+            return lists
+
+        class_to_reference_class, _ = \
+                self._m2l_scale_invariant_translation_classes()
+        with cl.CommandQueue(self.tree_indep.cl_context) as queue:
+            result = cl_array.take(
+                    cl_array.to_device(queue, class_to_reference_class),
+                    lists.with_queue(queue))
+            result.finish()
+
+        return result.with_queue(None)
+
+    def _compute_m2l_translation_classes_dependent_data(self, queue, order,
+            src_rscale, data, translation_vectors, translation_vectors_host,
+            translation_classes_level_start):
+        """Compute the translation-class dependent data *data* of the
+        translation classes starting at *translation_classes_level_start*
+        in *translation_vectors* or look it up in the cache.
+        *translation_vectors_host* is a host array of the translation vectors
+        of *data*.
+
+        :returns: an array with the translation-class dependent data.
+        """
+        precompute_kernel = \
+            self.tree_indep.m2l_translation_class_dependent_data_kernel(
+                    order, order)
+
+        cache_key = self._get_m2l_precompute_cache_key(
+            precompute_kernel, src_rscale, data.dtype, translation_vectors_host)
+
+        if cache_key is not None:
+            try:
+                cached_data = self._lookup_m2l_precompute(cache_key)
+            except KeyError:
+                pass
+            else:
+                data.set(cached_data, queue=queue)
+                return data
+
+        evt, _ = precompute_kernel(
+            queue,
+            src_rscale=src_rscale,
+            translation_classes_level_start=translation_classes_level_start,
+            ntranslation_classes=data.shape[0],
+            m2l_translation_classes_dependent_data=data,
+            m2l_translation_vectors=translation_vectors,
+            ntranslation_vectors=translation_vectors.shape[1],
+            **self.kernel_extra_kwargs
+        )
+
+        if self.tree_indep.m2l_translation.use_fft:
+            _, data = self.run_opencl_fft(queue, data,
+                    inverse=False, wait_for=[evt])
+
+        if cache_key is not None:
+            self._store_m2l_precompute(cache_key, data.get(queue))
+
+        return data
 
-            for lev in range(self.tree.nlevels):
-                result[lev].finish()
+    @memoize_method
+    def multipole_to_local_precompute(self):
+        result = []
+        with cl.CommandQueue(self.tree_indep.cl_context) as queue:
+            reference_levels = self.m2l_scale_invariant_reference_levels()
+            if reference_levels is not None:
+                result = self._multipole_to_local_precompute_scale_invariant(
+                        queue, reference_levels)
+            else:
+                result = self._multipole_to_local_precompute_per_level(queue)
+
+            for ary in result:
+                ary.finish()
 
             result = [arr.with_queue(None) for arr in result]
         return result
 
+    def _multipole_to_local_precompute_per_level(self, queue):
+        return [self._multipole_to_local_precompute_level(queue, lev)
+                for lev in range(self.tree.nlevels)]
+
+    @memoize_method
+    def _m2l_translation_vectors_host(self):
+        with cl.CommandQueue(self.tree_indep.cl_context) as queue:
+            return self.translation_classes_data \
+                    .from_sep_siblings_translation_class_to_distance_vector \
+                    .get(queue)
+
+    def _multipole_to_local_precompute_level(self, queue, lev):
+        """
+        :returns: the translation-class dependent data of level *lev*,
+            computed for the level itself.
+        """
+        data = self._m2l_translation_classes_dependent_data_level_zeros(
+                queue, lev)
+
+        ntranslation_classes = data.shape[0]
+        if ntranslation_classes == 0:
+            return data
+
+        translation_classes_level_start = \
+                self.m2l_translation_class_level_start_box_nrs()[lev]
+
+        return self._compute_m2l_translation_classes_dependent_data(
+            queue, self.level_orders[lev], self.level_to_rscale(lev),
+            data,
+            self.translation_classes_data
+            .from_sep_siblings_translation_class_to_distance_vector,
+            self._m2l_translation_vectors_host()[:,
+                translation_classes_level_start:
+                translation_classes_level_start + ntranslation_classes],
+            translation_classes_level_start)
+
+    def _multipole_to_local_precompute_reference_level(self, queue, ref_lev):
+        """
+        :returns: the translation-class dependent data of the reference level
+            *ref_lev*, see :meth:`m2l_scale_invariant_reference_levels`.
+        """
+        _, reference_vectors = self._m2l_scale_invariant_translation_classes()
+        vectors_host = reference_vectors[ref_lev]
+
+        order = self.level_orders[ref_lev]
+        ndata = self._m2l_translation_classes_dependent_ndata(order)
+
+        data = cl_array.zeros(queue, (vectors_host.shape[1], ndata),
+                dtype=self.preprocessed_mpole_dtype,
+                allocator=self._memory_tracker)
+        if vectors_host.shape[1] == 0:
+            return data
+
+        return self._compute_m2l_translation_classes_dependent_data(
+                queue, order, self.level_to_rscale(ref_lev), data,
+                cl_array.to_device(queue, vectors_host), vectors_host, 0)
+
+    def _multipole_to_local_precompute_scale_invariant(self, queue,
+            reference_levels):
+        reference_data = {
+            ref_lev: self._multipole_to_local_precompute_reference_level(
+                queue, ref_lev)
+            for ref_lev in sorted(set(reference_levels))}
+
+        level_starts = self.m2l_translation_class_level_start_box_nrs()
+
+        result = []
+        for lev in range(self.tree.nlevels):
+            data = reference_data[reference_levels[lev]]
+            if level_starts[lev] == level_starts[lev + 1]:
+                data = cl_array.empty(queue, (0, data.shape[1]), dtype=data.dtype)
+            result.append(data)
+
+        return result
+
+    def _multipole_to_local_precompute_level_on_demand(self, queue, lev):
+        """
+        :returns: the translation-class dependent data of level *lev* as
+            returned by :meth:`multipole_to_local_precompute`, computed
+            without keeping that of the other levels, see :attr:`lean_memory`.
+        """
+        level_starts = self.m2l_translation_class_level_start_box_nrs()
+        reference_levels = self.m2l_scale_invariant_reference_levels()
+        if reference_levels is None or level_starts[lev] == level_starts[lev + 1]:
+            return self._multipole_to_local_precompute_level(queue, lev)
+        else:
+            return self._multipole_to_local_precompute_reference_level(
+                    queue, reference_levels[lev])
+
+    # }}}
+
     def _add_m2l_precompute_kwargs(self, kwargs_for_m2l,
-            lev):
+            lev, queue, translation_classes_lists=None):
         """This method is used for adding the information needed for a
         multipole-to-local translation with precomputation to the keywords
         passed to multipole-to-local translation.
         """
         if not self.supports_translation_classes:
             return
-        m2l_translation_classes_dependent_data = \
-                self.multipole_to_local_precompute()
+        if self.lean_memory:
+            m2l_translation_classes_dependent_data = {
+                lev: self._multipole_to_local_precompute_level_on_demand(
+                    queue, lev)}
+        else:
+            m2l_translation_classes_dependent_data = \
+                    self.multipole_to_local_precompute()
         translation_classes_level_start, \
             m2l_translation_classes_dependent_data_view = \
                 self.m2l_translation_classes_dependent_data_view(
@@ -774,53 +2241,100 @@ class SumpyExpansionWrangler(ExpansionWranglerInterface):
             m2l_translation_classes_dependent_data_view
         kwargs_for_m2l["translation_classes_level_start"] = \
             translation_classes_level_start
+        if translation_classes_lists is None:
+            translation_classes_lists = self.m2l_translation_classes_lists()
         kwargs_for_m2l["m2l_translation_classes_lists"] = \
-            self.translation_classes_data.from_sep_siblings_translation_classes
+            translation_classes_lists
 
+    @fmm_stage("multipole_to_local")
     def multipole_to_local(self,
             level_start_target_box_nrs,
             target_boxes, src_box_starts, src_box_lists,
-            mpole_exps):
-
+            mpole_exps, *, translation_classes_lists=None):
+        """
+        :arg translation_classes_lists: the translation classes of the entries
+            of *src_box_lists*, see :meth:`m2l_translation_classes_lists`.
+            Only needed if *src_box_lists* is not the list of well-separated
+            siblings of the traversal, e.g. if it is a subset of it.
+        """
         queue = mpole_exps.queue
         local_exps = self.local_expansion_zeros(mpole_exps)
 
-        if self.tree_indep.m2l_translation.use_preprocessing:
+        if not self.tree_indep.m2l_translation.use_preprocessing:
+            preprocessed_mpole_exps = mpole_exps
+            m2l_work_array = local_exps
+        elif self.lean_memory:
+            # allocated for each level in _multipole_to_local_level
+            preprocessed_mpole_exps = None
+            m2l_work_array = None
+        else:
             preprocessed_mpole_exps = \
                 self.m2l_preproc_mpole_expansion_zeros(mpole_exps)
             m2l_work_array = self.m2l_work_array_zeros(local_exps)
-            mpole_exps_view_func = self.m2l_preproc_mpole_expansions_view
-            local_exps_view_func = self.m2l_work_array_view
-        else:
-            preprocessed_mpole_exps = mpole_exps
-            m2l_work_array = local_exps
-            mpole_exps_view_func = self.multipole_expansions_view
-            local_exps_view_func = self.local_expansions_view
 
         preprocess_evts = []
         translate_evts = []
         postprocess_evts = []
 
         for lev in range(self.tree.nlevels):
-            wait_for = []
-
             start, stop = level_start_target_box_nrs[lev:lev+2]
             if start == stop:
                 continue
 
-            if self.tree_indep.m2l_translation.use_preprocessing:
-                order = self.level_orders[lev]
-                preprocess_mpole_kernel = \
-                    self.tree_indep.m2l_preprocess_mpole_kernel(order, order)
+            self._multipole_to_local_level(queue, lev,
+                    target_boxes[start:stop], src_box_starts[start:stop+1],
+                    src_box_lists, mpole_exps, local_exps,
+                    preprocessed_mpole_exps, m2l_work_array,
+                    preprocess_evts, translate_evts, postprocess_evts,
+                    translation_classes_lists=translation_classes_lists)
 
-                _, source_mpoles_view = \
-                        self.multipole_expansions_view(mpole_exps, lev)
+        timing_events = preprocess_evts + translate_evts + postprocess_evts
 
-                tr_classes = self.m2l_translation_class_level_start_box_nrs()
-                if tr_classes[lev] == tr_classes[lev + 1]:
-                    # There is no M2L happening in this level
-                    continue
+        return (local_exps, SumpyTimingFuture(queue, timing_events))
+
+    def _multipole_to_local_level(self, queue, lev,
+            target_boxes, src_box_starts, src_box_lists,
+            mpole_exps, local_exps, preprocessed_mpole_exps, m2l_work_array,
+            preprocess_evts, translate_evts, postprocess_evts,
+            translation_classes_lists=None):
+        """Translate the multipole expansions of level *lev* to the local
+        expansions of the *target_boxes* on that level and append the events
+        of each step to the respective list.
+
+        If *preprocessed_mpole_exps* and *m2l_work_array* are *None*, they are
+        allocated for this level only, see :attr:`lean_memory`.
+        """
+        wait_for = []
+
+        if self.tree_indep.m2l_translation.use_preprocessing:
+            mpole_exps_view_func = self.m2l_preproc_mpole_expansions_view
+            local_exps_view_func = self.m2l_work_array_view
+        else:
+            mpole_exps_view_func = self.multipole_expansions_view
+            local_exps_view_func = self.local_expansions_view
+
+        if self.tree_indep.m2l_translation.use_preprocessing:
+            tr_classes = self.m2l_translation_class_level_start_box_nrs()
+            if tr_classes[lev] == tr_classes[lev + 1]:
+                # There is no M2L happening in this level
+                return
+
+            if preprocessed_mpole_exps is None:
+                preprocessed_mpole_exps = {
+                    lev: self._m2l_preproc_mpole_expansion_level_zeros(
+                        mpole_exps, lev)}
+                m2l_work_array = {
+                    lev: self._m2l_preproc_mpole_expansion_level_zeros(
+                        local_exps, lev)}
+
+            order = self.level_orders[lev]
+            preprocess_mpole_kernel = \
+                self.tree_indep.m2l_preprocess_mpole_kernel(order, order)
+
+            _, source_mpoles_view = \
+                    self.multipole_expansions_view(mpole_exps, lev)
 
+            with kernel_launch(level=lev, order=self.level_orders[lev]):
                 evt, _ = preprocess_mpole_kernel(
                     queue,
                     src_expansions=source_mpoles_view,
@@ -829,76 +2343,77 @@ class SumpyExpansionWrangler(ExpansionWranglerInterface):
                     wait_for=wait_for,
                     **self.kernel_extra_kwargs
                 )
-                wait_for.append(evt)
+            wait_for.append(evt)
 
-                if self.tree_indep.m2l_translation.use_fft:
-                    evt_fft, preprocessed_mpole_exps[lev] = \
-                        self.run_opencl_fft(queue,
-                            preprocessed_mpole_exps[lev],
-                            inverse=False, wait_for=wait_for)
-                    wait_for.append(get_native_event(evt_fft))
-                    evt = AggregateProfilingEvent([evt, evt_fft])
+            if self.tree_indep.m2l_translation.use_fft:
+                evt_fft, preprocessed_mpole_exps[lev] = \
+                    self.run_opencl_fft(queue,
+                        preprocessed_mpole_exps[lev],
+                        inverse=False, wait_for=wait_for)
+                wait_for.append(get_native_event(evt_fft))
+                evt = AggregateProfilingEvent([evt, evt_fft])
 
-                preprocess_evts.append(evt)
+            preprocess_evts.append(evt)
 
-            order = self.level_orders[lev]
-            m2l = self.tree_indep.m2l(order, order,
-                    self.supports_translation_classes)
+        order = self.level_orders[lev]
+        m2l = self.tree_indep.m2l(order, order,
+                self.supports_translation_classes)
 
-            source_level_start_ibox, source_mpoles_view = \
-                    mpole_exps_view_func(preprocessed_mpole_exps, lev)
-            target_level_start_ibox, target_locals_view = \
-                    local_exps_view_func(m2l_work_array, lev)
+        source_level_start_ibox, source_mpoles_view = \
+                mpole_exps_view_func(preprocessed_mpole_exps, lev)
+        target_level_start_ibox, target_locals_view = \
+                local_exps_view_func(m2l_work_array, lev)
 
-            kwargs = dict(
-                    src_expansions=source_mpoles_view,
-                    src_base_ibox=source_level_start_ibox,
-                    tgt_expansions=target_locals_view,
-                    tgt_base_ibox=target_level_start_ibox,
+        kwargs = dict(
+                src_expansions=source_mpoles_view,
+                src_base_ibox=source_level_start_ibox,
+                tgt_expansions=target_locals_view,
+                tgt_base_ibox=target_level_start_ibox,
 
-                    target_boxes=target_boxes[start:stop],
-                    src_box_starts=src_box_starts[start:stop+1],
-                    src_box_lists=src_box_lists,
-                    centers=self.tree.box_centers,
+                target_boxes=target_boxes,
+                src_box_starts=src_box_starts,
+                src_box_lists=src_box_lists,
+                centers=self.tree.box_centers,
 
-                    src_rscale=self.level_to_rscale(lev),
-                    tgt_rscale=self.level_to_rscale(lev),
+                src_rscale=self.level_to_rscale(lev),
+                tgt_rscale=self.level_to_rscale(lev),
 
-                    **self.kernel_extra_kwargs)
+                **self.kernel_extra_kwargs)
 
-            self._add_m2l_precompute_kwargs(kwargs, lev)
-            if "m2l_translation_classes_dependent_data" in kwargs and \
-                    kwargs["m2l_translation_classes_dependent_data"].size == 0:
-                # There is nothing to do for this level
-                continue
+        self._add_m2l_precompute_kwargs(kwargs, lev, queue,
+                translation_classes_lists)
+        if "m2l_translation_classes_dependent_data" in kwargs and \
+                kwargs["m2l_translation_classes_dependent_data"].size == 0:
+            # There is nothing to do for this level
+            return
+        with kernel_launch(level=lev, order=self.level_orders[lev],
+                nboxes=len(target_boxes),
+                count_interactions=self._interaction_counter(
+                    target_boxes, src_box_starts, src_box_lists)):
             evt, _ = m2l(queue, **kwargs, wait_for=wait_for)
-            wait_for.append(evt)
-            translate_evts.append(evt)
+        wait_for.append(evt)
+        translate_evts.append(evt)
 
-            if self.tree_indep.m2l_translation.use_preprocessing:
-                order = self.level_orders[lev]
-                postprocess_local_kernel = \
-                    self.tree_indep.m2l_postprocess_local_kernel(order, order)
-
-                _, target_locals_view = \
-                        self.local_expansions_view(local_exps, lev)
+        if self.tree_indep.m2l_translation.use_preprocessing:
+            order = self.level_orders[lev]
+            postprocess_local_kernel = \
+                self.tree_indep.m2l_postprocess_local_kernel(order, order)
 
-                _, target_locals_before_postprocessing_view = \
-                        self.m2l_work_array_view(
-                                m2l_work_array, lev)
+            _, target_locals_view = \
+                    self.local_expansions_view(local_exps, lev)
 
-                tr_classes = self.m2l_translation_class_level_start_box_nrs()
-                if tr_classes[lev] == tr_classes[lev + 1]:
-                    # There is no M2L happening in this level
-                    continue
+            _, target_locals_before_postprocessing_view = \
+                    self.m2l_work_array_view(
+                            m2l_work_array, lev)
 
-                if self.tree_indep.m2l_translation.use_fft:
-                    evt_fft, target_locals_before_postprocessing_view = \
-                        self.run_opencl_fft(queue,
-                            target_locals_before_postprocessing_view,
-                            inverse=True, wait_for=wait_for)
-                    wait_for.append(get_native_event(evt_fft))
+            if self.tree_indep.m2l_translation.use_fft:
+                evt_fft, target_locals_before_postprocessing_view = \
+                    self.run_opencl_fft(queue,
+                        target_locals_before_postprocessing_view,
+                        inverse=True, wait_for=wait_for)
+                wait_for.append(get_native_event(evt_fft))
 
+            with kernel_launch(level=lev, order=self.level_orders[lev]):
                 evt, _ = postprocess_local_kernel(
                     queue,
                     tgt_expansions=target_locals_view,
@@ -910,15 +2425,21 @@ class SumpyExpansionWrangler(ExpansionWranglerInterface):
                     **self.kernel_extra_kwargs,
                 )
 
-                if self.tree_indep.m2l_translation.use_fft:
-                    postprocess_evts.append(AggregateProfilingEvent([evt_fft, evt]))
-                else:
-                    postprocess_evts.append(evt)
+            if self.tree_indep.m2l_translation.use_fft:
+                postprocess_evts.append(AggregateProfilingEvent([evt_fft, evt]))
+            else:
+                postprocess_evts.append(evt)
 
-        timing_events = preprocess_evts + translate_evts + postprocess_evts
-
-        return (local_exps, SumpyTimingFuture(queue, timing_events))
+        m2l_scale_factor = self.m2l_scale_invariant_factor(lev)
+        if m2l_scale_factor != 1:
+            # the translation-class dependent data is that of the
+            # reference level
+            _, target_locals_view = \
+                    self.local_expansions_view(local_exps, lev)
+            target_locals_view *= m2l_scale_factor
+            postprocess_evts.append(target_locals_view.events[-1])
 
+    @fmm_stage("eval_multipoles")
     def eval_multipoles(self,
             target_boxes_by_source_level, source_boxes_by_level, mpole_exps):
         pot = self.output_zeros(mpole_exps)
@@ -940,23 +2461,29 @@ class SumpyExpansionWrangler(ExpansionWranglerInterface):
             source_level_start_ibox, source_mpoles_view = \
                     self.multipole_expansions_view(mpole_exps, isrc_level)
 
-            evt, pot_res = m2p(
-                    queue,
+            with kernel_launch(level=isrc_level,
+                    order=self.level_orders[isrc_level],
+                    nboxes=len(target_boxes_by_source_level[isrc_level]),
+                    count_interactions=self._interaction_counter(
+                        target_boxes_by_source_level[isrc_level],
+                        ssn.starts, ssn.lists, per_box="targets")):
+                evt, pot_res = m2p(
+                        queue,
 
-                    src_expansions=source_mpoles_view,
-                    src_base_ibox=source_level_start_ibox,
+                        src_expansions=source_mpoles_view,
+                        src_base_ibox=source_level_start_ibox,
 
-                    target_boxes=target_boxes_by_source_level[isrc_level],
-                    source_box_starts=ssn.starts,
-                    source_box_lists=ssn.lists,
-                    centers=self.tree.box_centers,
-                    result=pot,
+                        target_boxes=target_boxes_by_source_level[isrc_level],
+                        source_box_starts=ssn.starts,
+                        source_box_lists=ssn.lists,
+                        centers=self.tree.box_centers,
+                        result=pot,
 
-                    rscale=self.level_to_rscale(isrc_level),
+                        rscale=self.level_to_rscale(isrc_level),
 
-                    wait_for=wait_for,
+                        wait_for=wait_for,
 
-                    **kwargs)
+                        **kwargs)
             events.append(evt)
 
             wait_for = [evt]
@@ -968,18 +2495,23 @@ class SumpyExpansionWrangler(ExpansionWranglerInterface):
             for pot_i in pot:
                 pot_i.add_event(events[-1])
 
+        # drive_fmm adds the near-field potentials to the result next
+        self._wait_for_stage_queues(queue, ("near_field",))
+
         return (pot, SumpyTimingFuture(queue, events))
 
+    @fmm_stage("form_locals")
     def form_locals(self,
             level_start_target_or_target_parent_box_nrs,
             target_or_target_parent_boxes, starts, lists, src_weight_vecs):
-        local_exps = self.local_expansion_zeros(src_weight_vecs[0])
+        queue = self._get_stage_queue(src_weight_vecs[0].queue, "form_locals")
+        local_exps = self.local_expansion_zeros(
+                src_weight_vecs[0].with_queue(queue))
 
         kwargs = self.extra_kwargs.copy()
         kwargs.update(self.box_source_list_kwargs())
 
         events = []
-        queue = src_weight_vecs[0].queue
 
         for lev in range(self.tree.nlevels):
             start, stop = \
@@ -992,26 +2524,36 @@ class SumpyExpansionWrangler(ExpansionWranglerInterface):
             target_level_start_ibox, target_local_exps_view = \
                     self.local_expansions_view(local_exps, lev)
 
-            evt, (result,) = p2l(
-                    queue,
-                    target_boxes=target_or_target_parent_boxes[start:stop],
-                    source_box_starts=starts[start:stop+1],
-                    source_box_lists=lists,
-                    centers=self.tree.box_centers,
-                    strengths=src_weight_vecs,
-
-                    tgt_expansions=target_local_exps_view,
-                    tgt_base_ibox=target_level_start_ibox,
-
-                    rscale=self.level_to_rscale(lev),
-
-                    **kwargs)
+            with kernel_launch(level=lev, order=self.level_orders[lev],
+                    nboxes=stop - start,
+                    count_interactions=self._interaction_counter(
+                        target_or_target_parent_boxes[start:stop],
+                        starts[start:stop+1], lists, per_list_box="sources")):
+                evt, (result,) = p2l(
+                        queue,
+                        target_boxes=target_or_target_parent_boxes[start:stop],
+                        source_box_starts=starts[start:stop+1],
+                        source_box_lists=lists,
+                        centers=self.tree.box_centers,
+                        strengths=src_weight_vecs,
+
+                        tgt_expansions=target_local_exps_view,
+                        tgt_base_ibox=target_level_start_ibox,
+
+                        rscale=self.level_to_rscale(lev),
+
+                        **kwargs)
             events.append(evt)
 
             assert result is target_local_exps_view
 
-        return (local_exps, SumpyTimingFuture(queue, events))
+        # drive_fmm adds the result to the local expansions from M2L next
+        self._wait_for_stage_queues(src_weight_vecs[0].queue, ("form_locals",))
 
+        return (local_exps.with_queue(src_weight_vecs[0].queue),
+                SumpyTimingFuture(queue, events))
+
+    @fmm_stage("refine_locals")
     def refine_locals(self,
             level_start_target_or_target_parent_box_nrs,
             target_or_target_parent_boxes,
@@ -1036,20 +2578,25 @@ class SumpyExpansionWrangler(ExpansionWranglerInterface):
             target_level_start_ibox, target_local_exps_view = \
                     self.local_expansions_view(local_exps, target_lev)
 
-            evt, (local_exps_res,) = l2l(queue,
-                    src_expansions=source_local_exps_view,
-                    src_base_ibox=source_level_start_ibox,
-                    tgt_expansions=target_local_exps_view,
-                    tgt_base_ibox=target_level_start_ibox,
-
-                    target_boxes=target_or_target_parent_boxes[start:stop],
-                    box_parent_ids=self.tree.box_parent_ids,
-                    centers=self.tree.box_centers,
-
-                    src_rscale=self.level_to_rscale(source_lev),
-                    tgt_rscale=self.level_to_rscale(target_lev),
-
-                    **self.kernel_extra_kwargs)
+            with kernel_launch(level=target_lev,
+                    order=self.level_orders[target_lev],
+                    nboxes=stop - start,
+                    count_interactions=self._interaction_counter(
+                        target_or_target_parent_boxes[start:stop])):
+                evt, (local_exps_res,) = l2l(queue,
+                        src_expansions=source_local_exps_view,
+                        src_base_ibox=source_level_start_ibox,
+                        tgt_expansions=target_local_exps_view,
+                        tgt_base_ibox=target_level_start_ibox,
+
+                        target_boxes=target_or_target_parent_boxes[start:stop],
+                        box_parent_ids=self.tree.box_parent_ids,
+                        centers=self.tree.box_centers,
+
+                        src_rscale=self.level_to_rscale(source_lev),
+                        tgt_rscale=self.level_to_rscale(target_lev),
+
+                        **self.kernel_extra_kwargs)
             events.append(evt)
 
             assert local_exps_res is target_local_exps_view
@@ -1059,6 +2606,7 @@ class SumpyExpansionWrangler(ExpansionWranglerInterface):
 
         return (local_exps, SumpyTimingFuture(queue, events))
 
+    @fmm_stage("eval_locals")
     def eval_locals(self, level_start_target_box_nrs, target_boxes, local_exps):
         pot = self.output_zeros(local_exps)
 
@@ -1078,29 +2626,348 @@ class SumpyExpansionWrangler(ExpansionWranglerInterface):
             source_level_start_ibox, source_local_exps_view = \
                     self.local_expansions_view(local_exps, lev)
 
-            evt, pot_res = l2p(
-                    queue,
+            with kernel_launch(level=lev, order=self.level_orders[lev],
+                    nboxes=stop - start,
+                    count_interactions=self._interaction_counter(
+                        target_boxes[start:stop], per_box="targets")):
+                evt, pot_res = l2p(
+                        queue,
 
-                    src_expansions=source_local_exps_view,
-                    src_base_ibox=source_level_start_ibox,
+                        src_expansions=source_local_exps_view,
+                        src_base_ibox=source_level_start_ibox,
 
-                    target_boxes=target_boxes[start:stop],
-                    centers=self.tree.box_centers,
-                    result=pot,
+                        target_boxes=target_boxes[start:stop],
+                        centers=self.tree.box_centers,
+                        result=pot,
 
-                    rscale=self.level_to_rscale(lev),
+                        rscale=self.level_to_rscale(lev),
 
-                    **kwargs)
+                        **kwargs)
             events.append(evt)
 
             for pot_i, pot_res_i in zip(pot, pot_res, strict=True):
                 assert pot_i is pot_res_i
 
+        self._wait_for_stage_queues(queue)
+
         return (pot, SumpyTimingFuture(queue, events))
 
     def finalize_potentials(self, potentials, template_ary):
         return potentials
 
+    # {{{ delta evaluation, see drive_fmm_delta
+
+    @memoize_method
+    def _host_traversal(self):
+        with cl.CommandQueue(self.tree_indep.cl_context) as queue:
+            return self.traversal.get(queue)
+
+    @memoize_method
+    def _source_tree_ids_and_boxes(self):
+        """
+        :returns: a tuple of the tree order index of each source in user
+            order and the box owning each source in tree order.
+        """
+        import numpy as np
+
+        tree = self._host_traversal().tree
+
+        tree_source_ids = np.empty_like(tree.user_source_ids)
+        tree_source_ids[tree.user_source_ids] = np.arange(
+                tree.nsources, dtype=tree_source_ids.dtype)
+
+        boxes, = np.nonzero(tree.box_source_counts_nonchild)
+        counts = tree.box_source_counts_nonchild[boxes]
+        offsets = (np.arange(counts.sum())
+                   - np.repeat(np.cumsum(counts) - counts, counts))
+        source_boxes = np.empty(tree.nsources, dtype=tree.box_id_dtype)
+        source_boxes[np.repeat(tree.box_source_starts[boxes], counts)
+                     + offsets] = np.repeat(boxes, counts)
+
+        return tree_source_ids, source_boxes
+
+    def _delta_traversal(self, queue, changed_source_boxes):
+        """Restrict the boxes and interaction lists of the traversal to those
+        affected by changing the sources in *changed_source_boxes*.
+
+        :returns: a tuple of an object with the attributes of the traversal
+            used by :func:`boxtree.fmm.drive_fmm` and the translation classes
+            of its list of well-separated siblings (or *None*).
+        """
+        import numpy as np
+
+        trav = self._host_traversal()
+        tree = trav.tree
+
+        def box_mask(boxes):
+            result = np.zeros(tree.nboxes, dtype=bool)
+            result[boxes] = True
+            return result
+
+        def list_owners(starts):
+            return np.repeat(np.arange(len(starts) - 1), np.diff(starts))
+
+        def has_entries(starts, lists, is_source):
+            return np.bincount(list_owners(starts)[is_source[lists]],
+                               minlength=len(starts) - 1) > 0
+
+        def filter_boxes(level_starts, boxes, keep):
+            nkept = np.concatenate([[0], np.cumsum(keep)])
+            return nkept[level_starts].astype(level_starts.dtype), boxes[keep]
+
+        def filter_lists(starts, lists, keep_target, is_source):
+            owners = list_owners(starts)
+            keep_entry = is_source[lists] & keep_target[owners]
+            counts = np.bincount(owners[keep_entry],
+                                 minlength=len(starts) - 1)[keep_target]
+            new_starts = np.concatenate([[0], np.cumsum(counts)])
+            return (new_starts.astype(starts.dtype), lists[keep_entry],
+                    np.flatnonzero(keep_entry))
+
+        def to_device(ary):
+            return cl_array.to_device(queue, ary).with_queue(None)
+
+        def lists_to_device(ary):
+            # pad empty lists, which are never read, to allocate a buffer
+            if len(ary) == 0:
+                ary = np.zeros(1, dtype=ary.dtype)
+            return to_device(ary)
+
+        # {{{ upward pass: changed boxes and their ancestors
+
+        has_source_delta = box_mask(changed_source_boxes)
+        has_mpole_delta = has_source_delta.copy()
+        for lev in range(tree.nlevels - 1, 0, -1):
+            has_mpole_delta[tree.box_parent_ids[
+                has_mpole_delta & (tree.box_levels == lev)]] = True
+
+        # }}}
+
+        # {{{ downward pass: boxes with changed local expansions
+
+        ttp_boxes = trav.target_or_target_parent_boxes
+        has_local_delta = box_mask(np.concatenate([
+            ttp_boxes[has_entries(trav.from_sep_siblings_starts,
+                                  trav.from_sep_siblings_lists,
+                                  has_mpole_delta)],
+            ttp_boxes[has_entries(trav.from_sep_bigger_starts,
+                                  trav.from_sep_bigger_lists,
+                                  has_source_delta)],
+            ]))
+        is_ttp_box = box_mask(ttp_boxes)
+        for lev in range(1, tree.nlevels):
+            has_local_delta[
+                    is_ttp_box & (tree.box_levels == lev)
+                    & has_local_delta[tree.box_parent_ids]] = True
+
+        # }}}
+
+        near_field_lists = [
+                (trav.neighbor_source_boxes_starts,
+                 trav.neighbor_source_boxes_lists)]
+        if trav.from_sep_close_smaller_starts is not None:
+            near_field_lists.append((trav.from_sep_close_smaller_starts,
+                                     trav.from_sep_close_smaller_lists))
+        if trav.from_sep_close_bigger_starts is not None:
+            near_field_lists.append((trav.from_sep_close_bigger_starts,
+                                     trav.from_sep_close_bigger_lists))
+
+        keep_target_box = has_local_delta[trav.target_boxes]
+        for starts, lists in near_field_lists:
+            keep_target_box |= has_entries(starts, lists, has_source_delta)
+        keep_ttp_box = has_local_delta[ttp_boxes]
+
+        from types import SimpleNamespace
+        result = SimpleNamespace()
+
+        def set_boxes(level_starts_name, boxes_name, keep):
+            level_starts, boxes = filter_boxes(
+                    getattr(trav, level_starts_name),
+                    getattr(trav, boxes_name), keep)
+            setattr(result, level_starts_name, level_starts)
+            setattr(result, boxes_name, to_device(boxes))
+
+        set_boxes("level_start_source_box_nrs", "source_boxes",
+                has_source_delta[trav.source_boxes])
+        set_boxes("level_start_source_parent_box_nrs", "source_parent_boxes",
+                has_mpole_delta[trav.source_parent_boxes])
+        set_boxes("level_start_target_box_nrs", "target_boxes",
+                keep_target_box)
+        set_boxes("level_start_target_or_target_parent_box_nrs",
+                "target_or_target_parent_boxes", keep_ttp_box)
+
+        def set_lists(name, keep_target, is_source):
+            starts = getattr(trav, f"{name}_starts")
+            if starts is None:
+                setattr(result, f"{name}_starts", None)
+                setattr(result, f"{name}_lists", None)
+                return None
+
+            starts, lists, kept_entries = filter_lists(
+                    starts, getattr(trav, f"{name}_lists"),
+                    keep_target, is_source)
+            setattr(result, f"{name}_starts", to_device(starts))
+            setattr(result, f"{name}_lists", lists_to_device(lists))
+            return kept_entries
+
+        set_lists("neighbor_source_boxes", keep_target_box, has_source_delta)
+        set_lists("from_sep_close_smaller", keep_target_box, has_source_delta)
+        set_lists("from_sep_close_bigger", keep_target_box, has_source_delta)
+        set_lists("from_sep_bigger", keep_ttp_box, has_source_delta)
+        sibling_entries = set_lists(
+                "from_sep_siblings", keep_ttp_box, has_mpole_delta)
+
+        result.target_boxes_sep_smaller_by_source_level = []
+        result.from_sep_smaller_by_level = []
+        for target_boxes, ssn in zip(
+                trav.target_boxes_sep_smaller_by_source_level,
+                trav.from_sep_smaller_by_level, strict=True):
+            keep_target = has_entries(ssn.starts, ssn.lists, has_mpole_delta)
+            starts, lists, _ = filter_lists(
+                    ssn.starts, ssn.lists, keep_target, has_mpole_delta)
+            result.target_boxes_sep_smaller_by_source_level.append(
+                    to_device(target_boxes[keep_target]))
+            result.from_sep_smaller_by_level.append(SimpleNamespace(
+                    starts=to_device(starts), lists=lists_to_device(lists)))
+
+        if self.supports_translation_classes:
+            translation_classes_lists = lists_to_device(
+                    self.m2l_translation_classes_lists().get(queue)[
+                        sibling_entries])
+        else:
+            translation_classes_lists = None
+
+        return result, translation_classes_lists
+
+    # }}}
+
+# }}}
+
+
+# {{{ delta evaluation
+
+class _RestrictedWrangler:
+    """Forwards to *wrangler*, but presents *traversal* (restricted to some
+    boxes and interaction lists) to :func:`boxtree.fmm.drive_fmm` and passes
+    the matching *translation_classes_lists* to
+    :meth:`SumpyExpansionWrangler.multipole_to_local`.
+    """
+
+    def __init__(self, wrangler, traversal, translation_classes_lists):
+        self.wrangler = wrangler
+        self.traversal = traversal
+        self.translation_classes_lists = translation_classes_lists
+
+    def __getattr__(self, name):
+        return getattr(self.wrangler, name)
+
+    def multipole_to_local(self, *args):
+        return self.wrangler.multipole_to_local(*args,
+                translation_classes_lists=self.translation_classes_lists)
+
+
+def drive_fmm_delta(wrangler, queue, source_ids, weight_deltas=None, *,
+        new_sources=None, weights=None):
+    """Evaluate the change of the potentials computed by
+    ``drive_fmm(wrangler, src_weight_vecs)`` (see
+    :func:`boxtree.fmm.drive_fmm`) if the weights of the sources with the
+    (user order) indices *source_ids* change or if these sources move
+    within their boxes.
+
+    The stages of :func:`boxtree.fmm.drive_fmm` are run on a copy of the
+    traversal of *wrangler* restricted to the boxes affected by the change.
+    The multipole expansions are only formed for the boxes containing the
+    changed sources and translated along the chains of their ancestors.
+    Only the target boxes whose interaction lists contain one of these
+    boxes, and their descendants, receive contributions.
+
+    :arg wrangler: a :class:`SumpyExpansionWrangler`.
+    :arg source_ids: a :class:`numpy.ndarray` of source indices.
+    :arg weight_deltas: a sequence of :class:`numpy.ndarray`, one for each
+        source weight vector, with the changes of the weights of the sources
+        *source_ids*.
+    :arg new_sources: a :class:`numpy.ndarray` of shape
+        ``(dim, len(source_ids))`` with the new positions of the sources.
+        Each source must stay in its box, so that the tree and traversal of
+        *wrangler* remain valid. The sources of the tree are updated in
+        place. Since the potentials are evaluated with the old and the new
+        positions, this costs about twice as much as only changing weights.
+    :arg weights: the weights of the sources *source_ids* before the change,
+        in the same format as *weight_deltas*. Required if *new_sources* is
+        given.
+    :returns: the change of the potentials, in the same format as the
+        result of :func:`boxtree.fmm.drive_fmm`.
+    """
+    import numpy as np
+
+    from boxtree.fmm import drive_fmm
+
+    tree = wrangler.tree
+    source_ids = np.asarray(source_ids)
+
+    tree_source_ids, source_boxes = wrangler._source_tree_ids_and_boxes()
+    tree_order_source_ids = tree_source_ids[source_ids]
+    restricted_wrangler = _RestrictedWrangler(wrangler,
+            *wrangler._delta_traversal(
+                queue, source_boxes[tree_order_source_ids]))
+
+    def weight_vecs(weights):
+        result = []
+        for weight in weights:
+            weight = np.asarray(weight)
+            weight_vec = np.zeros(tree.nsources, dtype=weight.dtype)
+            np.add.at(weight_vec, source_ids, weight)
+            result.append(cl_array.to_device(queue, weight_vec))
+
+        return result
+
+    if new_sources is None:
+        if weight_deltas is None:
+            raise TypeError("either 'weight_deltas' or 'new_sources' "
+                    "must be given")
+
+        return drive_fmm(restricted_wrangler, weight_vecs(weight_deltas))
+
+    if weights is None:
+        raise TypeError("'weights' must be given to move sources")
+    if tree.sources_are_targets:
+        raise ValueError("cannot move sources that are also targets")
+
+    new_sources = np.asarray(new_sources)
+    host_tree = wrangler._host_traversal().tree
+    boxes = source_boxes[tree_order_source_ids]
+    box_radii = host_tree.root_extent / 2 ** (host_tree.box_levels[boxes] + 1)
+    if np.any(np.abs(new_sources - host_tree.box_centers[:, boxes])
+              > box_radii):
+        raise ValueError("sources may only move within their boxes")
+
+    if weight_deltas is None:
+        new_weights = weights
+    else:
+        new_weights = [
+                np.asarray(weight) + weight_delta
+                for weight, weight_delta in zip(
+                    weights, weight_deltas, strict=True)]
+
+    result = drive_fmm(restricted_wrangler,
+            weight_vecs([-np.asarray(w) for w in weights]))
+
+    # the overlapped stages must be done with the old positions
+    wrangler._wait_for_stage_queues(queue)
+    cl_array.multi_put(
+            [cl_array.to_device(queue,
+                new_sources[iaxis].astype(tree.coord_dtype))
+             for iaxis in range(tree.dimensions)],
+            cl_array.to_device(queue, tree_order_source_ids),
+            out=list(tree.sources), queue=queue)
+    wrangler._stage_queues_wait_for(queue)
+
+    # the stored near-field interactions are those of the old positions
+    with suppress(AttributeError):
+        SumpyExpansionWrangler.near_field_matrix_blocks.clear_cache(wrangler)
+
+    return result + drive_fmm(restricted_wrangler, weight_vecs(new_weights))
+
 # }}}
 
 
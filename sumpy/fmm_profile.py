@@ -0,0 +1,595 @@
+from __future__ import annotations
+
+
+__copyright__ = "Copyright (C) 2024 University of Illinois Board of Trustees"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import time
+import weakref
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any
+
+from pymbolic.mapper.flop_counter import FlopCounterBase
+
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Generator
+
+    from typing_extensions import Self
+
+    import loopy as lp
+
+
+__doc__ = """
+FMM Stage Profiling
+-------------------
+
+While an :class:`FMMProfile` is active, every :mod:`loopy` kernel launched by
+a :class:`~sumpy.fmm.SumpyExpansionWrangler` is recorded together with the
+FMM stage it belongs to, the tree level and expansion order it works on, the
+number of boxes and interactions it processes and an estimate of the number
+of floating point operations it performs.
+
+Kernel run times are taken from the profiling information of the events if
+the command queue has profiling enabled. Otherwise, they are measured on the
+host, from enqueueing the kernel to the notification of its completion, which
+includes the time the kernel waited in the queue.
+
+.. code-block:: python
+
+    from sumpy.fmm_profile import FMMProfile
+
+    with FMMProfile() as profile:
+        drive_fmm(wrangler, (weights,))
+
+    print(profile)
+    profile.write_chrome_trace("fmm-trace.json")
+
+The trace can be viewed in ``chrome://tracing`` or `Perfetto
+<https://ui.perfetto.dev>`__.
+
+.. autoclass:: KernelLaunchRecord
+.. autoclass:: FMMProfile
+
+.. autofunction:: fmm_stage
+.. autofunction:: kernel_launch
+"""
+
+
+# {{{ operation counting
+
+class _OpCounter(FlopCounterBase):
+    """Counts the floating point operations in a :mod:`loopy` expression.
+    Index computations and casts are not counted.
+    """
+
+    def map_subscript(self, expr):
+        return self.rec(expr.aggregate)
+
+    def map_call(self, expr):
+        return 1 + sum(self.rec(par) for par in expr.parameters)
+
+    def map_type_cast(self, expr):
+        return self.rec(expr.child)
+
+    def map_tagged_variable(self, expr):
+        return 0
+
+    def map_lookup(self, expr):
+        return 0
+
+    def map_comparison(self, expr):
+        return self.rec(expr.left) + self.rec(expr.right)
+
+    def map_logical_and(self, expr):
+        return sum(self.rec(ch) for ch in expr.children)
+
+    map_logical_or = map_logical_and
+
+    def map_logical_not(self, expr):
+        return self.rec(expr.child)
+
+    def map_if(self, expr):
+        return self.rec(expr.condition) + max(
+                self.rec(expr.then), self.rec(expr.else_))
+
+    def map_reduction(self, expr):
+        return 1 + self.rec(expr.expr)
+
+
+_OP_COUNTS: weakref.WeakKeyDictionary[Any, int] = weakref.WeakKeyDictionary()
+
+
+def _get_op_count(executor: Any) -> int:
+    """Return the number of floating point operations in the instructions of
+    the entrypoint of the translation unit of *executor*, each instruction
+    being counted once.
+    """
+    try:
+        return _OP_COUNTS[executor]
+    except KeyError:
+        pass
+
+    import loopy as lp
+
+    t_unit: lp.TranslationUnit = executor.t_unit
+    counter = _OpCounter()
+    result = sum(
+            counter(insn.expression)
+            for insn in t_unit[executor.entrypoint].instructions
+            if isinstance(insn, lp.Assignment))
+
+    _OP_COUNTS[executor] = result
+    return result
+
+# }}}
+
+
+# {{{ records
+
+@dataclass
+class KernelLaunchRecord:
+    """
+    .. attribute:: stage
+
+        Name of the :class:`~sumpy.fmm.SumpyExpansionWrangler` method that
+        launched the kernel, e.g. ``"form_multipoles"``.
+
+    .. attribute:: kernel_name
+
+        Name of the :mod:`loopy` kernel.
+
+    .. attribute:: class_name
+
+        Name of the class generating the kernel.
+
+    .. attribute:: level
+
+        Tree level the kernel works on, or *None* if not applicable.
+
+    .. attribute:: order
+
+        Expansion order used by the kernel, or *None* if not applicable.
+
+    .. attribute:: nboxes
+
+        Number of target boxes processed by the kernel, or *None* if not
+        known.
+
+    .. attribute:: ninteractions
+
+        Number of executions of the innermost loop of the kernel, i.e. the
+        number of particle-particle, particle-box or box-box interactions, or
+        *None* if not known.
+
+    .. attribute:: nbytes
+
+        Total size in bytes of the array arguments of the kernel. Since whole
+        arrays are passed even if only parts of them are accessed, this is an
+        upper bound on the amount of data moved.
+
+    .. attribute:: op_count
+
+        Number of floating point operations in the instructions of the
+        generated kernel, each counted once.
+
+    .. attribute:: flops
+
+        Estimated number of floating point operations performed by the
+        kernel, :attr:`op_count` times :attr:`ninteractions`, or *None* if
+        the number of interactions is not known.
+
+    .. attribute:: queue_index
+
+        Index of the command queue the kernel was enqueued on, in order of
+        first use.
+
+    .. attribute:: timing
+
+        ``"device"`` if :attr:`start` and :attr:`end` are obtained from the
+        event profiling information, or ``"host"`` if they are measured on
+        the host.
+
+    .. attribute:: start
+    .. attribute:: end
+
+        Start and end time of the kernel in seconds, relative to the earliest
+        start of the kernels with the same :attr:`timing`.
+
+    .. attribute:: elapsed
+    """
+
+    stage: str
+    kernel_name: str
+    class_name: str
+    level: int | None = None
+    order: int | None = None
+    nboxes: int | None = None
+    ninteractions: int | None = None
+    nbytes: int = 0
+    op_count: int = 0
+    flops: int | None = None
+    queue_index: int = 0
+    timing: str = "device"
+    start: float = 0.0
+    end: float = 0.0
+
+    _event: Any = field(default=None, repr=False, compare=False)
+    _host_end: float | None = field(default=None, repr=False, compare=False)
+    _normalized: bool = field(default=False, repr=False, compare=False)
+    _count_interactions: Callable[[], int] | None = field(
+            default=None, repr=False, compare=False)
+
+    @property
+    def elapsed(self) -> float:
+        return self.end - self.start
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+                "stage": self.stage,
+                "kernel_name": self.kernel_name,
+                "class_name": self.class_name,
+                "level": self.level,
+                "order": self.order,
+                "nboxes": self.nboxes,
+                "ninteractions": self.ninteractions,
+                "nbytes": self.nbytes,
+                "op_count": self.op_count,
+                "flops": self.flops,
+                "queue_index": self.queue_index,
+                "timing": self.timing,
+                "start": self.start,
+                "end": self.end,
+                }
+
+# }}}
+
+
+# {{{ profile
+
+@dataclass
+class _LaunchInfo:
+    level: int | None = None
+    order: int | None = None
+    nboxes: int | None = None
+    count_interactions: Callable[[], int] | None = None
+
+
+_ACTIVE_PROFILES: list[FMMProfile] = []
+
+
+class FMMProfile:
+    """A context manager that collects a :class:`KernelLaunchRecord` for each
+    kernel launched in an FMM stage while it is active. On exit, it waits for
+    all the recorded kernels to complete.
+
+    .. attribute:: records
+
+    .. automethod:: finish
+    .. automethod:: by_stage
+    .. automethod:: by_level
+    .. automethod:: to_json
+    .. automethod:: to_chrome_trace
+    .. automethod:: write_chrome_trace
+    """
+
+    def __init__(self) -> None:
+        self.records: list[KernelLaunchRecord] = []
+
+        self._stages: list[str] = []
+        self._launches: list[_LaunchInfo] = []
+        self._queues: list[Any] = []
+        self._executors: dict[tuple[int, str], _RecordingExecutor] = {}
+
+    def __enter__(self) -> Self:
+        _ACTIVE_PROFILES.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        _ACTIVE_PROFILES.remove(self)
+        self.finish()
+
+    # {{{ recording
+
+    def _queue_index(self, queue: Any) -> int:
+        for i, q in enumerate(self._queues):
+            if q is queue:
+                return i
+
+        self._queues.append(queue)
+        return len(self._queues) - 1
+
+    def _record(self, executor: Any, class_name: str,
+                queue: Any, kwargs: dict[str, Any]) -> KernelLaunchRecord:
+        import pyopencl as cl
+        import pyopencl.array as cl_array
+
+        from sumpy.tools import is_obj_array_like
+
+        info = self._launches[-1] if self._launches else _LaunchInfo()
+
+        nbytes = 0
+        for arg in kwargs.values():
+            arys = arg if is_obj_array_like(arg) else [arg]
+            nbytes += sum(ary.nbytes for ary in arys
+                          if isinstance(ary, cl_array.Array))
+
+        profiling = bool(
+                queue.properties & cl.command_queue_properties.PROFILING_ENABLE)
+
+        record = KernelLaunchRecord(
+                stage=self._stages[-1],
+                kernel_name=executor.entrypoint,
+                class_name=class_name,
+                level=info.level,
+                order=info.order,
+                nboxes=info.nboxes,
+                nbytes=nbytes,
+                op_count=_get_op_count(executor),
+                queue_index=self._queue_index(queue),
+                timing="device" if profiling else "host",
+                _count_interactions=info.count_interactions)
+
+        if not profiling:
+            record.start = time.perf_counter()
+
+        self.records.append(record)
+        return record
+
+    def _set_event(self, record: KernelLaunchRecord, evt: Any) -> None:
+        from sumpy.tools import get_native_event
+        record._event = get_native_event(evt)
+
+        if record.timing == "host":
+            import pyopencl as cl
+
+            def set_end_time(status: int) -> None:
+                record._host_end = time.perf_counter()
+
+            record._event.set_callback(
+                    cl.command_execution_status.COMPLETE, set_end_time)
+
+    # }}}
+
+    def finish(self) -> None:
+        """Wait for all the recorded kernels to complete and fill in their
+        timings and operation counts. This is called automatically when the
+        profile is exited.
+        """
+        import pyopencl as cl
+
+        events = [rec._event for rec in self.records if rec._event is not None]
+        if events:
+            cl.wait_for_events(events)
+
+        for rec in self.records:
+            if rec._count_interactions is not None:
+                rec.ninteractions = rec._count_interactions()
+                rec.flops = rec.op_count * rec.ninteractions
+                rec._count_interactions = None
+
+            if rec._event is None:
+                continue
+
+            if rec.timing == "device":
+                rec.start = rec._event.profile.start * 1e-9
+                rec.end = rec._event.profile.end * 1e-9
+            else:
+                # the completion callback may still be pending
+                rec.end = (
+                    time.perf_counter() if rec._host_end is None
+                    else rec._host_end)
+
+            rec._event = None
+
+        for timing in ["device", "host"]:
+            recs = [rec for rec in self.records
+                    if rec.timing == timing and not rec._normalized]
+            if not recs:
+                continue
+
+            t0 = min(rec.start for rec in recs)
+            for rec in recs:
+                rec.start -= t0
+                rec.end -= t0
+                rec._normalized = True
+
+        self._queues = []
+
+    def by_stage(self) -> dict[str, float]:
+        """
+        :returns: a mapping from stage names to the total run time of their
+            kernels, most expensive first.
+        """
+        result: dict[str, float] = {}
+        for rec in self.records:
+            result[rec.stage] = result.get(rec.stage, 0) + rec.elapsed
+
+        return dict(sorted(result.items(), key=lambda kv: kv[1], reverse=True))
+
+    def by_level(self) -> dict[tuple[str, int | None], float]:
+        """
+        :returns: a mapping from ``(stage, level)`` to the total run time of
+            the kernels of that stage working on that level, most expensive
+            first.
+        """
+        result: dict[tuple[str, int | None], float] = {}
+        for rec in self.records:
+            key = (rec.stage, rec.level)
+            result[key] = result.get(key, 0) + rec.elapsed
+
+        return dict(sorted(result.items(), key=lambda kv: kv[1], reverse=True))
+
+    def to_json(self) -> str:
+        import json
+        return json.dumps([rec.to_dict() for rec in self.records], indent=2)
+
+    def to_chrome_trace(self) -> dict[str, Any]:
+        """
+        :returns: the records in the `Trace Event Format
+            <https://docs.google.com/document/d/1CvAClvFfyA5R-PhYUmn5OOQtYMH4h6I0nSsKchNAySU>`__
+            understood by ``chrome://tracing`` and Perfetto, with one thread
+            per command queue. Kernels timed on the device and on the host are
+            shown as separate processes, since their clocks are not related.
+        """
+        trace_events: list[dict[str, Any]] = []
+        for pid, timing in enumerate(["device", "host"]):
+            recs = [rec for rec in self.records if rec.timing == timing]
+            if not recs:
+                continue
+
+            trace_events.append({
+                "name": "process_name", "ph": "M", "pid": pid,
+                "args": {"name": f"sumpy FMM ({timing} timing)"}})
+            for iqueue in sorted({rec.queue_index for rec in recs}):
+                trace_events.append({
+                    "name": "thread_name", "ph": "M", "pid": pid,
+                    "tid": iqueue, "args": {"name": f"queue {iqueue}"}})
+
+            for rec in recs:
+                trace_events.append({
+                    "name": rec.kernel_name,
+                    "cat": rec.stage,
+                    "ph": "X",
+                    "ts": rec.start * 1e6,
+                    "dur": rec.elapsed * 1e6,
+                    "pid": pid,
+                    "tid": rec.queue_index,
+                    "args": {
+                        key: value for key, value in rec.to_dict().items()
+                        if key not in {"kernel_name", "start", "end"}},
+                    })
+
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, filename: str) -> None:
+        """Write :meth:`to_chrome_trace` to *filename* as JSON."""
+        import json
+        with open(filename, "w") as outf:
+            json.dump(self.to_chrome_trace(), outf)
+
+    def __str__(self) -> str:
+        lines = []
+        for rec in self.records:
+            level = "-" if rec.level is None else rec.level
+            flops = "-" if rec.flops is None else f"{rec.flops:.3g}"
+            lines.append(f"{rec.stage}: {rec.kernel_name} [level {level}, "
+                         f"{rec.nboxes} boxes, {flops} flops]: "
+                         f"{rec.elapsed:.6f}s ({rec.timing})")
+
+        return "\n".join(lines)
+
+# }}}
+
+
+# {{{ instrumentation
+
+class _RecordingExecutor:
+    def __init__(self, profile: FMMProfile, executor: lp.ExecutorBase,
+                 class_name: str) -> None:
+        self.profile = profile
+        self.executor = executor
+        self.class_name = class_name
+
+    def __call__(self, queue, **kwargs):
+        record = self.profile._record(
+                self.executor, self.class_name, queue, kwargs)
+        evt, result = self.executor(queue, **kwargs)
+        self.profile._set_event(record, evt)
+
+        return evt, result
+
+
+def wrap_executor(executor: lp.ExecutorBase, class_name: str) -> Any:
+    """Return *executor* unchanged if no FMM stage is being profiled, or an
+    executor that records its launches in the innermost active
+    :class:`FMMProfile` otherwise.
+    """
+    if not _ACTIVE_PROFILES or not _ACTIVE_PROFILES[-1]._stages:
+        return executor
+
+    # The recording executor keeps *executor* alive, so its id stays unique.
+    profile = _ACTIVE_PROFILES[-1]
+    key = (id(executor), class_name)
+    try:
+        return profile._executors[key]
+    except KeyError:
+        result = profile._executors[key] = \
+            _RecordingExecutor(profile, executor, class_name)
+        return result
+
+
+@contextmanager
+def fmm_stage(name: str) -> Generator[None, None, None]:
+    """Record the kernels launched in the FMM stage *name* in the innermost
+    active :class:`FMMProfile`.
+
+    This may also be used as a function decorator.
+    """
+    if not _ACTIVE_PROFILES:
+        yield
+        return
+
+    profile = _ACTIVE_PROFILES[-1]
+    profile._stages.append(name)
+    try:
+        yield
+    finally:
+        profile._stages.pop()
+
+
+@contextmanager
+def kernel_launch(*,
+        level: int | None = None,
+        order: int | None = None,
+        nboxes: int | None = None,
+        count_interactions: Callable[[], int] | None = None,
+        ) -> Generator[None, None, None]:
+    """Attach information to the kernels launched within an :func:`fmm_stage`
+    in the innermost active :class:`FMMProfile`.
+
+    :arg count_interactions: a callable returning
+        :attr:`KernelLaunchRecord.ninteractions`. It is only called in
+        :meth:`FMMProfile.finish`, so that it may transfer data from the
+        device without interfering with the execution of the FMM.
+    """
+    if not _ACTIVE_PROFILES:
+        yield
+        return
+
+    def to_int(value):
+        # level starts and box counts are often numpy integers
+        return None if value is None else int(value)
+
+    profile = _ACTIVE_PROFILES[-1]
+    profile._launches.append(_LaunchInfo(
+        level=to_int(level), order=to_int(order), nboxes=to_int(nboxes),
+        count_interactions=count_interactions))
+    try:
+        yield
+    finally:
+        profile._launches.pop()
+
+# }}}
+
+# vim: foldmethod=marker
@@ -133,10 +133,19 @@ class KernelArgument:
 # {{{ basic kernel interface
 
 class Kernel:
-    """Basic kernel interface.
+    r"""Basic kernel interface.
 
     .. attribute:: is_complex_valued
     .. attribute:: is_translation_invariant
+    .. attribute:: homogeneity_degree
+
+        If not *None*, the kernel is homogeneous of this degree :math:`k`,
+        i.e. :math:`G(s \boldsymbol{x}) = s^k G(\boldsymbol{x})` for all
+        :math:`s > 0`. This allows the translation-class dependent data
+        of the multipole-to-local translations of one level of a tree to be
+        derived from that of another, see
+        :class:`sumpy.fmm.SumpyExpansionWrangler`.
+
     .. attribute:: dim
 
     .. automethod:: get_base_kernel
@@ -318,6 +327,8 @@ class Kernel:
     # TODO: Allow kernels that are not translation invariant
     is_translation_invariant = True
 
+    homogeneity_degree: int | None = None
+
 # }}}
 
 
@@ -444,6 +455,7 @@ class LaplaceKernel(ExpressionKernel):
             r = pymbolic_real_norm_2(make_sym_vector("d", dim))
             expr = 1/r
             scaling = 1/(4*var("pi"))
+            self.homogeneity_degree = -1
         else:
             raise NotImplementedError("unsupported dimensionality")
 
@@ -492,6 +504,7 @@ class BiharmonicKernel(ExpressionKernel):
             # Journal of Computational Physics 230, no. 19 (2011): 7488-7501.
             expr = r
             scaling = -1/(8*var("pi"))
+            self.homogeneity_degree = 1
         else:
             raise RuntimeError("unsupported dimensionality")
 
@@ -727,6 +740,7 @@ class ElasticityKernel(ExpressionKernel):
                 d[icomp]*d[jcomp]/r**3
                 )
             scaling = -1/(16*var("pi")*(1 - nu)*mu)
+            self.homogeneity_degree = -1
 
         else:
             raise RuntimeError("unsupported dimensionality")
@@ -818,6 +832,7 @@ class StressletKernel(ExpressionKernel):
                 d[icomp]*d[jcomp]*d[kcomp]/r**4
                 )
             scaling = 1/(var("pi"))
+            self.homogeneity_degree = -1
 
         elif dim == 3:
             d = make_sym_vector("d", dim)
@@ -826,6 +841,7 @@ class StressletKernel(ExpressionKernel):
                 d[icomp]*d[jcomp]*d[kcomp]/r**5
                 )
             scaling = 3/(4*var("pi"))
+            self.homogeneity_degree = -2
 
         else:
             raise RuntimeError("unsupported dimensionality")
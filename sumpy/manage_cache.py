@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+
+__copyright__ = "Copyright (C) 2024 University of Illinois Board of Trustees"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import os
+import time
+from typing import TYPE_CHECKING, Any
+
+from sumpy.cache import SumpyCodeCache, parse_size
+
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+
+__doc__ = """
+Command line interface for managing :data:`sumpy.code_cache`,
+:data:`sumpy.binary_cache`, :data:`sumpy.m2l_precompute_cache` and
+:data:`sumpy.autotune_cache`, run as ``python -m sumpy.manage_cache``.
+"""
+
+
+# {{{ command line interface
+
+def _get_caches(which: str) -> list[SumpyCodeCache[Any, Any]]:
+    import sumpy
+
+    return {
+        "code": [sumpy.code_cache],
+        "binary": [sumpy.binary_cache],
+        "m2l": [sumpy.m2l_precompute_cache],
+        "autotune": [sumpy.autotune_cache],
+        "all": [sumpy.code_cache, sumpy.binary_cache,
+                sumpy.m2l_precompute_cache, sumpy.autotune_cache],
+        }[which]
+
+
+def _format_size(nbytes: float) -> str:
+    for unit in ["B", "KiB", "MiB"]:
+        if nbytes < 1024:
+            return f"{nbytes:.1f} {unit}"
+        nbytes /= 1024
+
+    return f"{nbytes:.1f} GiB"
+
+
+def _remove_other_versions(cache: SumpyCodeCache[Any, Any]) -> list[str]:
+    # Caches of other versions of sumpy live in different files, see the
+    # identifiers in sumpy/__init__.py.
+    import glob
+
+    from sumpy.version import VERSION_TEXT
+
+    prefix = cache.identifier.removesuffix(VERSION_TEXT)
+    removed = []
+    for filename in glob.glob(
+            os.path.join(cache.container_dir, f"pdict-v5-{prefix}*.sqlite")):
+        if os.path.basename(filename).startswith(
+                f"pdict-v5-{cache.identifier}-"):
+            continue
+
+        os.remove(filename)
+        removed.append(filename)
+
+    return removed
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="python -m sumpy.manage_cache",
+        description="Inspect and manage the sumpy kernel caches.")
+    parser.add_argument("--cache",
+                        choices=["code", "binary", "m2l", "autotune", "all"],
+                        default="all", help="which cache to operate on")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parser_list = subparsers.add_parser("list", help="list cache entries")
+    parser_list.add_argument("--sort", choices=["access", "size", "name"],
+                             default="access")
+
+    subparsers.add_parser("info", help="show cache locations and sizes")
+
+    parser_prune = subparsers.add_parser(
+        "prune", help="remove entries for other kernel versions")
+    parser_prune.add_argument(
+        "--other-versions", action="store_true",
+        help="also remove the caches of other sumpy versions")
+
+    parser_evict = subparsers.add_parser(
+        "evict", help="remove least recently used entries")
+    parser_evict.add_argument("max_size", help="e.g. 500M or 2G")
+
+    parser_export = subparsers.add_parser("export", help="export a bundle")
+    parser_export.add_argument("filename")
+    parser_export.add_argument("--name", nargs="+", default=None,
+                               help="only export entries of these kernels")
+
+    parser_import = subparsers.add_parser("import", help="import a bundle")
+    parser_import.add_argument("filename")
+
+    args = parser.parse_args(argv)
+
+    for cache in _get_caches(args.cache):
+        if args.command == "list":
+            entries = cache.entries()
+            if args.sort == "size":
+                entries.sort(key=lambda e: e.nbytes, reverse=True)
+            elif args.sort == "name":
+                entries.sort(key=lambda e: (e.name or "", e.order or 0))
+
+            print(f"# {cache.identifier}")
+            for entry in entries:
+                order = "-" if entry.order is None else entry.order
+                last_access = time.strftime(
+                    "%Y-%m-%d %H:%M", time.localtime(entry.last_access))
+                print(f"{entry.keyhash}  {entry.name or '?':<42} {order:>5} "
+                      f"{_format_size(entry.nbytes):>11}  {last_access}")
+
+        elif args.command == "info":
+            print(f"{cache.identifier}: {len(cache)} entries, "
+                  f"{_format_size(cache.total_size())} "
+                  f"[max: {cache.max_size}] in {cache.filename}")
+
+        elif args.command == "prune":
+            print(f"{cache.identifier}: removed {cache.prune_stale()} entries")
+            if args.other_versions:
+                for filename in _remove_other_versions(cache):
+                    print(f"removed {filename}")
+
+        elif args.command == "evict":
+            nremoved = cache.evict(parse_size(args.max_size))
+            print(f"{cache.identifier}: removed {nremoved} entries")
+
+        elif args.command == "export":
+            nexported = cache.export_bundle(args.filename, names=args.name)
+            print(f"{cache.identifier}: exported {nexported} entries")
+
+        elif args.command == "import":
+            nimported = cache.import_bundle(args.filename)
+            print(f"{cache.identifier}: imported {nimported} entries")
+
+        else:
+            raise AssertionError(args.command)
+
+
+if __name__ == "__main__":
+    main()
+
+# }}}
+
+# vim: foldmethod=marker
@@ -30,6 +30,7 @@ import numpy as np
 import loopy as lp
 from loopy.version import MOST_RECENT_LANGUAGE_VERSION
 
+from sumpy.build_profile import build_phase
 from sumpy.codegen import register_optimization_preambles
 from sumpy.tools import KernelCacheMixin, KernelComputation
 
@@ -91,6 +92,7 @@ class P2EBase(KernelCacheMixin, KernelComputation):
         self.expansion = expansion
         self.dim = expansion.dim
 
+    @build_phase("expansion_formation")
     def add_loopy_form_callable(
             self, loopy_knl: lp.TranslationUnit) -> lp.TranslationUnit:
         inner_knl = self.expansion.loopy_expansion_formation(
@@ -112,6 +114,11 @@ class P2EBase(KernelCacheMixin, KernelComputation):
         return (type(self).__name__, self.name, self.expansion,
                 tuple(self.source_kernels), tuple(self.strength_usage))
 
+    def get_tuning_space(self, sources_is_obj_array, centers_is_obj_array):
+        return [{}] + [
+            {"box_chunk_size": box_chunk_size}
+            for box_chunk_size in [1, 4, 64]]
+
     def get_optimized_kernel(self, sources_is_obj_array, centers_is_obj_array):
         knl = self.get_kernel()
 
@@ -128,18 +135,19 @@ class P2EBase(KernelCacheMixin, KernelComputation):
 
     def __call__(self, queue, **kwargs):
         from sumpy.tools import is_obj_array_like
-        sources = kwargs.pop("sources")
-        centers = kwargs.pop("centers")
-        knl = self.get_cached_kernel_executor(
-                sources_is_obj_array=is_obj_array_like(sources),
-                centers_is_obj_array=is_obj_array_like(centers))
+        sources = kwargs["sources"]
+        centers = kwargs["centers"]
 
         # "1" may be passed for rscale, which won't have its type
         # meaningfully inferred. Make the type of rscale explicit.
         dtype = centers[0].dtype if is_obj_array_like(centers) else centers.dtype
-        rscale = dtype.type(kwargs.pop("rscale"))
+        kwargs["rscale"] = dtype.type(kwargs["rscale"])
+
+        knl = self.get_tuned_kernel_executor(queue, kwargs,
+                sources_is_obj_array=is_obj_array_like(sources),
+                centers_is_obj_array=is_obj_array_like(centers))
 
-        return knl(queue, sources=sources, centers=centers, rscale=rscale, **kwargs)
+        return knl(queue, **kwargs)
 
 # }}}
 
@@ -228,13 +236,16 @@ class P2EFromSingleBox(P2EBase):
 
         return loopy_knl
 
-    def get_optimized_kernel(self, sources_is_obj_array, centers_is_obj_array):
+    def get_optimized_kernel(self, sources_is_obj_array, centers_is_obj_array,
+            box_chunk_size=None):
         knl = super().get_optimized_kernel(
                 sources_is_obj_array=sources_is_obj_array,
                 centers_is_obj_array=centers_is_obj_array)
 
         # FIXME
-        knl = lp.split_iname(knl, "isrc_box", 16, outer_tag="g.0")
+        if box_chunk_size is None:
+            box_chunk_size = 16
+        knl = lp.split_iname(knl, "isrc_box", box_chunk_size, outer_tag="g.0")
         return knl
 
     def __call__(self, queue, **kwargs):
@@ -361,13 +372,16 @@ class P2EFromCSR(P2EBase):
 
         return loopy_knl
 
-    def get_optimized_kernel(self, sources_is_obj_array, centers_is_obj_array):
+    def get_optimized_kernel(self, sources_is_obj_array, centers_is_obj_array,
+            box_chunk_size=None):
         knl = super().get_optimized_kernel(
                 sources_is_obj_array=sources_is_obj_array,
                 centers_is_obj_array=centers_is_obj_array)
 
         # FIXME
-        knl = lp.split_iname(knl, "itgt_box", 16, outer_tag="g.0")
+        if box_chunk_size is None:
+            box_chunk_size = 16
+        knl = lp.split_iname(knl, "itgt_box", box_chunk_size, outer_tag="g.0")
         return knl
 
     def __call__(self, queue, **kwargs):
@@ -31,6 +31,7 @@ import numpy as np
 import loopy as lp
 from loopy.version import MOST_RECENT_LANGUAGE_VERSION
 
+from sumpy.build_profile import build_phase
 from sumpy.codegen import register_optimization_preambles
 from sumpy.tools import KernelCacheMixin, KernelComputation, is_obj_array_like
 
@@ -45,6 +46,9 @@ Particle-to-particle
 .. autoclass:: P2PMatrixGenerator
 .. autoclass:: P2PMatrixSubsetGenerator
 .. autoclass:: P2PFromCSR
+.. autoclass:: P2PFromCSRMatrixBlocks
+.. autoclass:: P2PFromCSRSparsityPattern
+.. autoclass:: P2PFromSymmetricBoxPairs
 
 """
 
@@ -107,6 +111,7 @@ class P2PBase(KernelCacheMixin, KernelComputation):
                 tuple(self.source_kernels),
                 self.device.hashable_model_and_version_identifier)
 
+    @build_phase("get_loopy_insns_and_result_names")
     def get_loopy_insns_and_result_names(self):
         from pymbolic import var
 
@@ -662,21 +667,63 @@ class P2PFromCSR(P2PBase):
 
         return loopy_knl
 
-    def get_optimized_kernel(self, max_nsources_in_one_box,
+    def _get_local_mem_size(self, max_nsources_in_one_box, strength_dtype):
+        dtype_size = np.dtype(strength_dtype).alignment
+        return max_nsources_in_one_box * \
+                (self.dim + self.strength_count) * dtype_size
+
+    def get_tuning_space(self, max_nsources_in_one_box,
             max_ntargets_in_one_box, source_dtype, strength_dtype):
         if not self.is_gpu:
+            return [{}] + [
+                {"box_chunk_size": box_chunk_size}
+                for box_chunk_size in [1, 2, 8, 16]]
+
+        total_local_mem = self._get_local_mem_size(
+                max_nsources_in_one_box, strength_dtype)
+        min_nprefetch = (total_local_mem - 1) // self.device.local_mem_size + 1
+
+        return [{}] + [
+                {"work_items_per_group": work_items_per_group,
+                 "nprefetch": nprefetch}
+                for work_items_per_group in [32, 64, 128, 256]
+                if work_items_per_group <= self.device.max_work_group_size
+                and work_items_per_group < 2 * max_ntargets_in_one_box
+                for nprefetch in sorted({
+                    min_nprefetch, 2 * min_nprefetch, 4 * min_nprefetch})
+                if nprefetch <= max_nsources_in_one_box]
+
+    def get_optimized_kernel(self, max_nsources_in_one_box,
+            max_ntargets_in_one_box, source_dtype, strength_dtype,
+            box_chunk_size=None, work_items_per_group=None, nprefetch=None):
+        """
+        :arg box_chunk_size: the number of target boxes handled by a
+            work group on the CPU.
+        :arg work_items_per_group: the number of work items, each of which
+            handles a target, in a work group on the GPU.
+        :arg nprefetch: the number of chunks in which the sources of a source
+            box are prefetched into local memory on the GPU.
+        """
+        if not self.is_gpu:
+            if box_chunk_size is None:
+                box_chunk_size = 4
+
             knl = self.get_kernel(max_nsources_in_one_box,
                     max_ntargets_in_one_box)
-            knl = lp.split_iname(knl, "itgt_box", 4, outer_tag="g.0")
+            knl = lp.split_iname(knl, "itgt_box", box_chunk_size,
+                    outer_tag="g.0")
             knl = self._allow_redundant_execution_of_knl_scaling(knl)
         else:
             dtype_size = np.dtype(strength_dtype).alignment
-            work_items_per_group = min(256, max_ntargets_in_one_box)
-            total_local_mem = max_nsources_in_one_box * \
-                    (self.dim + self.strength_count) * dtype_size
-            # multiplying by 2 here to make sure at least 2 work groups
-            # can be scheduled at the same time for latency hiding
-            nprefetch = (2 * total_local_mem - 1) // self.device.local_mem_size + 1
+            if work_items_per_group is None:
+                work_items_per_group = min(256, max_ntargets_in_one_box)
+            if nprefetch is None:
+                total_local_mem = self._get_local_mem_size(
+                        max_nsources_in_one_box, strength_dtype)
+                # multiplying by 2 here to make sure at least 2 work groups
+                # can be scheduled at the same time for latency hiding
+                nprefetch = (
+                    (2 * total_local_mem - 1) // self.device.local_mem_size + 1)
 
             knl = self.get_kernel(max_nsources_in_one_box,
                     max_ntargets_in_one_box,
@@ -762,7 +809,7 @@ class P2PFromCSR(P2PBase):
             source_dtype = None
             strength_dtype = None
 
-        knl = self.get_cached_kernel_executor(
+        knl = self.get_tuned_kernel_executor(queue, kwargs,
                 max_nsources_in_one_box=max_nsources_in_one_box,
                 max_ntargets_in_one_box=max_ntargets_in_one_box,
                 source_dtype=source_dtype,
@@ -773,4 +820,582 @@ class P2PFromCSR(P2PBase):
 
 # }}}
 
+
+# {{{ P2P from precomputed matrix blocks along CSR-like interaction list
+
+class P2PFromCSRMatrixBlocks(P2PBase):
+    """Applies precomputed P2P interaction matrix blocks along the same
+    CSR-like interaction lists as :class:`P2PFromCSR`.
+
+    The matrix blocks of the interactions of the targets of a target box with
+    the sources of a source box in its list are stored densely in row-major
+    order (targets by sources) in an array *blocks* of shape
+    ``(noutputs, nstrengths, nentries)``, for each of the target kernels and
+    each of the source strengths (see *strength_usage*). The block of entry
+    ``i`` of *source_box_lists* starts at ``block_starts[i]``. The blocks can
+    be computed with :class:`P2PMatrixSubsetGenerator`.
+
+    .. automethod:: __call__
+    """
+
+    @property
+    def default_name(self):
+        return "p2p_from_csr_matrix_blocks"
+
+    def get_kernel(self):
+        arguments = [
+                lp.GlobalArg("box_target_starts",
+                    None, shape=None),
+                lp.GlobalArg("box_target_counts_nonchild",
+                    None, shape=None),
+                lp.GlobalArg("box_source_starts",
+                    None, shape=None),
+                lp.GlobalArg("box_source_counts_nonchild",
+                    None, shape=None),
+                lp.GlobalArg("source_box_starts",
+                    None, shape=None),
+                lp.GlobalArg("source_box_lists",
+                    None, shape=None),
+                lp.GlobalArg("block_starts",
+                    None, shape=None),
+                lp.GlobalArg("blocks", None,
+                    shape="noutputs, nstrengths, nentries"),
+                lp.GlobalArg("strength", None,
+                    shape="nstrengths, nsources", dim_tags="sep,C"),
+                lp.GlobalArg("result", None,
+                    shape="noutputs, ntargets", dim_tags="sep,C"),
+                "..."
+            ]
+
+        domains = [
+            "{[itgt_box]: 0 <= itgt_box < ntgt_boxes}",
+            "{[itgt]: itgt_start <= itgt < itgt_end}",
+            "{[isrc_box]: isrc_box_start <= isrc_box < isrc_box_end}",
+            "{[isrc]: isrc_start <= isrc < isrc_end}",
+        ]
+
+        # The bounds of isrc_box are computed in the itgt loop, so that the
+        # domains are nested in a single chain. row_start is such that the
+        # entry of (itgt, isrc) in the block is at row_start + isrc.
+        instructions = (["""
+            for itgt_box
+            <> tgt_ibox = target_boxes[itgt_box]
+            <> itgt_start = box_target_starts[tgt_ibox]
+            <> itgt_end = itgt_start + box_target_counts_nonchild[tgt_ibox]
+
+            for itgt
+              <> isrc_box_start = source_box_starts[itgt_box]
+              <> isrc_box_end = source_box_starts[itgt_box+1]
+            """]
+            + [f"""
+              <> acc_{iknl} = 0 {{id=init_acc_{iknl}}}
+            """ for iknl in range(len(self.target_kernels))]
+            + ["""
+              for isrc_box
+                <> src_ibox = source_box_lists[isrc_box]
+                <> isrc_start = box_source_starts[src_ibox]
+                <> nsources_in_box = box_source_counts_nonchild[src_ibox]
+                <> isrc_end = isrc_start + nsources_in_box
+                <> row_start = block_starts[isrc_box] \
+                    + (itgt - itgt_start) * nsources_in_box - isrc_start
+                for isrc
+            """]
+            + [f"""
+                  acc_{iknl} = acc_{iknl} + {" + ".join(
+                      f"blocks[{iknl}, {istrength}, row_start + isrc]"
+                      f" * strength[{istrength}, isrc]"
+                      for istrength in range(self.strength_count))} \
+                          {{id=update_acc_{iknl}, dep=init_acc_{iknl}}}
+            """ for iknl in range(len(self.target_kernels))]
+            + ["""
+                end
+              end
+            """]
+            + [f"""
+              result[{iknl}, itgt] = acc_{iknl} \
+                  {{id_prefix=write_csr, dep=update_acc_{iknl}}}
+            """ for iknl in range(len(self.target_kernels))]
+            + ["""
+            end
+            end
+            """])
+
+        loopy_knl = lp.make_kernel(
+            domains,
+            instructions,
+            arguments,
+            assumptions="ntgt_boxes>=1",
+            name=self.name,
+            silenced_warnings=["write_race(write_csr*)"],
+            fixed_parameters={
+                "nstrengths": self.strength_count,
+                "noutputs": len(self.target_kernels)},
+            lang_version=MOST_RECENT_LANGUAGE_VERSION)
+
+        return lp.add_dtypes(loopy_knl, {
+            "nsources": np.int32, "ntargets": np.int32, "nentries": np.int64})
+
+    def get_optimized_kernel(self, box_chunk_size=None):
+        """
+        :arg box_chunk_size: the number of target boxes handled by a
+            work group.
+        """
+        if box_chunk_size is None:
+            box_chunk_size = 4
+
+        knl = self.get_kernel()
+        knl = lp.split_iname(knl, "itgt_box", box_chunk_size, outer_tag="g.0")
+        knl = lp.set_options(knl,
+                enforce_variable_access_ordered="no_check")
+
+        return register_optimization_preambles(knl, self.device)
+
+    def __call__(self, queue, **kwargs):
+        """Apply the matrix blocks to the source strengths.
+
+        :arg blocks: the matrix blocks, see above.
+        :arg block_starts: the start of the block of each entry of
+            *source_box_lists* in the last axis of *blocks*.
+
+        The other arguments are those of :class:`P2PFromCSR`, except for the
+        positions of the sources and targets and the arguments of the
+        kernels.
+        """
+        knl = self.get_cached_kernel_executor()
+
+        return knl(queue, nentries=kwargs["blocks"].shape[-1], **kwargs)
+
+# }}}
+
+# {{{ sparsity pattern of P2P interactions along CSR-like interaction list
+
+class P2PFromCSRSparsityPattern(P2PBase):
+    """Computes the sparsity pattern of the P2P interactions along the same
+    CSR-like interaction lists as :class:`P2PFromCSR`, optionally restricted
+    to the pairs of targets and sources at most a given distance apart.
+
+    The pattern is stored in compressed sparse row format, with the rows in a
+    target order given by *target_user_ids* and the column indices in a
+    source order given by *source_user_ids* (e.g. the user order of the
+    particles of a tree), and built in two passes over the interactions. The
+    first one (*count_only*) computes the number of nonzeros in each row, from
+    which the row starts are obtained by a prefix sum. The second one then
+    writes, for each nonzero, its column index and the (tree order) indices of
+    its target and source. Within a row, the nonzeros are ordered by the
+    source boxes in the list of the target box and by the sources in each
+    box, so that the column indices are not sorted in general. The values of
+    the entries can be computed with :class:`P2PMatrixSubsetGenerator`.
+
+    .. automethod:: __call__
+    """
+
+    @property
+    def default_name(self):
+        return "p2p_from_csr_sparsity_pattern"
+
+    def get_kernel(self, count_only):
+        arguments = [
+                lp.GlobalArg("sources", None,
+                    shape=(self.dim, "nsources")),
+                lp.GlobalArg("targets", None,
+                    shape=(self.dim, "ntargets")),
+                lp.ValueArg("nsources", np.int32),
+                lp.ValueArg("ntargets", np.int32),
+                lp.GlobalArg("box_target_starts",
+                    None, shape=None),
+                lp.GlobalArg("box_target_counts_nonchild",
+                    None, shape=None),
+                lp.GlobalArg("box_source_starts",
+                    None, shape=None),
+                lp.GlobalArg("box_source_counts_nonchild",
+                    None, shape=None),
+                lp.GlobalArg("source_box_starts",
+                    None, shape=None),
+                lp.GlobalArg("source_box_lists",
+                    None, shape=None),
+                lp.GlobalArg("target_user_ids",
+                    None, shape="ntargets"),
+                lp.ValueArg("max_distance_squared", None),
+            ]
+
+        if count_only:
+            arguments += [
+                lp.GlobalArg("row_nnz", np.int64, shape="ntargets"),
+                ]
+        else:
+            arguments += [
+                lp.GlobalArg("source_user_ids", None, shape="nsources"),
+                lp.GlobalArg("indptr", np.int64, shape="ntargets + 1"),
+                lp.GlobalArg("indices", None, shape="nnz"),
+                lp.GlobalArg("tgtindices", None, shape="nnz"),
+                lp.GlobalArg("srcindices", None, shape="nnz"),
+                lp.ValueArg("nnz", np.int64),
+                ]
+
+        arguments.append("...")
+
+        domains = [
+            "{[itgt_box]: 0 <= itgt_box < ntgt_boxes}",
+            "{[itgt]: itgt_start <= itgt < itgt_end}",
+            "{[isrc_box]: isrc_box_start <= isrc_box < isrc_box_end}",
+            "{[isrc]: isrc_start <= isrc < isrc_end}",
+            "{[idim]: 0 <= idim < dim}",
+        ]
+
+        if count_only:
+            init_insn = "<> nnz_in_row = 0 {id=init_row}"
+            update_insns = """
+                  nnz_in_row = nnz_in_row \
+                      + if(dist_squared <= max_distance_squared, 1, 0) \
+                      {id=update_row, dep=init_row}
+            """
+            finish_insn = """
+              row_nnz[irow] = nnz_in_row {id=write_row_nnz, dep=update_row}
+            """
+        else:
+            init_insn = "<> ientry = indptr[irow] {id=init_row}"
+            update_insns = """
+                  if dist_squared <= max_distance_squared
+                    indices[ientry] = source_user_ids[isrc] \
+                        {id=write_index, dep=init_row}
+                    tgtindices[ientry] = itgt {id=write_tgt, dep=init_row}
+                    srcindices[ientry] = isrc {id=write_src, dep=init_row}
+                    ientry = ientry + 1 \
+                        {id=update_row, dep=write_index:write_tgt:write_src}
+                  end
+            """
+            finish_insn = ""
+
+        # As in P2PFromCSRMatrixBlocks, the bounds of isrc_box are computed in
+        # the itgt loop, so that the domains are nested in a single chain.
+        instructions = [f"""
+            for itgt_box
+            <> tgt_ibox = target_boxes[itgt_box]
+            <> itgt_start = box_target_starts[tgt_ibox]
+            <> itgt_end = itgt_start + box_target_counts_nonchild[tgt_ibox]
+
+            for itgt
+              <> isrc_box_start = source_box_starts[itgt_box]
+              <> isrc_box_end = source_box_starts[itgt_box+1]
+              <> irow = target_user_ids[itgt]
+              {init_insn}
+
+              for isrc_box
+                <> src_ibox = source_box_lists[isrc_box]
+                <> isrc_start = box_source_starts[src_ibox]
+                <> isrc_end = isrc_start + box_source_counts_nonchild[src_ibox]
+                for isrc
+                  <> dist_squared = sum(idim, \
+                      (targets[idim, itgt] - sources[idim, isrc])**2)
+                  {update_insns}
+                end
+              end
+              {finish_insn}
+            end
+            end
+            """]
+
+        loopy_knl = lp.make_kernel(
+            domains,
+            instructions,
+            arguments,
+            assumptions="ntgt_boxes>=1",
+            name=self.name,
+            silenced_warnings=["write_race(write_*)"],
+            fixed_parameters={"dim": self.dim},
+            lang_version=MOST_RECENT_LANGUAGE_VERSION)
+
+        return lp.tag_inames(loopy_knl, "idim*:unr")
+
+    def get_optimized_kernel(self, count_only,
+            targets_is_obj_array, sources_is_obj_array, box_chunk_size=None):
+        """
+        :arg box_chunk_size: the number of target boxes handled by a
+            work group.
+        """
+        if box_chunk_size is None:
+            box_chunk_size = 4
+
+        knl = self.get_kernel(count_only)
+
+        if sources_is_obj_array:
+            knl = lp.tag_array_axes(knl, "sources", "sep,C")
+        if targets_is_obj_array:
+            knl = lp.tag_array_axes(knl, "targets", "sep,C")
+
+        knl = lp.split_iname(knl, "itgt_box", box_chunk_size, outer_tag="g.0")
+        knl = lp.set_options(knl,
+                enforce_variable_access_ordered="no_check")
+
+        return register_optimization_preambles(knl, self.device)
+
+    def __call__(self, queue, targets, sources, max_distance=None, **kwargs):
+        """Compute the sparsity pattern.
+
+        :arg target_user_ids: the row of each target.
+        :arg source_user_ids: the column index of each source.
+        :arg max_distance: if not *None*, only the pairs of targets and
+            sources at most this distance apart are included.
+
+        The other arguments are the box and list arguments of
+        :class:`P2PFromCSR`.
+
+        :returns: a tuple ``(indptr, indices, tgtindices, srcindices)`` of
+            device arrays, where *indptr* and *indices* are the row starts and
+            column indices of the pattern, and *tgtindices* and *srcindices*
+            are the indices into *targets* and *sources* of the nonzeros, as
+            expected by :class:`P2PMatrixSubsetGenerator`.
+        """
+        import pyopencl.array as cl_array
+
+        source_user_ids = kwargs.pop("source_user_ids")
+        target_user_ids = kwargs["target_user_ids"]
+        ntargets = len(target_user_ids)
+
+        if max_distance is None:
+            max_distance_squared = np.inf
+        else:
+            max_distance_squared = max_distance**2
+
+        targets_is_obj_array = is_obj_array_like(targets)
+        sources_is_obj_array = is_obj_array_like(sources)
+        coord_dtype = (targets[0] if targets_is_obj_array else targets).dtype
+        kwargs.update(
+                targets=targets,
+                sources=sources,
+                max_distance_squared=coord_dtype.type(max_distance_squared))
+
+        knl = self.get_cached_kernel_executor(count_only=True,
+                targets_is_obj_array=targets_is_obj_array,
+                sources_is_obj_array=sources_is_obj_array)
+        row_nnz = cl_array.empty(queue, ntargets, np.int64)
+        knl(queue, row_nnz=row_nnz, **kwargs)
+
+        indptr = cl_array.concatenate((
+            cl_array.zeros(queue, 1, np.int64),
+            cl_array.cumsum(row_nnz, queue=queue)))
+        nnz = int(indptr[-1].get(queue))
+
+        id_dtype = source_user_ids.dtype
+        indices = cl_array.empty(queue, nnz, id_dtype)
+        tgtindices = cl_array.empty(queue, nnz, id_dtype)
+        srcindices = cl_array.empty(queue, nnz, id_dtype)
+
+        if nnz:
+            knl = self.get_cached_kernel_executor(count_only=False,
+                    targets_is_obj_array=targets_is_obj_array,
+                    sources_is_obj_array=sources_is_obj_array)
+            knl(queue,
+                source_user_ids=source_user_ids,
+                indptr=indptr,
+                indices=indices,
+                tgtindices=tgtindices,
+                srcindices=srcindices,
+                nnz=nnz,
+                **kwargs)
+
+        return indptr, indices, tgtindices, srcindices
+
+# }}}
+
+# {{{ symmetric P2P from box pairs
+
+class P2PFromSymmetricBoxPairs(P2PBase):
+    """Evaluates the P2P interactions between pairs of boxes of a tree whose
+    sources are also its targets (in the same order) for a kernel that is
+    symmetric, i.e. whose interaction of a target with a source is that of
+    the source, taken as a target, with the target, taken as a source.
+
+    The interaction of each pair of particles is evaluated once and added to
+    the potentials of both of them, which saves part of the cost of
+    evaluating a pair of distinct boxes with :class:`P2PFromCSR` from both
+    sides. Since the updates of the sources are scattered, the savings are
+    modest (about a quarter of the time for list 1 of a 3D Laplace FMM).
+    The pairs of boxes are given by the arrays *pair_boxes_a* and
+    *pair_boxes_b*. A pair of a box with itself evaluates the interactions of
+    the distinct particles in the box. The self interaction of a particle is
+    not included.
+
+    The range ``pair_start <= ipair < pair_end`` of the pairs is evaluated in
+    parallel, with a work item for each pair that adds the interactions to
+    *result*. It is therefore up to the caller to ensure that no box occurs
+    twice in such a range, e.g. by grouping the pairs into ranges of pairs of
+    disjoint boxes and evaluating one range after the other.
+
+    Only a single target kernel and a single source kernel, which must be the
+    same and one of :class:`~sumpy.kernel.LaplaceKernel`,
+    :class:`~sumpy.kernel.BiharmonicKernel`,
+    :class:`~sumpy.kernel.HelmholtzKernel` or
+    :class:`~sumpy.kernel.YukawaKernel` (without derivatives), are supported.
+    Only CPU devices are supported, since a work item for each pair of boxes
+    does not expose enough parallelism for a GPU.
+
+    .. automethod:: __call__
+    """
+
+    def __init__(self, ctx, target_kernels, exclude_self, strength_usage=None,
+            value_dtypes=None, name=None, device=None, source_kernels=None):
+        super().__init__(ctx, target_kernels, exclude_self,
+                strength_usage=strength_usage, value_dtypes=value_dtypes,
+                name=name, device=device, source_kernels=source_kernels)
+
+        from sumpy.kernel import (
+            BiharmonicKernel,
+            HelmholtzKernel,
+            LaplaceKernel,
+            YukawaKernel,
+        )
+        if (len(self.target_kernels) != 1
+                or tuple(self.source_kernels) != tuple(self.target_kernels)
+                or not isinstance(self.target_kernels[0], (
+                    LaplaceKernel, BiharmonicKernel,
+                    HelmholtzKernel, YukawaKernel))):
+            raise ValueError(
+                    "symmetric P2P needs a single symmetric kernel: "
+                    f"got target kernels {self.target_kernels} and source "
+                    f"kernels {self.source_kernels}")
+
+        if self.is_gpu:
+            raise ValueError(
+                    "symmetric P2P is only supported on CPU devices: "
+                    f"got '{self.device.name}'")
+
+    @property
+    def default_name(self):
+        return "p2p_from_symmetric_box_pairs"
+
+    def get_strength_or_not(self, isrc, kernel_idx):
+        return 1
+
+    def get_kernel(self):
+        # The self interactions are excluded by the bounds of isrc below,
+        # rather than by the is_self flag of P2PBase.
+        assert not self.exclude_self
+
+        from sumpy.tools import gather_loopy_source_arguments
+
+        loopy_insns, _result_names = self.get_loopy_insns_and_result_names()
+        arguments = [
+                lp.GlobalArg("sources", None,
+                    shape=(self.dim, "nsources")),
+                lp.ValueArg("nsources", np.int32),
+                *gather_loopy_source_arguments(self.source_kernels),
+                lp.GlobalArg("box_source_starts",
+                    None, shape=None),
+                lp.GlobalArg("box_source_counts_nonchild",
+                    None, shape=None),
+                lp.GlobalArg("pair_boxes_a",
+                    None, shape=None),
+                lp.GlobalArg("pair_boxes_b",
+                    None, shape=None),
+                lp.ValueArg("pair_start", np.int32),
+                lp.ValueArg("pair_end", np.int32),
+                lp.GlobalArg("strength", None,
+                    shape="nstrengths, nsources", dim_tags="sep,C"),
+                lp.GlobalArg("result", None,
+                    shape="noutputs, nsources", dim_tags="sep,C"),
+                "..."
+            ]
+
+        domains = [
+            "{[ipair]: pair_start <= ipair < pair_end}",
+            "{[itgt]: itgt_start <= itgt < itgt_end}",
+            "{[isrc]: isrc_start <= isrc < isrc_end}",
+            "{[idim]: 0 <= idim < dim}",
+        ]
+
+        # The targets are the sources of box a. In a pair of a box with
+        # itself, each pair of particles is visited once by only looping over
+        # the sources after the target.
+        instructions = (self.get_kernel_scaling_assignments()
+            + ["""
+            for ipair
+            <> box_a = pair_boxes_a[ipair]
+            <> box_b = pair_boxes_b[ipair]
+            <> itgt_start = box_source_starts[box_a]
+            <> itgt_end = itgt_start + box_source_counts_nonchild[box_a]
+
+            for itgt
+              <> box_b_start = box_source_starts[box_b]
+              <> isrc_start = if(box_a == box_b, itgt + 1, box_b_start)
+              <> isrc_end = box_b_start + box_source_counts_nonchild[box_b]
+              <> tgt_strength = strength[0, itgt]
+              <> acc = 0 {id=init_acc}
+
+              for isrc
+                <> d[idim] = sources[idim, itgt] - sources[idim, isrc]
+            """]
+            + loopy_insns
+            + ["""
+                <> interaction = knl_0_scaling * pair_result_0
+                acc = acc + interaction * strength[0, isrc] \
+                    {id=update_acc, dep=init_acc}
+                result[0, isrc] = result[0, isrc] + interaction * tgt_strength \
+                    {id=write_src, nosync=write_tgt}
+              end
+
+              result[0, itgt] = result[0, itgt] + acc \
+                  {id=write_tgt, dep=update_acc:write_src, nosync=write_src}
+            end
+            end
+            """])
+
+        loopy_knl = lp.make_kernel(
+            domains,
+            instructions,
+            arguments,
+            name=self.name,
+            silenced_warnings=["write_race(write_*)"],
+            fixed_parameters={
+                "dim": self.dim,
+                "nstrengths": self.strength_count,
+                "noutputs": len(self.target_kernels)},
+            lang_version=MOST_RECENT_LANGUAGE_VERSION)
+
+        loopy_knl = lp.tag_inames(loopy_knl, "idim*:unr")
+
+        for knl in self.target_kernels + self.source_kernels:
+            loopy_knl = knl.prepare_loopy_kernel(loopy_knl)
+
+        return loopy_knl
+
+    def get_optimized_kernel(self, sources_is_obj_array, pair_chunk_size=None):
+        """
+        :arg pair_chunk_size: the number of pairs of boxes handled by a
+            work group.
+        """
+        if pair_chunk_size is None:
+            pair_chunk_size = 4
+
+        knl = self.get_kernel()
+
+        if sources_is_obj_array:
+            knl = lp.tag_array_axes(knl, "sources", "sep,C")
+
+        knl = lp.split_iname(knl, "ipair", pair_chunk_size, outer_tag="g.0")
+        knl = self._allow_redundant_execution_of_knl_scaling(knl)
+        knl = lp.set_options(knl,
+                enforce_variable_access_ordered="no_check")
+
+        return register_optimization_preambles(knl, self.device)
+
+    def __call__(self, queue, sources, **kwargs):
+        """Add the interactions of the pairs of boxes ``pair_start <= ipair <
+        pair_end`` to *result*.
+
+        :arg sources: the positions of the particles.
+        :arg strength: the strengths of the particles.
+        :arg result: the potentials at the particles.
+
+        The other arguments are *pair_boxes_a*, *pair_boxes_b*, *pair_start*,
+        *pair_end* (see above), *box_source_starts* and
+        *box_source_counts_nonchild*, and the arguments of the kernel.
+        """
+        knl = self.get_cached_kernel_executor(
+                sources_is_obj_array=is_obj_array_like(sources))
+
+        return knl(queue, sources=sources, **kwargs)
+
+# }}}
+
 # vim: foldmethod=marker
@@ -0,0 +1,729 @@
+from __future__ import annotations
+
+
+__copyright__ = "Copyright (C) 2024 University of Illinois Board of Trustees"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import logging
+import time
+from dataclasses import asdict, dataclass, field
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+
+
+if TYPE_CHECKING:
+    from collections.abc import Hashable, Sequence
+
+    import pyopencl as cl
+
+    from sumpy.expansion import ExpansionBase
+    from sumpy.fmm import SumpyTreeIndependentDataForWrangler
+    from sumpy.kernel import Kernel
+    from sumpy.tools import KernelCacheMixin
+
+
+logger = logging.getLogger(__name__)
+
+
+__doc__ = """
+Ahead-of-time Kernel Generation
+-------------------------------
+
+Generating the :mod:`loopy` kernels for an FMM or a layer potential can take
+minutes on a fresh machine. The functions in this module drive
+:meth:`~sumpy.tools.KernelCacheMixin.get_cached_kernel_executor` for all the
+kernels that a given configuration will need, so that :data:`sumpy.code_cache`
+is populated before the actual computation starts.
+
+The same functionality is available from the command line through
+``python -m sumpy.prewarm``, see ``python -m sumpy.prewarm --help``.
+
+.. autoclass:: PrewarmRecord
+.. autoclass:: PrewarmReport
+
+.. autofunction:: prewarm_fmm
+.. autofunction:: prewarm_fmm_levels
+.. autofunction:: prewarm_layer_potential
+"""
+
+
+# {{{ report
+
+@dataclass(frozen=True)
+class PrewarmRecord:
+    """
+    .. attribute:: name
+
+        Name of the kernel, e.g. ``"m2l"``.
+
+    .. attribute:: class_name
+
+        Name of the :class:`~sumpy.tools.KernelCacheMixin` subclass that
+        generated the kernel.
+
+    .. attribute:: order
+
+        Order of the (target) expansion, or *None* for kernels that do not
+        involve expansions.
+
+    .. attribute:: kwargs
+
+        A :class:`dict` of the arguments passed to
+        :meth:`~sumpy.tools.KernelCacheMixin.get_cached_kernel_executor`,
+        converted to strings.
+
+    .. attribute:: cache_hit
+
+        *True* if the kernel was already in :data:`sumpy.code_cache`, *None* if
+        caching is disabled.
+
+    .. attribute:: elapsed
+
+        Wall time (in seconds) taken to obtain the kernel.
+    """
+
+    name: str
+    class_name: str
+    order: int | None
+    kwargs: dict[str, str]
+    cache_hit: bool | None
+    elapsed: float
+
+
+@dataclass
+class PrewarmReport:
+    """A collection of :class:`PrewarmRecord`\\ s.
+
+    .. attribute:: records
+
+    .. autoattribute:: total_elapsed
+    .. autoattribute:: ngenerated
+
+    .. automethod:: warm
+    .. automethod:: to_json
+    """
+
+    records: list[PrewarmRecord] = field(default_factory=list)
+
+    @property
+    def total_elapsed(self) -> float:
+        """Total wall time (in seconds) spent in all recorded kernels."""
+        return sum(rec.elapsed for rec in self.records)
+
+    @property
+    def ngenerated(self) -> int:
+        """Number of kernels that were not found in the cache."""
+        return sum(1 for rec in self.records if not rec.cache_hit)
+
+    def warm(self,
+             knl: KernelCacheMixin,
+             order: int | None = None,
+             **kwargs: Any) -> PrewarmRecord:
+        """Obtain the executor for *knl* with the arguments *kwargs* and
+        record how long it took.
+        """
+        cache_key = knl.get_code_cache_key(**kwargs)
+        if cache_key is None:
+            cache_hit = None
+        else:
+            from sumpy import code_cache
+            cache_hit = cache_key in code_cache
+
+        logger.info("prewarm: %s (order %s): start", knl.name, order)
+        t_start = time.monotonic()
+        knl.get_cached_kernel_executor(**kwargs)
+        elapsed = time.monotonic() - t_start
+        logger.info("prewarm: %s (order %s): done in %.2fs [cache hit: %s]",
+                    knl.name, order, elapsed, cache_hit)
+
+        record = PrewarmRecord(
+            name=knl.name,
+            class_name=type(knl).__name__,
+            order=order,
+            kwargs={k: str(v) for k, v in sorted(kwargs.items())},
+            cache_hit=cache_hit,
+            elapsed=elapsed)
+        self.records.append(record)
+
+        return record
+
+    def to_json(self) -> str:
+        import json
+        return json.dumps({
+            "total_elapsed": self.total_elapsed,
+            "ngenerated": self.ngenerated,
+            "records": [asdict(rec) for rec in self.records],
+            }, indent=2)
+
+    def __str__(self) -> str:
+        name_width = max((len(rec.name) for rec in self.records), default=6)
+        class_width = max(
+            (len(rec.class_name) for rec in self.records), default=5)
+
+        lines = [f"{'kernel':<{name_width}} {'class':<{class_width}} "
+                 f"{'order':>5} {'cached':>6} {'time [s]':>9}"]
+        for rec in self.records:
+            order = "-" if rec.order is None else str(rec.order)
+            cached = "-" if rec.cache_hit is None else ("yes" if rec.cache_hit
+                                                        else "no")
+            lines.append(f"{rec.name:<{name_width}} "
+                         f"{rec.class_name:<{class_width}} "
+                         f"{order:>5} {cached:>6} {rec.elapsed:>9.2f}")
+
+        lines.append(f"{len(self.records)} kernels ({self.ngenerated} generated) "
+                     f"in {self.total_elapsed:.2f}s")
+
+        return "\n".join(lines)
+
+# }}}
+
+
+# {{{ fmm
+
+@dataclass(frozen=True)
+class _KernelSpec:
+    """A picklable description of a kernel of a
+    :class:`~sumpy.fmm.SumpyTreeIndependentDataForWrangler`, so that it can
+    be generated in a different process.
+    """
+
+    method: str
+    args: tuple[Any, ...]
+    order: int | None
+    kwargs: tuple[tuple[str, Any], ...] = ()
+
+    def warm(self,
+             tree_indep: SumpyTreeIndependentDataForWrangler,
+             report: PrewarmReport) -> PrewarmRecord:
+        knl = getattr(tree_indep, self.method)(*self.args)
+        return report.warm(knl, self.order, **dict(self.kwargs))
+
+
+def _get_fmm_kernel_specs(
+        tree_indep: SumpyTreeIndependentDataForWrangler,
+        dtype: np.dtype[Any],
+        expansion_dtype: np.dtype[Any],
+        orders: Sequence[int],
+        m2m_orders: Sequence[tuple[int, int]],
+        l2l_orders: Sequence[tuple[int, int]],
+        box_sizes: Sequence[tuple[int, int]],
+        use_translation_classes: bool | None) -> list[_KernelSpec]:
+    from sumpy.tools import to_complex_dtype
+
+    m2l_translation = tree_indep.m2l_translation
+
+    if use_translation_classes is None:
+        use_translation_classes = \
+            tree_indep.get_base_kernel().is_translation_invariant
+
+    if m2l_translation.use_fft:
+        preprocessed_mpole_dtype = np.dtype(to_complex_dtype(expansion_dtype))
+    else:
+        preprocessed_mpole_dtype = expansion_dtype
+
+    # NOTE: these match the arguments that SumpyExpansionWrangler passes
+    # to the kernels: the tree sources are object arrays and the box centers
+    # are stored as a single array.
+    p2e_kwargs = (("centers_is_obj_array", False), ("sources_is_obj_array", True))
+
+    specs = []
+    for order in orders:
+        specs.extend([
+            _KernelSpec("p2m", (order,), order, p2e_kwargs),
+            _KernelSpec("p2l", (order,), order, p2e_kwargs),
+            ])
+
+        if use_translation_classes:
+            specs.append(_KernelSpec(
+                "m2l_translation_class_dependent_data_kernel", (order, order),
+                order, (("result_dtype", preprocessed_mpole_dtype),)))
+
+            if m2l_translation.use_preprocessing:
+                specs.extend([
+                    _KernelSpec(
+                        "m2l_preprocess_mpole_kernel", (order, order),
+                        order, (("result_dtype", preprocessed_mpole_dtype),)),
+                    _KernelSpec(
+                        "m2l_postprocess_local_kernel", (order, order),
+                        order, (("result_dtype", expansion_dtype),)),
+                    ])
+
+            specs.append(_KernelSpec(
+                "m2l", (order, order, True),
+                order, (("result_dtype", preprocessed_mpole_dtype),)))
+        else:
+            specs.append(_KernelSpec("m2l", (order, order, False), order))
+
+        specs.extend([
+            _KernelSpec("m2p", (order,), order),
+            _KernelSpec("l2p", (order,), order),
+            ])
+
+    specs.extend(
+        _KernelSpec("m2m", (src_order, tgt_order), tgt_order)
+        for src_order, tgt_order in m2m_orders)
+    specs.extend(
+        _KernelSpec("l2l", (src_order, tgt_order), tgt_order)
+        for src_order, tgt_order in l2l_orders)
+
+    if box_sizes:
+        p2p = tree_indep.p2p()
+        if p2p.is_gpu:
+            real_dtype = np.dtype(dtype.type(0).real.dtype)
+            source_dtype, strength_dtype = real_dtype, dtype
+        else:
+            # see P2PFromCSR.__call__: the dtypes are not part of the
+            # cache key on the CPU
+            source_dtype = strength_dtype = None
+
+    for max_nsources_in_one_box, max_ntargets_in_one_box in box_sizes:
+        specs.append(_KernelSpec("p2p", (), None, (
+            ("max_nsources_in_one_box", max_nsources_in_one_box),
+            ("max_ntargets_in_one_box", max_ntargets_in_one_box),
+            ("source_dtype", source_dtype),
+            ("strength_dtype", strength_dtype),
+            )))
+
+    # remove duplicates, preserving the order
+    return list(dict.fromkeys(specs))
+
+
+# {{{ process pool
+
+_WORKER_TREE_INDEP: SumpyTreeIndependentDataForWrangler | None = None
+
+
+def _get_device_descriptor(device: cl.Device) -> tuple[str, Hashable]:
+    return (device.platform.name, device.hashable_model_and_version_identifier)
+
+
+def _init_worker(device_descriptor: tuple[str, Hashable],
+                 tree_indep_args: tuple[Any, ...]) -> None:
+    import pyopencl as cl
+
+    from sumpy.fmm import SumpyTreeIndependentDataForWrangler
+
+    platform_name, device_identifier = device_descriptor
+    for platform in cl.get_platforms():
+        if platform.name != platform_name:
+            continue
+
+        for device in platform.get_devices():
+            if device.hashable_model_and_version_identifier == device_identifier:
+                break
+        else:
+            continue
+
+        break
+    else:
+        raise RuntimeError(
+            f"device '{device_identifier}' on platform '{platform_name}' "
+            "not found in worker process")
+
+    global _WORKER_TREE_INDEP
+    _WORKER_TREE_INDEP = SumpyTreeIndependentDataForWrangler(
+        cl.Context([device]), *tree_indep_args)
+
+
+def _warm_in_worker(spec: _KernelSpec) -> PrewarmRecord:
+    assert _WORKER_TREE_INDEP is not None
+    return spec.warm(_WORKER_TREE_INDEP, PrewarmReport())
+
+
+def _get_tree_indep_args(
+        tree_indep: SumpyTreeIndependentDataForWrangler) -> tuple[Any, ...]:
+    return (
+        tree_indep.multipole_expansion_factory,
+        tree_indep.local_expansion_factory,
+        tree_indep.target_kernels,
+        tree_indep.exclude_self,
+        tree_indep.use_rscale,
+        tree_indep.strength_usage,
+        tree_indep.source_kernels)
+
+
+def _warm_specs(
+        tree_indep: SumpyTreeIndependentDataForWrangler,
+        specs: Sequence[_KernelSpec],
+        nprocs: int | None,
+        report: PrewarmReport) -> None:
+    import os
+
+    from sumpy import CACHING_ENABLED
+
+    if nprocs is None:
+        nprocs = os.cpu_count() or 1
+    nprocs = min(nprocs, len(specs))
+
+    if nprocs > 1 and not CACHING_ENABLED:
+        logger.info("prewarm: caching is disabled, generating kernels "
+                    "in the calling process")
+        nprocs = 1
+
+    if nprocs > 1:
+        import pickle
+
+        tree_indep_args = _get_tree_indep_args(tree_indep)
+        try:
+            pickle.dumps((tree_indep_args, specs))
+        except (pickle.PicklingError, AttributeError, TypeError) as exc:
+            from warnings import warn
+            warn("Cannot generate kernels in parallel, since the arguments "
+                 f"of the tree-independent data are not picklable ({exc}). "
+                 "Use module-level functions or 'functools.partial' for the "
+                 "expansion factories.",
+                 stacklevel=3)
+            nprocs = 1
+
+    if nprocs <= 1:
+        for spec in specs:
+            spec.warm(tree_indep, report)
+        return
+
+    import multiprocessing as mp
+    from concurrent.futures import ProcessPoolExecutor
+
+    # start the expensive (high order) kernels first for load balancing
+    sorted_specs = sorted(
+        specs, key=lambda spec: -1 if spec.order is None else spec.order,
+        reverse=True)
+
+    logger.info("prewarm: generating %d kernels in %d processes",
+                len(specs), nprocs)
+    t_start = time.monotonic()
+
+    # NOTE: OpenCL runtimes generally do not survive a fork, so the worker
+    # processes are spawned and create their own context.
+    with ProcessPoolExecutor(
+            max_workers=nprocs,
+            mp_context=mp.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(
+                _get_device_descriptor(tree_indep.cl_context.devices[0]),
+                tree_indep_args)) as executor:
+        records = dict(zip(
+            sorted_specs, executor.map(_warm_in_worker, sorted_specs),
+            strict=True))
+
+    logger.info("prewarm: generated %d kernels in %.2fs",
+                len(specs), time.monotonic() - t_start)
+
+    report.records.extend(records[spec] for spec in specs)
+
+# }}}
+
+
+def prewarm_fmm(
+        tree_indep: SumpyTreeIndependentDataForWrangler,
+        orders: Sequence[int],
+        dtype: Any,
+        *,
+        expansion_dtype: Any = None,
+        box_sizes: Sequence[tuple[int, int]] = (),
+        use_translation_classes: bool | None = None,
+        nprocs: int | None = 1,
+        report: PrewarmReport | None = None) -> PrewarmReport:
+    """Generate all kernels that a
+    :class:`~sumpy.fmm.SumpyExpansionWrangler` using *tree_indep* will need
+    when every level of the tree uses one of *orders*. Translations between
+    levels are only generated for equal source and target orders.
+
+    :arg dtype: the *dtype* that will be passed to
+        :class:`~sumpy.fmm.SumpyExpansionWrangler`.
+    :arg expansion_dtype: the *expansion_dtype* that will be passed to
+        :class:`~sumpy.fmm.SumpyExpansionWrangler`, *dtype* if not given.
+    :arg box_sizes: a sequence of tuples ``(max_nsources_in_one_box,
+        max_ntargets_in_one_box)``. The kernels for
+        :meth:`~sumpy.fmm.SumpyTreeIndependentDataForWrangler.p2p` are
+        specialized to these sizes, so they are only generated for the sizes
+        given here.
+    :arg use_translation_classes: whether the M2L should use translation
+        classes. By default, this is determined in the same way as in
+        :class:`~sumpy.fmm.SumpyExpansionWrangler`.
+    :arg nprocs: the number of processes used to generate the kernels, or
+        *None* to use all available processors. See
+        :func:`prewarm_fmm_levels` for details.
+    :arg report: if given, records are appended to this report.
+    """
+    if report is None:
+        report = PrewarmReport()
+
+    specs = _get_fmm_kernel_specs(
+        tree_indep, np.dtype(dtype),
+        np.dtype(dtype if expansion_dtype is None else expansion_dtype), orders,
+        m2m_orders=[(order, order) for order in orders],
+        l2l_orders=[(order, order) for order in orders],
+        box_sizes=box_sizes,
+        use_translation_classes=use_translation_classes)
+    _warm_specs(tree_indep, specs, nprocs, report)
+
+    return report
+
+
+def prewarm_fmm_levels(
+        tree_indep: SumpyTreeIndependentDataForWrangler,
+        level_orders: Sequence[int],
+        dtype: Any,
+        *,
+        expansion_dtype: Any = None,
+        box_sizes: Sequence[tuple[int, int]] = (),
+        use_translation_classes: bool | None = None,
+        nprocs: int | None = None,
+        report: PrewarmReport | None = None) -> PrewarmReport:
+    """Generate all kernels that a
+    :class:`~sumpy.fmm.SumpyExpansionWrangler` using *tree_indep* will need
+    for a tree where level *i* uses the order ``level_orders[i]``, including
+    the translations between levels of different orders. See
+    :func:`prewarm_fmm` for the remaining arguments.
+
+    With *nprocs* larger than one, the kernels are generated in a pool of
+    worker processes and stored in :data:`sumpy.code_cache`, from where they
+    are loaded when they are first used in this process. This requires the
+    arguments of *tree_indep* (e.g. the expansion factories) to be picklable
+    and caching to be enabled, otherwise the kernels are generated in the
+    calling process.
+    """
+    if report is None:
+        report = PrewarmReport()
+
+    from itertools import pairwise
+    pairs = list(pairwise(level_orders))
+
+    specs = _get_fmm_kernel_specs(
+        tree_indep, np.dtype(dtype),
+        np.dtype(dtype if expansion_dtype is None else expansion_dtype),
+        sorted(set(level_orders)),
+        # multipoles are translated from a level to its parent level
+        m2m_orders=[(child, parent) for parent, child in pairs],
+        # locals are translated from a level to its child level
+        l2l_orders=pairs,
+        box_sizes=box_sizes,
+        use_translation_classes=use_translation_classes)
+    _warm_specs(tree_indep, specs, nprocs, report)
+
+    return report
+
+# }}}
+
+
+# {{{ layer potential
+
+def prewarm_layer_potential(
+        ctx: cl.Context,
+        expansion: ExpansionBase,
+        source_kernels: Sequence[Kernel],
+        target_kernels: Sequence[Kernel],
+        *,
+        value_dtypes: Any = None,
+        is_obj_array: bool = False,
+        report: PrewarmReport | None = None) -> PrewarmReport:
+    """Generate the kernel for :class:`~sumpy.qbx.LayerPotential` with the
+    given arguments.
+
+    :arg is_obj_array: whether the targets, sources and centers will be
+        passed as object arrays (one array per axis).
+    :arg report: if given, records are appended to this report.
+    """
+    from sumpy.qbx import LayerPotential
+
+    if report is None:
+        report = PrewarmReport()
+
+    lpot = LayerPotential(ctx, expansion=expansion,
+                          source_kernels=source_kernels,
+                          target_kernels=target_kernels,
+                          value_dtypes=value_dtypes)
+    report.warm(lpot, expansion.order,
+                targets_is_obj_array=is_obj_array,
+                sources_is_obj_array=is_obj_array,
+                centers_is_obj_array=is_obj_array)
+
+    return report
+
+# }}}
+
+
+# {{{ command line interface
+
+def _make_kernel(name: str, dim: int) -> Kernel:
+    from sumpy.kernel import (
+        BiharmonicKernel,
+        HelmholtzKernel,
+        LaplaceKernel,
+        YukawaKernel,
+    )
+
+    kernel_classes = {
+        "laplace": LaplaceKernel,
+        "helmholtz": HelmholtzKernel,
+        "yukawa": YukawaKernel,
+        "biharmonic": BiharmonicKernel,
+    }
+
+    return kernel_classes[name](dim)
+
+
+def _make_target_kernels(name: str, knl: Kernel) -> list[Kernel]:
+    from sumpy.kernel import AxisTargetDerivative
+
+    if name == "potential":
+        return [knl]
+    elif name == "gradient":
+        return [AxisTargetDerivative(i, knl) for i in range(knl.dim)]
+    else:
+        raise ValueError(f"unknown target kernels: '{name}'")
+
+
+def _parse_order_range(text: str) -> list[int]:
+    if ":" in text:
+        start, stop = text.split(":")
+        return list(range(int(start), int(stop) + 1))
+    else:
+        return [int(text)]
+
+
+def _parse_box_size(text: str) -> tuple[int, int]:
+    if ":" in text:
+        nsources, ntargets = text.split(":")
+        return int(nsources), int(ntargets)
+    else:
+        return int(text), int(text)
+
+
+def main(argv: Sequence[str] | None = None) -> PrewarmReport:
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="python -m sumpy.prewarm",
+        description="Populate the sumpy kernel cache ahead of time. All "
+        "combinations of the given options are generated.")
+    parser.add_argument("--kernel", nargs="+", default=["laplace"],
+                        choices=["laplace", "helmholtz", "yukawa", "biharmonic"])
+    parser.add_argument("--dim", nargs="+", type=int, default=[3])
+    parser.add_argument("--fmm-order", nargs="+", default=[],
+                        type=_parse_order_range, metavar="ORDER[:ORDER]",
+                        help="FMM orders (inclusive ranges are allowed)")
+    parser.add_argument("--qbx-order", nargs="+", default=[],
+                        type=_parse_order_range, metavar="ORDER[:ORDER]",
+                        help="QBX orders (inclusive ranges are allowed)")
+    parser.add_argument("--m2l", nargs="+", default=["nonfft"],
+                        choices=["fft", "nonfft"])
+    parser.add_argument("--target-kernels", nargs="+", default=["potential"],
+                        choices=["potential", "gradient"])
+    parser.add_argument("--dtype", nargs="+", default=["float64"],
+                        choices=["float32", "float64"],
+                        help="real dtype, promoted to complex for "
+                        "complex-valued kernels")
+    parser.add_argument("--box-size", nargs="+", default=[],
+                        type=_parse_box_size, metavar="NSOURCES[:NTARGETS]",
+                        help="maximum number of particles in one box to "
+                        "generate the FMM P2P for")
+    parser.add_argument("--nprocs", type=int, default=1,
+                        help="number of processes to generate FMM kernels in "
+                        "(0 to use all processors)")
+    parser.add_argument("--cl-device", default=None, metavar="PLATFORM:DEVICE",
+                        help="OpenCL device, in the format of PYOPENCL_CTX")
+    parser.add_argument("--json", default=None, metavar="FILE",
+                        help="write the report as JSON to FILE")
+    args = parser.parse_args(argv)
+
+    from functools import partial
+
+    import pyopencl as cl
+
+    from sumpy.expansion import DefaultExpansionFactory
+    from sumpy.expansion.m2l import (
+        FFTM2LTranslationClassFactory,
+        NonFFTM2LTranslationClassFactory,
+    )
+    from sumpy.fmm import SumpyTreeIndependentDataForWrangler
+    from sumpy.tools import to_complex_dtype
+
+    if args.cl_device is None:
+        ctx = cl.create_some_context(interactive=False)
+    else:
+        ctx = cl.create_some_context(
+            interactive=False, answers=args.cl_device.split(":"))
+
+    fmm_orders = sorted({order for orders in args.fmm_order for order in orders})
+    qbx_orders = sorted({order for orders in args.qbx_order for order in orders})
+    expn_factory = DefaultExpansionFactory()
+
+    report = PrewarmReport()
+    for kernel_name in args.kernel:
+        for dim in args.dim:
+            knl = _make_kernel(kernel_name, dim)
+            local_expn_class = expn_factory.get_local_expansion_class(knl)
+            mpole_expn_class = expn_factory.get_multipole_expansion_class(knl)
+
+            for dtype_name in args.dtype:
+                dtype = np.dtype(dtype_name)
+                if knl.is_complex_valued:
+                    dtype = np.dtype(to_complex_dtype(dtype))
+
+                for tgt_name in args.target_kernels:
+                    target_kernels = _make_target_kernels(tgt_name, knl)
+
+                    for m2l_name in args.m2l if fmm_orders else []:
+                        if m2l_name == "fft":
+                            m2l_factory = FFTM2LTranslationClassFactory()
+                        else:
+                            m2l_factory = NonFFTM2LTranslationClassFactory()
+                        m2l_translation = m2l_factory.get_m2l_translation_class(
+                            knl, local_expn_class)()
+
+                        tree_indep = SumpyTreeIndependentDataForWrangler(
+                            ctx,
+                            partial(mpole_expn_class, knl),
+                            partial(local_expn_class, knl,
+                                    m2l_translation=m2l_translation),
+                            target_kernels)
+
+                        prewarm_fmm(tree_indep, fmm_orders, dtype,
+                                    box_sizes=args.box_size,
+                                    nprocs=args.nprocs or None,
+                                    report=report)
+
+                    for order in qbx_orders:
+                        prewarm_layer_potential(
+                            ctx, local_expn_class(knl, order),
+                            source_kernels=[knl],
+                            target_kernels=target_kernels,
+                            value_dtypes=dtype,
+                            report=report)
+
+    print(report)
+    if args.json is not None:
+        with open(args.json, "w") as outf:
+            outf.write(report.to_json())
+
+    return report
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
+
+# }}}
+
+# vim: foldmethod=marker
@@ -37,6 +37,7 @@ from pymbolic import parse, var
 from pytools import memoize_method
 
 import sumpy.symbolic as sym
+from sumpy.build_profile import build_phase
 from sumpy.tools import KernelCacheMixin, KernelComputation, is_obj_array_like
 
 
@@ -124,6 +125,7 @@ class LayerPotentialBase(KernelCacheMixin, KernelComputation):
         return sac.assign_unique(f"expn{expansion_nr}_result",
             self.expansion.evaluate(tgt_knl, assigned_coeffs, bvec, rscale))
 
+    @build_phase("get_loopy_insns_and_result_names")
     def get_loopy_insns_and_result_names(self):
         from sumpy.symbolic import make_sym_vector
         avec = make_sym_vector("a", self.dim)
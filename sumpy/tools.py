@@ -40,11 +40,13 @@ from typing import TYPE_CHECKING, Any
 import numpy as np
 
 import loopy as lp
+from loopy.target.pyopencl_execution import PyOpenCLExecutor
 from pymbolic.mapper import WalkMapper
 from pytools import memoize_method
 from pytools.tag import Tag, tag_dataclass
 
 import sumpy.symbolic as sym
+from sumpy.fmm_profile import _ACTIVE_PROFILES as _ACTIVE_FMM_PROFILES
 
 
 if TYPE_CHECKING:
@@ -89,6 +91,7 @@ Symbolic Helpers
 .. autoclass:: ScalingAssignmentTag
 .. autoclass:: KernelComputation
 .. autoclass:: KernelCacheMixin
+.. autoclass:: BinaryCachingExecutor
 
 .. autofunction:: reduced_row_echelon_form
 .. autofunction:: nullspace
@@ -464,47 +467,125 @@ class KernelCacheMixin(ABC):
     def get_optimized_kernel(self, **kwargs: Any) -> lp.TranslationUnit:
         ...
 
-    @memoize_method
-    def get_cached_kernel_executor(self, **kwargs) -> lp.ExecutorBase:
-        from sumpy import CACHING_ENABLED, NO_CACHE_KERNELS, OPT_ENABLED, code_cache
+    def get_code_cache_key(self, **kwargs: Any) -> tuple[Hashable, ...] | None:
+        """
+        :returns: the key under which the kernel for *kwargs* is stored in
+            :data:`sumpy.code_cache`, or *None* if caching is disabled for
+            this kernel. *kwargs* are the same as for
+            :meth:`get_cached_kernel_executor`.
+        """
+        from sumpy import CACHING_ENABLED, CSE_ENGINE, NO_CACHE_KERNELS, OPT_ENABLED
 
-        if CACHING_ENABLED and not (
+        if not CACHING_ENABLED or (
                 NO_CACHE_KERNELS and self.name in NO_CACHE_KERNELS):
-            import loopy.version
+            return None
 
-            from sumpy.version import KERNEL_VERSION
-            cache_key = (
-                    self.get_cache_key()
-                    + tuple(sorted(kwargs.items()))
-                    + (loopy.version.DATA_MODEL_VERSION,)
-                    + (KERNEL_VERSION,)
-                    + (OPT_ENABLED,))
+        import loopy.version
 
-            try:
-                result = code_cache[cache_key]
-                logger.debug("%s: kernel cache hit [key=%s]", self.name, cache_key)
-                return result.executor(self.context)
-            except KeyError:
-                pass
+        from sumpy.version import KERNEL_VERSION
+        return (
+                self.get_cache_key()
+                + tuple(sorted(kwargs.items()))
+                + (loopy.version.DATA_MODEL_VERSION,)
+                + (CSE_ENGINE,)
+                + (KERNEL_VERSION,)
+                + (OPT_ENABLED,))
 
-        logger.info("%s: kernel cache miss", self.name)
-        if CACHING_ENABLED and not (
-                NO_CACHE_KERNELS and self.name in NO_CACHE_KERNELS):
-            logger.info("%s: kernel cache miss [key=%s]",
-                self.name, cache_key)
+    def get_tuning_space(self, **kwargs: Any) -> Sequence[dict[str, Hashable]]:
+        """
+        :returns: candidate values of the tuning parameters that
+            :meth:`get_optimized_kernel` accepts in addition to *kwargs*, see
+            :mod:`sumpy.autotune`. The first candidate is the default, which
+            does not pass any tuning parameters.
+        """
+        return ({},)
+
+    def get_tuned_kernel_executor(self,
+                                  queue: cl.CommandQueue,
+                                  call_kwargs: dict[str, Any],
+                                  **kwargs: Any) -> lp.ExecutorBase:
+        """Like :meth:`get_cached_kernel_executor`, but with the tuning
+        parameters found by :func:`sumpy.autotune.find_best_parameters` if
+        auto-tuning is enabled.
+
+        :arg call_kwargs: the arguments that the executor will be called
+            with, used for benchmarking.
+        """
+        from sumpy import AUTOTUNE_ENABLED, OPT_ENABLED
 
-        from pytools import MinRecursionLimit
-        with MinRecursionLimit(3000):
-            if OPT_ENABLED:
-                knl = self.get_optimized_kernel(**kwargs)
-            else:
-                knl = self.get_kernel()
+        if AUTOTUNE_ENABLED and OPT_ENABLED:
+            from sumpy.autotune import find_best_parameters
+            kwargs = {
+                **kwargs,
+                **find_best_parameters(self, queue, call_kwargs, **kwargs)}
 
-        if CACHING_ENABLED and not (
-                NO_CACHE_KERNELS and self.name in NO_CACHE_KERNELS):
-            code_cache.store_if_not_present(cache_key, knl)
+        return self.get_cached_kernel_executor(**kwargs)
 
-        return knl.executor(self.context)
+    def get_cached_kernel_executor(self, **kwargs) -> lp.ExecutorBase:
+        executor = self._get_cached_kernel_executor(**kwargs)
+        if not _ACTIVE_FMM_PROFILES:
+            return executor
+
+        from sumpy.fmm_profile import wrap_executor
+        return wrap_executor(executor, type(self).__name__)
+
+    @memoize_method
+    def _get_cached_kernel_executor(self, **kwargs) -> lp.ExecutorBase:
+        from sumpy import OPT_ENABLED, code_cache
+        from sumpy.build_profile import build_phase, kernel_build
+
+        with kernel_build(self.name, type(self).__name__, "generate") as record:
+            cache_key = self.get_code_cache_key(**kwargs)
+            if cache_key is not None:
+                try:
+                    with build_phase("code_cache_lookup"):
+                        result = code_cache[cache_key]
+                except KeyError:
+                    pass
+                else:
+                    logger.debug("%s: kernel cache hit [key=%s]",
+                        self.name, cache_key)
+                    if record is not None:
+                        record.cache_hit = True
+
+                    with build_phase("executor"):
+                        return self._make_executor(result, cache_key)
+
+                if record is not None:
+                    record.cache_hit = False
+
+            logger.info("%s: kernel cache miss", self.name)
+            if cache_key is not None:
+                logger.info("%s: kernel cache miss [key=%s]",
+                    self.name, cache_key)
+
+            from pytools import MinRecursionLimit
+            with MinRecursionLimit(3000):
+                if OPT_ENABLED:
+                    with build_phase("get_optimized_kernel"):
+                        knl = self.get_optimized_kernel(**kwargs)
+                else:
+                    with build_phase("get_kernel"):
+                        knl = self.get_kernel()
+
+            if cache_key is not None:
+                with build_phase("code_cache_store"):
+                    code_cache.store_if_not_present(cache_key, knl)
+
+            with build_phase("executor"):
+                return self._make_executor(knl, cache_key)
+
+    def _make_executor(self,
+                       knl: lp.TranslationUnit,
+                       cache_key: tuple[Hashable, ...] | None) -> lp.ExecutorBase:
+        if (cache_key is None
+                or not isinstance(knl.target, lp.PyOpenCLTarget)
+                or not _supports_binary_caching()):
+            return knl.executor(self.context)
+
+        entrypoint, = knl.entrypoints
+        return BinaryCachingExecutor(self.context, knl, entrypoint, cache_key,
+                                     class_name=type(self).__name__)
 
     @staticmethod
     def _allow_redundant_execution_of_knl_scaling(knl):
@@ -516,6 +597,134 @@ class KernelCacheMixin(ABC):
 KernelCacheWrapper = KernelCacheMixin
 
 
+# The range of :mod:`loopy` versions (the lower bound inclusive, the upper
+# bound exclusive) for which BinaryCachingExecutor is used. It overrides
+# PyOpenCLExecutor.translation_unit_info and builds its private result type,
+# which may change with any loopy release.
+_BINARY_CACHING_LOOPY_VERSIONS = ((2024, 1), (2026, 0))
+
+
+def _supports_binary_caching() -> bool:
+    """Return *True* if the installed :mod:`loopy` is one that
+    :class:`BinaryCachingExecutor` was written for.
+    """
+    min_version, max_version = _BINARY_CACHING_LOOPY_VERSIONS
+    if not min_version <= lp.VERSION < max_version:
+        logger.debug("loopy %s is not supported by BinaryCachingExecutor",
+                     lp.VERSION)
+        return False
+
+    try:
+        from loopy.target.pyopencl_execution import _KernelInfo
+    except ImportError:
+        return False
+
+    from dataclasses import fields, is_dataclass
+    return (is_dataclass(_KernelInfo)
+            and {f.name for f in fields(_KernelInfo)} == {"cl_kernels", "invoker"}
+            and all(hasattr(PyOpenCLExecutor, name) for name in (
+                "get_typed_and_scheduled_translation_unit", "get_invoker")))
+
+
+class BinaryCachingExecutor(PyOpenCLExecutor):
+    """A :class:`loopy.target.pyopencl_execution.PyOpenCLExecutor` that
+    stores the compiled program binaries and the invoker in
+    :data:`sumpy.binary_cache`. On a cache hit, this skips scheduling, code
+    generation and compilation of the kernel, which would otherwise be
+    repeated in every process.
+
+    The cache is keyed on the :mod:`sumpy` code cache key of the kernel (see
+    :meth:`KernelCacheMixin.get_code_cache_key`), the argument types and the
+    :attr:`pyopencl.Device.hashable_model_and_version_identifier` of all the
+    devices in the context.
+
+    This relies on internals of :mod:`loopy`, so it is only used for the
+    versions of :mod:`loopy` it was tested with. With other versions, the
+    kernels are run by the executor of :mod:`loopy` and only the code cache
+    is used.
+    """
+
+    def __init__(self,
+                 context: cl.Context,
+                 t_unit: lp.TranslationUnit,
+                 entrypoint: str,
+                 cache_key: tuple[Hashable, ...],
+                 class_name: str | None = None) -> None:
+        """
+        :arg class_name: name of the class that generated *t_unit*, used
+            for profiling (see :mod:`sumpy.build_profile`).
+        """
+        super().__init__(context, t_unit, entrypoint)
+        self.cache_key = cache_key
+        self.class_name = class_name or type(self).__name__
+
+    @memoize_method
+    def translation_unit_info(self, arg_to_dtype=None):
+        import pyopencl as cl
+        from loopy.target.pyopencl_execution import _KernelInfo, _Kernels
+
+        from sumpy import binary_cache
+        from sumpy.build_profile import build_phase, kernel_build
+
+        options = self.t_unit[self.entrypoint].options
+        if options.write_code or options.edit_code:
+            return super().translation_unit_info(arg_to_dtype)
+
+        devices = self.context.devices
+        binary_cache_key = (
+            self.cache_key, self.entrypoint, arg_to_dtype,
+            tuple(dev.hashable_model_and_version_identifier for dev in devices))
+
+        with kernel_build(self.entrypoint, self.class_name, "compile") as record:
+            try:
+                with build_phase("binary_cache_lookup"):
+                    build_options, binaries, invoker = \
+                        binary_cache[binary_cache_key]
+            except KeyError:
+                logger.debug("%s: binary cache miss", self.entrypoint)
+                if record is not None:
+                    record.cache_hit = False
+
+                with build_phase("schedule"):
+                    t_unit = self.get_typed_and_scheduled_translation_unit(
+                        arg_to_dtype)
+
+                with build_phase("codegen"):
+                    from loopy.codegen import generate_code_v2
+                    codegen_result = generate_code_v2(t_unit)
+
+                build_options = t_unit[self.entrypoint].options.build_options
+                with build_phase("build"):
+                    cl_program = (
+                        cl.Program(self.context, codegen_result.device_code())
+                        .build(options=build_options))
+
+                with build_phase("invoker"):
+                    invoker = self.get_invoker(
+                        t_unit, self.entrypoint, codegen_result)
+
+                with build_phase("binary_cache_store"):
+                    binary_cache.store_if_not_present(binary_cache_key, (
+                        build_options,
+                        cl_program.get_info(cl.program_info.BINARIES),
+                        invoker))
+            else:
+                logger.debug("%s: binary cache hit", self.entrypoint)
+                if record is not None:
+                    record.cache_hit = True
+
+                with build_phase("build"):
+                    cl_program = (
+                        cl.Program(self.context, devices, binaries)
+                        .build(options=build_options))
+
+        cl_kernels = _Kernels()
+        for name in cl_program.kernel_names.split(";"):
+            setattr(cl_kernels, name, getattr(cl_program, name))
+
+        return _KernelInfo(cl_kernels=cl_kernels, invoker=invoker)
+
+
 def is_obj_array_like(ary):
     return (
             isinstance(ary, tuple | list)
@@ -524,10 +733,146 @@ def is_obj_array_like(ary):
 
 # {{{ matrices
 
+def _as_exact_rational(x):
+    """Return *x* as an :class:`int` or a :class:`fractions.Fraction` if it is
+    an exact rational number (a Python or :mod:`numpy` integer, a
+    :class:`~fractions.Fraction` or a symbolic rational) and *None* otherwise.
+    """
+    from fractions import Fraction
+
+    if isinstance(x, int | np.integer):
+        return int(x)
+    elif isinstance(x, Fraction):
+        return x
+    elif isinstance(x, sym.Basic) and x.is_Rational:
+        if x.is_Integer:
+            return int(x)
+        return Fraction(str(x))
+    else:
+        return None
+
+
+def _as_exact_rational_rows(mat):
+    """Return the rows of *mat* as sparse rows mapping column indices to
+    :class:`int` or :class:`~fractions.Fraction` instances, or *None* if not
+    all entries are exact rational numbers.
+    """
+    rows = []
+    for mat_row in mat:
+        row = {}
+        for j, entry in enumerate(mat_row):
+            # fast path for the common case of (mostly zero) integer entries
+            if type(entry) is int:
+                if entry:
+                    row[j] = entry
+                continue
+
+            value = _as_exact_rational(entry)
+            if value is None:
+                return None
+            if value:
+                row[j] = value
+
+        rows.append(row)
+
+    return rows
+
+
+def _reduced_row_echelon_form_fraction_free(rows, ncols):
+    """Calculates the reduced row echelon form of a matrix with exact rational
+    entries, given as a list of sparse rows mapping column indices to
+    :class:`int` or :class:`~fractions.Fraction` instances.
+
+    The rows are scaled to primitive integer vectors and eliminated without
+    fractions, removing the content of each updated row so that the size of
+    the integers stays bounded. Only rows with a nonzero entry in the pivot
+    column are updated, and the row with the fewest nonzero entries is chosen
+    as the pivot to limit fill-in. Since the reduced row echelon form is
+    unique, the result does not depend on these choices.
+
+    :return: a tuple of the pivot columns and a list of sparse rows (one for
+        each pivot column, in order) mapping column indices to
+        :class:`~fractions.Fraction` instances.
+    """
+    import math
+    from fractions import Fraction
+
+    def make_primitive(row):
+        content = math.gcd(*row.values())
+        if content != 1:
+            row = {j: a // content for j, a in row.items()}
+        return row
+
+    int_rows = []
+    for row in rows:
+        row = {j: a for j, a in row.items() if a != 0}
+        if not row:
+            continue
+        denom = math.lcm(*(a.denominator for a in row.values()))
+        int_rows.append(make_primitive(
+            {j: int(a * denom) for j, a in row.items()}))
+
+    # maps each column to the indices of the rows with a nonzero entry in it
+    col_to_rows: dict[int, set[int]] = {}
+    for i, row in enumerate(int_rows):
+        for j in row:
+            col_to_rows.setdefault(j, set()).add(i)
+
+    pivot_cols = []
+    pivot_rows = []
+    remaining = set(range(len(int_rows)))
+
+    for col in range(ncols):
+        candidates = col_to_rows.get(col, set()) & remaining
+        if not candidates:
+            continue
+
+        ipivot = min(candidates, key=lambda i: (len(int_rows[i]), i))
+        remaining.remove(ipivot)
+        pivot_row = int_rows[ipivot]
+        pivot = pivot_row[col]
+
+        for i in list(col_to_rows[col]):
+            if i == ipivot:
+                continue
+
+            row = int_rows[i]
+            g = math.gcd(pivot, row[col])
+            row_mult = pivot // g
+            pivot_mult = row[col] // g
+
+            new_row = {j: row_mult*a for j, a in row.items()}
+            for j, a in pivot_row.items():
+                value = new_row.get(j, 0) - pivot_mult*a
+                if value:
+                    new_row[j] = value
+                else:
+                    new_row.pop(j, None)
+
+            for j in row.keys() - new_row.keys():
+                col_to_rows[j].discard(i)
+            for j in new_row.keys() - row.keys():
+                col_to_rows.setdefault(j, set()).add(i)
+
+            int_rows[i] = make_primitive(new_row) if new_row else new_row
+
+        pivot_cols.append(col)
+        pivot_rows.append(ipivot)
+
+    return pivot_cols, [
+        {j: Fraction(a, int_rows[i][col]) for j, a in int_rows[i].items()}
+        for col, i in zip(pivot_cols, pivot_rows, strict=True)]
+
+
 def reduced_row_echelon_form(m, atol=0):
     """Calculates a reduced row echelon form of a
     matrix `m`.
 
+    If all entries of `m` are exact rational numbers and *atol* is zero, an
+    exact fraction-free elimination on sparse rows of integers is used. Other
+    matrices (e.g. with symbolic or floating point entries) are reduced by
+    Gauss-Jordan elimination on their entries.
+
     :arg m: a 2D :class:`numpy.ndarray` or a list of lists or a sympy Matrix
     :arg atol: absolute tolerance for values to be considered zero
     :return: reduced row echelon form as a 2D :class:`numpy.ndarray`
@@ -535,6 +880,26 @@ def reduced_row_echelon_form(m, atol=0):
     """
 
     mat = np.array(m, dtype=object)
+
+    rows = _as_exact_rational_rows(mat) if atol == 0 else None
+    if rows is not None:
+        pivot_cols, rref_rows = \
+            _reduced_row_echelon_form_fraction_free(rows, mat.shape[1])
+
+        result = np.zeros(mat.shape, dtype=object)
+        for i, row in enumerate(rref_rows):
+            for j, value in row.items():
+                result[i, j] = (int(value) if value.denominator == 1
+                                else sym.Rational(value.numerator,
+                                                  value.denominator))
+
+        return result, pivot_cols
+
+    return _reduced_row_echelon_form_generic(mat, atol=atol)
+
+
+def _reduced_row_echelon_form_generic(mat, atol=0):
+    mat = np.array(mat, dtype=object)
     index = 0
     nrows = mat.shape[0]
     ncols = mat.shape[1]
@@ -598,18 +963,29 @@ def nullspace(m, atol=0):
     pivot_cols = list(pivot_cols)
     cols = mat.shape[1]
 
-    free_vars = [i for i in range(cols) if i not in pivot_cols]
+    pivot_col_set = set(pivot_cols)
+    free_vars = [i for i in range(cols) if i not in pivot_col_set]
+
+    def as_int_if_integer(entry):
+        return int(entry) if isinstance(entry, sym.Integer) else entry
+
+    # The contributions of the entries in the pivot columns do not depend on
+    # the free variable, so they are only computed once.
+    pivot_offsets = []
+    for piv_row in range(len(pivot_cols)):
+        offset = 0
+        for pos in pivot_cols[piv_row+1:]:
+            offset -= as_int_if_integer(mat[piv_row, pos])
+        pivot_offsets.append(offset)
 
     n = []
     for free_var in free_vars:
         vec = [0]*cols
         vec[free_var] = 1
         for piv_row, piv_col in enumerate(pivot_cols):
-            for pos in (*pivot_cols[piv_row+1:], free_var):
-                if isinstance(mat[piv_row, pos], sym.Integer):
-                    vec[piv_col] -= int(mat[piv_row, pos])
-                else:
-                    vec[piv_col] -= mat[piv_row, pos]
+            vec[piv_col] = (
+                pivot_offsets[piv_row]
+                - as_int_if_integer(mat[piv_row, free_var]))
         n.append(vec)
     return np.array(n, dtype=object).T
 
@@ -959,7 +1335,10 @@ def get_opencl_fft_app(
     backend = _get_fft_backend(queue)
 
     if backend == FFTBackend.loopy:
-        return loopy_fft(shape, inverse=inverse, complex_dtype=dtype.type), backend
+        # The executor keeps the compiled kernel, which calling the
+        # translation unit directly would rebuild every time.
+        app = loopy_fft(shape, inverse=inverse, complex_dtype=dtype.type)
+        return app.executor(queue.context), backend
     elif backend == FFTBackend.pyvkfft:
         from pyvkfft.opencl import VkFFTApp
         app = VkFFTApp(shape=shape, dtype=dtype, queue=queue, ndim=1, inplace=False)
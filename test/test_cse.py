@@ -474,6 +474,123 @@ def test_recursive_matching():
 # }}}
 
 
+# {{{ test_dag_cse
+
+def _substitute_replacements(replacements, reduced_exprs):
+    exprs = list(reduced_exprs)
+    for symbol, expr in reversed(replacements):
+        exprs = [e.subs(symbol, expr) for e in exprs]
+
+    return exprs
+
+
+@pytest.mark.parametrize("exprs", [
+    [x + y, 2 + x + y, x + y + z, 3 + x + y + z],
+    [x*y*z*5, x*y*z*w*x3, x*y*3*x0*x1*x2],
+    [-(x + y)*z, (x + y)*w, (x + y)**2],
+    [x**-2, x**2 + y, 1/(x**2 + y)],
+    [w*x + w*y + z, (w*x + w*y)*z, sym.exp(x + y) + sym.exp(-x - y)],
+    [sym.Derivative(sym.Function("f")(x + y), x) + (x + y), x + y],
+    ])
+def test_dag_cse(exprs):
+    from sumpy.dag_cse import dag_cse
+
+    replacements, reduced_exprs = dag_cse(exprs)
+    assert len(reduced_exprs) == len(exprs)
+
+    for expr, result in zip(
+            exprs, _substitute_replacements(replacements, reduced_exprs),
+            strict=True):
+        assert (expr - result).expand() == 0
+
+    # every common subexpression is used at least twice
+    all_exprs = [expr for _, expr in replacements] + reduced_exprs
+    for symbol, _ in replacements:
+        assert sum(expr.count(symbol) for expr in all_exprs) >= 2
+
+
+def test_dag_cse_finds_common_subexpressions():
+    from sumpy.dag_cse import dag_cse
+
+    replacements, reduced_exprs = dag_cse(
+            [x + y, 2 + x + y, x + y + z, 3 + x + y + z],
+            symbols=[x0, x1, x2])
+    assert replacements == [(x0, x + y), (x1, x0 + z)]
+    assert reduced_exprs == [x0, x0 + 2, x1, x1 + 3]
+
+    replacements, reduced_exprs = dag_cse([(x + y)*z, -(x + y)], symbols=[x0])
+    assert replacements == [(x0, x + y)]
+    assert reduced_exprs == [x0*z, -x0]
+
+    # symbols occurring in the expressions are skipped
+    replacements, reduced_exprs = dag_cse([(x0 + y)*z, (x0 + y)*w],
+                                          symbols=[x0, x1])
+    assert replacements == [(x1, x0 + y)]
+    assert reduced_exprs == [x1*z, w*x1]
+
+    with pytest.raises(ValueError):
+        dag_cse([(x0 + y)*z, (x0 + y)*w], symbols=[x0])
+
+
+def test_dag_cse_assignment_collection():
+    import numpy as np
+
+    from sumpy.assignment_collection import SymbolicAssignmentCollection
+    from sumpy.expansion.multipole import (
+        LinearPDEConformingVolumeTaylorMultipoleExpansion,
+    )
+    from sumpy.kernel import LaplaceKernel
+
+    knl = LaplaceKernel(3)
+    expn = LinearPDEConformingVolumeTaylorMultipoleExpansion(knl, order=4)
+
+    src_coeff_exprs = [sym.Symbol(f"src_coeff{i}") for i in range(len(expn))]
+    dvec = sym.make_sym_vector("d", knl.dim)
+    src_rscale = sym.Symbol("src_rscale")
+    tgt_rscale = sym.Symbol("tgt_rscale")
+
+    def get_assignments(engine):
+        sac = SymbolicAssignmentCollection()
+        result = expn.translate_from(expn, src_coeff_exprs, src_rscale,
+                                     dvec, tgt_rscale, sac)
+        names = [sac.assign_unique(f"coeff{i}", expr)
+                 for i, expr in enumerate(result)]
+        sac.run_global_cse(engine=engine)
+
+        return names, sac.assignments
+
+    rng = np.random.default_rng(seed=17)
+    values = {
+        **{str(coeff): rng.random() for coeff in src_coeff_exprs},
+        **{str(d): rng.random() for d in dvec},
+        "src_rscale": 0.5, "tgt_rscale": 1.5,
+        }
+
+    def evaluate(names, assignments):
+        env = {sym.Symbol(name): value for name, value in values.items()}
+
+        def get_value(name):
+            symbol = sym.Symbol(name)
+            if symbol not in env:
+                expr = assignments[name]
+                for dep in expr.free_symbols:
+                    get_value(str(dep))
+                env[symbol] = float(expr.subs(env).doit())
+
+            return env[symbol]
+
+        return np.array([get_value(name) for name in names])
+
+    ref = evaluate(*get_assignments("sympy"))
+    result = evaluate(*get_assignments("dag"))
+    assert np.allclose(result, ref, rtol=1e-13)
+
+    with pytest.raises(ValueError):
+        get_assignments("unknown")
+
+# }}}
+
+
 # You can test individual routines by typing
 # $ python test_cse.py 'test_recursive_matching()'
 
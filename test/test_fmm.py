@@ -711,6 +711,1288 @@ def test_sumpy_target_point_multiplier(actx_factory, deriv_axes, visualize=False
 # }}}
 
 
+# {{{ test_sumpy_fmm_prewarm
+
+@pytest.mark.parametrize("use_fft", [True, False])
+def test_sumpy_fmm_prewarm(actx_factory, use_fft, visualize=False):
+    if visualize:
+        logging.basicConfig(level=logging.INFO)
+
+    actx = actx_factory()
+
+    knl = LaplaceKernel(2)
+    local_expn_class = LinearPDEConformingVolumeTaylorLocalExpansion
+    mpole_expn_class = LinearPDEConformingVolumeTaylorMultipoleExpansion
+    order = 2
+
+    if use_fft:
+        from sumpy.expansion.m2l import FFTM2LTranslationClassFactory
+        m2l_translation_factory = FFTM2LTranslationClassFactory()
+    else:
+        from sumpy.expansion.m2l import NonFFTM2LTranslationClassFactory
+        m2l_translation_factory = NonFFTM2LTranslationClassFactory()
+
+    m2l_translation = m2l_translation_factory.get_m2l_translation_class(
+                knl, local_expn_class)()
+
+    def make_tree_indep():
+        return SumpyTreeIndependentDataForWrangler(
+                actx.context,
+                partial(mpole_expn_class, knl),
+                partial(local_expn_class, knl, m2l_translation=m2l_translation),
+                [knl])
+
+    from sumpy.prewarm import prewarm_fmm
+    report = prewarm_fmm(make_tree_indep(), [order], np.float64,
+            box_sizes=[(30, 30)])
+    logger.info("report:\n%s", report)
+
+    names = {rec.name for rec in report.records}
+    assert {"p2m", "p2l", "m2m", "m2l", "l2l", "m2p", "l2p", "p2p"} <= names
+    if use_fft:
+        assert "m2l_preprocess_multipole" in names
+
+    # the second time around, everything should come from the cache
+    from sumpy import CACHING_ENABLED
+    report = prewarm_fmm(make_tree_indep(), [order], np.float64,
+            box_sizes=[(30, 30)])
+    if CACHING_ENABLED:
+        assert report.ngenerated == 0
+        assert all(rec.cache_hit for rec in report.records)
+
+    # the M2L kernels are generated for the type of the expansions
+    report = prewarm_fmm(make_tree_indep(), [order], np.float64,
+            expansion_dtype=np.float32)
+    m2l_dtypes = {rec.kwargs["result_dtype"] for rec in report.records
+                  if "result_dtype" in rec.kwargs}
+    assert m2l_dtypes == (
+        {"complex64", "float32"} if use_fft else {"float32"})
+
+# }}}
+
+
+# {{{ test_sumpy_fmm_build_all
+
+def test_sumpy_fmm_build_all(actx_factory):
+    from sumpy import CACHING_ENABLED
+    if not CACHING_ENABLED:
+        pytest.skip("kernels are only shared between processes via the cache")
+
+    actx = actx_factory()
+
+    knl = LaplaceKernel(2)
+    local_expn_class = LinearPDEConformingVolumeTaylorLocalExpansion
+    mpole_expn_class = LinearPDEConformingVolumeTaylorMultipoleExpansion
+
+    from sumpy.expansion.m2l import NonFFTM2LTranslationClassFactory
+    m2l_translation = NonFFTM2LTranslationClassFactory().get_m2l_translation_class(
+                knl, local_expn_class)()
+
+    def make_tree_indep():
+        return SumpyTreeIndependentDataForWrangler(
+                actx.context,
+                partial(mpole_expn_class, knl),
+                partial(local_expn_class, knl, m2l_translation=m2l_translation),
+                [knl])
+
+    level_orders = [2, 3, 3, 2]
+    report = make_tree_indep().build_all(level_orders, np.float64, nprocs=2)
+    logger.info("report:\n%s", report)
+
+    translations = {(rec.name, rec.kwargs.get("result_dtype"), rec.order)
+                    for rec in report.records}
+    assert ("m2m", None, 2) in translations
+    assert ("m2m", None, 3) in translations
+    assert ("l2l", None, 2) in translations
+    assert ("l2l", None, 3) in translations
+    assert {rec.order for rec in report.records if rec.name == "m2l"} == {2, 3}
+
+    # all kernels are now in the cache of this process
+    report = make_tree_indep().build_all(level_orders, np.float64, nprocs=1)
+    assert report.ngenerated == 0
+
+# }}}
+
+
+# {{{ test_sumpy_fmm_overlap_stages
+
+@pytest.mark.parametrize("use_fft", [True, False])
+def test_sumpy_fmm_overlap_stages(ctx_factory, use_fft):
+    import pyopencl as cl
+
+    from sumpy.array_context import PyOpenCLArrayContext
+
+    ctx = ctx_factory()
+    queue = cl.CommandQueue(ctx,
+        properties=cl.command_queue_properties.PROFILING_ENABLE)
+    actx = PyOpenCLArrayContext(queue)
+
+    knl = LaplaceKernel(3)
+    local_expn_class = LinearPDEConformingVolumeTaylorLocalExpansion
+    mpole_expn_class = LinearPDEConformingVolumeTaylorMultipoleExpansion
+    order = 3
+
+    nsources = 1000
+    ntargets = 300
+
+    from boxtree.tools import make_normal_particle_array as p_normal
+    sources = p_normal(actx.queue, nsources, knl.dim, np.float64, seed=15)
+    targets = p_normal(actx.queue, ntargets, knl.dim, np.float64, seed=18)
+
+    from boxtree import TreeBuilder
+    tree, _ = TreeBuilder(actx.context)(actx.queue, sources, targets=targets,
+            max_particles_in_box=30, debug=True)
+
+    from boxtree.traversal import FMMTraversalBuilder
+    trav, _ = FMMTraversalBuilder(actx.context)(actx.queue, tree, debug=True)
+
+    rng = np.random.default_rng(44)
+    weights = actx.from_numpy(rng.random(nsources, dtype=np.float64))
+
+    if use_fft:
+        from sumpy.expansion.m2l import FFTM2LTranslationClassFactory
+        m2l_translation_factory = FFTM2LTranslationClassFactory()
+    else:
+        from sumpy.expansion.m2l import NonFFTM2LTranslationClassFactory
+        m2l_translation_factory = NonFFTM2LTranslationClassFactory()
+
+    m2l_translation = m2l_translation_factory.get_m2l_translation_class(
+                knl, local_expn_class)()
+
+    tree_indep = SumpyTreeIndependentDataForWrangler(
+            actx.context,
+            partial(mpole_expn_class, knl),
+            partial(local_expn_class, knl, m2l_translation=m2l_translation),
+            [knl])
+
+    from boxtree.fmm import drive_fmm
+
+    results = []
+    for overlap_stages in [False, True]:
+        wrangler = SumpyExpansionWrangler(tree_indep, trav, np.float64,
+                fmm_level_to_order=lambda kernel, kernel_args, tree, lev: order,
+                overlap_stages=overlap_stages)
+
+        timing_data = {}
+        pot, = drive_fmm(wrangler, (weights,), timing_data=timing_data)
+        logger.info("timing_data (overlap_stages=%s):\n%s",
+                    overlap_stages, timing_data)
+
+        assert pot.queue is actx.queue
+        assert all(timing["wall_elapsed"] is not None
+                   for timing in timing_data.values())
+        assert timing_data["eval_direct"]["wall_elapsed"] > 0
+        assert timing_data["form_locals"]["wall_elapsed"] > 0
+
+        results.append(actx.to_numpy(pot))
+
+    pot, overlap_pot = results
+    assert la.norm(overlap_pot - pot, np.inf) < 1.0e-14 * la.norm(pot, np.inf)
+
+# }}}
+
+
+# {{{ test_sumpy_fmm_m2l_precompute_cache
+
+@pytest.mark.parametrize("use_fft", [True, False])
+def test_sumpy_fmm_m2l_precompute_cache(actx_factory, use_fft):
+    actx = actx_factory()
+
+    from sumpy import CACHING_ENABLED
+
+    knl = LaplaceKernel(2)
+    local_expn_class = LinearPDEConformingVolumeTaylorLocalExpansion
+    mpole_expn_class = LinearPDEConformingVolumeTaylorMultipoleExpansion
+    order = 4
+
+    nsources = 500
+
+    from boxtree.tools import make_normal_particle_array as p_normal
+    sources = p_normal(actx.queue, nsources, knl.dim, np.float64, seed=15)
+
+    from boxtree import TreeBuilder
+    tree, _ = TreeBuilder(actx.context)(actx.queue, sources,
+            max_particles_in_box=30, debug=True)
+
+    from boxtree.traversal import FMMTraversalBuilder
+    trav, _ = FMMTraversalBuilder(actx.context)(actx.queue, tree, debug=True)
+
+    if use_fft:
+        from sumpy.expansion.m2l import FFTM2LTranslationClassFactory
+        m2l_translation_factory = FFTM2LTranslationClassFactory()
+    else:
+        from sumpy.expansion.m2l import NonFFTM2LTranslationClassFactory
+        m2l_translation_factory = NonFFTM2LTranslationClassFactory()
+
+    m2l_translation = m2l_translation_factory.get_m2l_translation_class(
+                knl, local_expn_class)()
+
+    tree_indep = SumpyTreeIndependentDataForWrangler(
+            actx.context,
+            partial(mpole_expn_class, knl),
+            partial(local_expn_class, knl, m2l_translation=m2l_translation),
+            [knl])
+
+    def make_wrangler(**kwargs):
+        return SumpyExpansionWrangler(tree_indep, trav, np.float64,
+                fmm_level_to_order=lambda kernel, kernel_args, tree, lev: order,
+                **kwargs)
+
+    cache = SumpyExpansionWrangler.m2l_precompute_cache
+    cache.clear()
+
+    wrangler = make_wrangler(persist_m2l_precompute=True)
+    precomputed = [actx.to_numpy(ary.with_queue(actx.queue))
+                   for ary in wrangler.multipole_to_local_precompute()]
+    nentries = len(cache)
+    assert nentries > 0
+
+    # a new wrangler for the same tree reuses the data of all levels
+    wrangler = make_wrangler()
+    cached = [actx.to_numpy(ary.with_queue(actx.queue))
+              for ary in wrangler.multipole_to_local_precompute()]
+    assert len(cache) == nentries
+    for ary, cached_ary in zip(precomputed, cached, strict=True):
+        assert np.array_equal(ary, cached_ary)
+
+    # ... and the disk cache once the in-memory cache is cleared
+    if CACHING_ENABLED:
+        cache.clear()
+        wrangler = make_wrangler(persist_m2l_precompute=True)
+        cached = [actx.to_numpy(ary.with_queue(actx.queue))
+                  for ary in wrangler.multipole_to_local_precompute()]
+        assert len(cache) == nentries
+        for ary, cached_ary in zip(precomputed, cached, strict=True):
+            assert np.array_equal(ary, cached_ary)
+
+    # a different scaling does not hit the cache
+    wrangler = make_wrangler()
+    wrangler.level_to_rscale = lambda level: 2 * type(wrangler).level_to_rscale(
+            wrangler, level)
+    wrangler.multipole_to_local_precompute()
+    assert len(cache) == 2 * nentries
+
+    cache.clear()
+
+# }}}
+
+
+# {{{ test_sumpy_fmm_scale_invariant_m2l
+
+@pytest.mark.parametrize("use_fft", [True, False])
+def test_sumpy_fmm_scale_invariant_m2l(actx_factory, use_fft):
+    actx = actx_factory()
+
+    knl = LaplaceKernel(3)
+    local_expn_class = LinearPDEConformingVolumeTaylorLocalExpansion
+    mpole_expn_class = LinearPDEConformingVolumeTaylorMultipoleExpansion
+    order = 4
+
+    nsources = 2000
+    ntargets = 300
+
+    from boxtree.tools import make_normal_particle_array as p_normal
+    sources = p_normal(actx.queue, nsources, knl.dim, np.float64, seed=15)
+    targets = p_normal(actx.queue, ntargets, knl.dim, np.float64, seed=18)
+
+    from boxtree import TreeBuilder
+    tree, _ = TreeBuilder(actx.context)(actx.queue, sources, targets=targets,
+            max_particles_in_box=30, debug=True)
+
+    from boxtree.traversal import FMMTraversalBuilder
+    trav, _ = FMMTraversalBuilder(actx.context)(actx.queue, tree, debug=True)
+
+    rng = np.random.default_rng(44)
+    weights = actx.from_numpy(rng.random(nsources, dtype=np.float64))
+
+    if use_fft:
+        from sumpy.expansion.m2l import FFTM2LTranslationClassFactory
+        m2l_translation_factory = FFTM2LTranslationClassFactory()
+    else:
+        from sumpy.expansion.m2l import NonFFTM2LTranslationClassFactory
+        m2l_translation_factory = NonFFTM2LTranslationClassFactory()
+
+    m2l_translation = m2l_translation_factory.get_m2l_translation_class(
+                knl, local_expn_class)()
+
+    tree_indep = SumpyTreeIndependentDataForWrangler(
+            actx.context,
+            partial(mpole_expn_class, knl),
+            partial(local_expn_class, knl, m2l_translation=m2l_translation),
+            [knl])
+
+    SumpyExpansionWrangler.m2l_precompute_cache.clear()
+
+    def make_wrangler(**kwargs):
+        return SumpyExpansionWrangler(tree_indep, trav, np.float64,
+                fmm_level_to_order=lambda kernel, kernel_args, tree, lev: order,
+                **kwargs)
+
+    wrangler = make_wrangler()
+    ref_wrangler = make_wrangler(_disable_scale_invariant_m2l=True)
+
+    reference_levels = wrangler.m2l_scale_invariant_reference_levels()
+    assert ref_wrangler.m2l_scale_invariant_reference_levels() is None
+    assert reference_levels is not None
+
+    level_starts = wrangler.m2l_translation_class_level_start_box_nrs()
+    levels_with_m2l = [lev for lev in range(tree.nlevels)
+                       if level_starts[lev] < level_starts[lev + 1]]
+    assert len(levels_with_m2l) > 1
+    assert len({reference_levels[lev] for lev in levels_with_m2l}) == 1
+
+    # {{{ compare the derived data with that computed for each level
+
+    data = [actx.to_numpy(ary.with_queue(actx.queue))
+            for ary in wrangler.multipole_to_local_precompute()]
+    ref_data = [actx.to_numpy(ary.with_queue(actx.queue))
+                for ary in ref_wrangler.multipole_to_local_precompute()]
+
+    translation_classes_data = wrangler.translation_classes_data
+    translation_classes = actx.to_numpy(
+            translation_classes_data.from_sep_siblings_translation_classes
+            .with_queue(actx.queue))
+    reference_classes = actx.to_numpy(
+            wrangler.m2l_translation_classes_lists().with_queue(actx.queue))
+
+    for lev in levels_with_m2l:
+        level_mask = ((level_starts[lev] <= translation_classes)
+                      & (translation_classes < level_starts[lev + 1]))
+        derived = (
+            data[lev][reference_classes[level_mask]]
+            * wrangler.m2l_scale_invariant_factor(lev))
+        expected = ref_data[lev][translation_classes[level_mask] - level_starts[lev]]
+        assert la.norm(derived - expected) < 1.0e-12 * la.norm(expected)
+
+    # all levels share the data of their reference level
+    assert (data[levels_with_m2l[0]].nbytes
+            < sum(ary.nbytes for ary in ref_data))
+
+    # }}}
+
+    from boxtree.fmm import drive_fmm
+    pot, = drive_fmm(wrangler, (weights,))
+    ref_pot, = drive_fmm(ref_wrangler, (weights,))
+
+    pot = actx.to_numpy(pot)
+    ref_pot = actx.to_numpy(ref_pot)
+    assert la.norm(pot - ref_pot, np.inf) < 1.0e-12 * la.norm(ref_pot, np.inf)
+
+    SumpyExpansionWrangler.m2l_precompute_cache.clear()
+
+# }}}
+
+
+# {{{ test_sumpy_fmm_mixed_precision
+
+@pytest.mark.parametrize("use_fft", [True, False])
+@pytest.mark.parametrize("knl", [LaplaceKernel(2), LaplaceKernel(3)])
+def test_sumpy_fmm_mixed_precision(actx_factory, knl, use_fft):
+    actx = actx_factory()
+
+    local_expn_class = LinearPDEConformingVolumeTaylorLocalExpansion
+    mpole_expn_class = LinearPDEConformingVolumeTaylorMultipoleExpansion
+
+    order = 10 if knl.dim == 2 else 6
+
+    nsources = 1000
+    ntargets = 300
+
+    from boxtree.tools import make_normal_particle_array as p_normal
+    sources = p_normal(actx.queue, nsources, knl.dim, np.float64, seed=15)
+    targets = p_normal(actx.queue, ntargets, knl.dim, np.float64, seed=18)
+
+    from boxtree import TreeBuilder
+    tree, _ = TreeBuilder(actx.context)(actx.queue, sources, targets=targets,
+            max_particles_in_box=30, debug=True)
+
+    from boxtree.traversal import FMMTraversalBuilder
+    trav, _ = FMMTraversalBuilder(actx.context)(actx.queue, tree, debug=True)
+
+    rng = np.random.default_rng(44)
+    weights = actx.from_numpy(rng.random(nsources, dtype=np.float64))
+
+    if use_fft:
+        from sumpy.expansion.m2l import FFTM2LTranslationClassFactory
+        m2l_translation_factory = FFTM2LTranslationClassFactory()
+    else:
+        from sumpy.expansion.m2l import NonFFTM2LTranslationClassFactory
+        m2l_translation_factory = NonFFTM2LTranslationClassFactory()
+
+    m2l_translation = m2l_translation_factory.get_m2l_translation_class(
+                knl, local_expn_class)()
+
+    tree_indep = SumpyTreeIndependentDataForWrangler(
+            actx.context,
+            partial(mpole_expn_class, knl),
+            partial(local_expn_class, knl, m2l_translation=m2l_translation),
+            [knl])
+
+    from sumpy import P2P
+    p2p = P2P(actx.context, [knl], exclude_self=False)
+    _evt, (ref_pot,) = p2p(actx.queue, targets, sources, (weights,))
+    ref_pot = actx.to_numpy(ref_pot)
+
+    from boxtree.fmm import drive_fmm
+
+    errors = {}
+    for expansion_dtype in [np.float64, np.float32]:
+        wrangler = SumpyExpansionWrangler(tree_indep, trav, np.float64,
+                fmm_level_to_order=lambda kernel, kernel_args, tree, lev: order,
+                expansion_dtype=expansion_dtype)
+
+        mpole_exps = wrangler.multipole_expansion_zeros(weights)
+        assert mpole_exps.dtype == expansion_dtype
+        assert wrangler.output_zeros(weights)[0].dtype == np.float64
+
+        pot, = drive_fmm(wrangler, (weights,))
+        assert pot.dtype == np.float64
+
+        pot = actx.to_numpy(pot)
+        errors[expansion_dtype] = (
+            la.norm(pot - ref_pot, np.inf) / la.norm(ref_pot, np.inf))
+
+    logger.info("errors: %s", errors)
+
+    assert errors[np.float64] < 1.0e-4
+    assert errors[np.float32] < max(2 * errors[np.float64], 1.0e-5)
+
+# }}}
+
+
+# {{{ test_sumpy_fmm_autotune
+
+def test_sumpy_fmm_autotune(actx_factory, monkeypatch):
+    actx = actx_factory()
+
+    knl = LaplaceKernel(2)
+    local_expn_class = LinearPDEConformingVolumeTaylorLocalExpansion
+    mpole_expn_class = LinearPDEConformingVolumeTaylorMultipoleExpansion
+    order = 4
+
+    nsources = 500
+    ntargets = 200
+
+    from boxtree.tools import make_normal_particle_array as p_normal
+    sources = p_normal(actx.queue, nsources, knl.dim, np.float64, seed=15)
+    targets = p_normal(actx.queue, ntargets, knl.dim, np.float64, seed=18)
+
+    from boxtree import TreeBuilder
+    tree, _ = TreeBuilder(actx.context)(actx.queue, sources, targets=targets,
+            max_particles_in_box=30, debug=True)
+
+    from boxtree.traversal import FMMTraversalBuilder
+    trav, _ = FMMTraversalBuilder(actx.context)(actx.queue, tree, debug=True)
+
+    rng = np.random.default_rng(44)
+    weights = actx.from_numpy(rng.random(nsources, dtype=np.float64))
+
+    from sumpy.expansion.m2l import NonFFTM2LTranslationClassFactory
+    m2l_translation = NonFFTM2LTranslationClassFactory().get_m2l_translation_class(
+                knl, local_expn_class)()
+
+    def compute_potential():
+        tree_indep = SumpyTreeIndependentDataForWrangler(
+                actx.context,
+                partial(mpole_expn_class, knl),
+                partial(local_expn_class, knl, m2l_translation=m2l_translation),
+                [knl])
+        wrangler = SumpyExpansionWrangler(tree_indep, trav, np.float64,
+                fmm_level_to_order=lambda kernel, kernel_args, tree, lev: order)
+
+        from boxtree.fmm import drive_fmm
+        pot, = drive_fmm(wrangler, (weights,))
+        return actx.to_numpy(pot)
+
+    ref_pot = compute_potential()
+
+    import sumpy
+    import sumpy.autotune
+
+    sumpy.autotune._TUNED_PARAMETERS.clear()
+    monkeypatch.setattr(sumpy, "AUTOTUNE_ENABLED", True)
+
+    pot = compute_potential()
+    tuned_parameters = dict(sumpy.autotune._TUNED_PARAMETERS)
+
+    # p2m, p2l, m2p, l2p and p2p
+    assert len(tuned_parameters) == 5
+    assert la.norm(pot - ref_pot, np.inf) < 1.0e-14 * la.norm(ref_pot, np.inf)
+
+    if sumpy.CACHING_ENABLED:
+        # the second time around, the parameters should come from the cache
+        def time_executor(executor, queue, call_kwargs):
+            raise AssertionError("cached tuning parameters were not used")
+
+        monkeypatch.setattr(sumpy.autotune, "_time_executor", time_executor)
+        sumpy.autotune._TUNED_PARAMETERS.clear()
+
+        assert np.array_equal(compute_potential(), pot)
+        assert sumpy.autotune._TUNED_PARAMETERS == tuned_parameters
+
+# }}}
+
+
+# {{{ test_sumpy_fmm_lean_memory
+
+@pytest.mark.parametrize("use_fft", [True, False])
+def test_sumpy_fmm_lean_memory(actx_factory, use_fft):
+    actx = actx_factory()
+
+    knl = LaplaceKernel(2)
+    local_expn_class = LinearPDEConformingVolumeTaylorLocalExpansion
+    mpole_expn_class = LinearPDEConformingVolumeTaylorMultipoleExpansion
+    order = 6
+
+    nsources = 2000
+    ntargets = 300
+
+    from boxtree.tools import make_normal_particle_array as p_normal
+    sources = p_normal(actx.queue, nsources, knl.dim, np.float64, seed=15)
+    targets = p_normal(actx.queue, ntargets, knl.dim, np.float64, seed=18)
+
+    from boxtree import TreeBuilder
+    tree, _ = TreeBuilder(actx.context)(actx.queue, sources, targets=targets,
+            max_particles_in_box=30, debug=True)
+
+    from boxtree.traversal import FMMTraversalBuilder
+    trav, _ = FMMTraversalBuilder(actx.context)(actx.queue, tree, debug=True)
+
+    rng = np.random.default_rng(44)
+    weights = actx.from_numpy(rng.random(nsources, dtype=np.float64))
+
+    if use_fft:
+        from sumpy.expansion.m2l import FFTM2LTranslationClassFactory
+        m2l_translation_factory = FFTM2LTranslationClassFactory()
+    else:
+        from sumpy.expansion.m2l import NonFFTM2LTranslationClassFactory
+        m2l_translation_factory = NonFFTM2LTranslationClassFactory()
+
+    m2l_translation = m2l_translation_factory.get_m2l_translation_class(
+                knl, local_expn_class)()
+
+    tree_indep = SumpyTreeIndependentDataForWrangler(
+            actx.context,
+            partial(mpole_expn_class, knl),
+            partial(local_expn_class, knl, m2l_translation=m2l_translation),
+            [knl])
+
+    SumpyExpansionWrangler.m2l_precompute_cache.clear()
+
+    def make_wrangler(**kwargs):
+        return SumpyExpansionWrangler(tree_indep, trav, np.float64,
+                fmm_level_to_order=lambda kernel, kernel_args, tree, lev: order,
+                **kwargs)
+
+    from boxtree.fmm import drive_fmm
+    wrangler = make_wrangler()
+    pot, = drive_fmm(wrangler, (weights,))
+
+    lean_wrangler = make_wrangler(lean_memory=True)
+    lean_pot, = drive_fmm(lean_wrangler, (weights,))
+
+    pot = actx.to_numpy(pot)
+    lean_pot = actx.to_numpy(lean_pot)
+    assert la.norm(pot - lean_pot, np.inf) < 1.0e-14 * la.norm(pot, np.inf)
+
+    # the peak memory use is only tracked with lean_memory
+    assert wrangler.peak_memory_nbytes is None
+
+    estimate = wrangler.estimate_resources()
+    lean_estimate = lean_wrangler.estimate_resources()
+    logger.info("estimated memory: %d bytes, lean: %d bytes (peak %d bytes)",
+                estimate.total_nbytes, lean_estimate.total_nbytes,
+                lean_wrangler.peak_memory_nbytes)
+    assert lean_estimate.total_nbytes < estimate.total_nbytes
+
+    # the expansions are still allocated for all the levels
+    assert lean_wrangler.peak_memory_nbytes >= (
+        lean_estimate.nbytes["multipole_expansions"]
+        + lean_estimate.nbytes["local_expansions"]
+        + lean_estimate.nbytes["potentials"])
+
+    SumpyExpansionWrangler.m2l_precompute_cache.clear()
+
+# }}}
+
+
+# {{{ test_sumpy_fmm_profile
+
+@pytest.mark.parametrize("enable_profiling", [True, False])
+def test_sumpy_fmm_profile(ctx_factory, enable_profiling, tmp_path):
+    import json
+
+    import pyopencl as cl
+
+    from sumpy.array_context import PyOpenCLArrayContext
+    from sumpy.fmm_profile import FMMProfile
+
+    ctx = ctx_factory()
+    queue = cl.CommandQueue(ctx,
+        properties=(
+            cl.command_queue_properties.PROFILING_ENABLE
+            if enable_profiling else 0))
+    actx = PyOpenCLArrayContext(queue)
+
+    nsources = 500
+    dtype = np.float64
+
+    from boxtree.tools import make_normal_particle_array as p_normal
+
+    knl = LaplaceKernel(2)
+    order = 2
+
+    sources = p_normal(actx.queue, nsources, knl.dim, dtype, seed=15)
+
+    from boxtree import TreeBuilder
+    tree, _ = TreeBuilder(actx.context)(actx.queue, sources,
+            max_particles_in_box=30, debug=True)
+
+    from boxtree.traversal import FMMTraversalBuilder
+    trav, _ = FMMTraversalBuilder(actx.context)(actx.queue, tree, debug=True)
+
+    rng = np.random.default_rng(44)
+    weights = actx.from_numpy(rng.random(nsources, dtype=np.float64))
+
+    tree_indep = SumpyTreeIndependentDataForWrangler(
+            actx.context,
+            partial(VolumeTaylorMultipoleExpansion, knl),
+            partial(VolumeTaylorLocalExpansion, knl),
+            [knl])
+
+    wrangler = SumpyExpansionWrangler(tree_indep, trav, dtype,
+            fmm_level_to_order=lambda kernel, kernel_args, tree, lev: order)
+    from boxtree.fmm import drive_fmm
+
+    with FMMProfile() as profile:
+        drive_fmm(wrangler, (weights,))
+    logger.info("profile:\n%s", profile)
+
+    stages = {rec.stage for rec in profile.records}
+    assert {"form_multipoles", "eval_direct", "multipole_to_local",
+            "eval_locals"} <= stages
+
+    for rec in profile.records:
+        assert 0 <= rec.start <= rec.end
+        assert rec.nbytes > 0
+        if not enable_profiling:
+            assert rec.timing == "host"
+
+    p2p, = [rec for rec in profile.records if rec.stage == "eval_direct"]
+    assert p2p.timing == ("device" if enable_profiling else "host")
+    assert p2p.class_name == "P2PFromCSR"
+    assert p2p.op_count > 0
+    # each source interacts with each target at least within its own box
+    assert nsources <= p2p.ninteractions <= nsources**2
+    assert p2p.flops == p2p.op_count * p2p.ninteractions
+
+    p2m_ninteractions = sum(
+            rec.ninteractions for rec in profile.records
+            if rec.stage == "form_multipoles")
+    assert p2m_ninteractions == nsources
+
+    assert set(profile.by_stage()) == stages
+    assert json.loads(profile.to_json())[0]["stage"] == profile.records[0].stage
+
+    trace_file = tmp_path / "trace.json"
+    profile.write_chrome_trace(str(trace_file))
+    with open(trace_file) as inf:
+        trace = json.load(inf)
+
+    assert (
+        len([evt for evt in trace["traceEvents"] if evt["ph"] == "X"])
+        == len(profile.records))
+
+    # nothing is recorded outside of a profile
+    nrecords = len(profile.records)
+    drive_fmm(wrangler, (weights,))
+    assert len(profile.records) == nrecords
+
+# }}}
+
+
+# {{{ test_sumpy_fmm_resource_estimate
+
+@pytest.mark.parametrize("use_fft", [True, False])
+def test_sumpy_fmm_resource_estimate(actx_factory, use_fft):
+    from sumpy.fmm_profile import FMMProfile
+
+    actx = actx_factory()
+
+    knl = LaplaceKernel(2)
+    local_expn_class = LinearPDEConformingVolumeTaylorLocalExpansion
+    mpole_expn_class = LinearPDEConformingVolumeTaylorMultipoleExpansion
+    order = 4
+
+    nsources = 1000
+    ntargets = 300
+
+    from boxtree.tools import make_normal_particle_array as p_normal
+    sources = p_normal(actx.queue, nsources, knl.dim, np.float64, seed=15)
+    targets = p_normal(actx.queue, ntargets, knl.dim, np.float64, seed=18)
+
+    from boxtree import TreeBuilder
+    tree, _ = TreeBuilder(actx.context)(actx.queue, sources, targets=targets,
+            max_particles_in_box=30, debug=True)
+
+    from boxtree.traversal import FMMTraversalBuilder
+    trav, _ = FMMTraversalBuilder(actx.context)(actx.queue, tree, debug=True)
+
+    rng = np.random.default_rng(44)
+    weights = actx.from_numpy(rng.random(nsources, dtype=np.float64))
+
+    if use_fft:
+        from sumpy.expansion.m2l import FFTM2LTranslationClassFactory
+        m2l_translation_factory = FFTM2LTranslationClassFactory()
+    else:
+        from sumpy.expansion.m2l import NonFFTM2LTranslationClassFactory
+        m2l_translation_factory = NonFFTM2LTranslationClassFactory()
+
+    m2l_translation = m2l_translation_factory.get_m2l_translation_class(
+                knl, local_expn_class)()
+
+    tree_indep = SumpyTreeIndependentDataForWrangler(
+            actx.context,
+            partial(mpole_expn_class, knl),
+            partial(local_expn_class, knl, m2l_translation=m2l_translation),
+            [knl])
+
+    def make_wrangler(**kwargs):
+        return SumpyExpansionWrangler(tree_indep, trav, np.float64,
+                fmm_level_to_order=lambda kernel, kernel_args, tree, lev: order,
+                **kwargs)
+
+    wrangler = make_wrangler()
+    estimate = wrangler.estimate_resources()
+    logger.info("estimate: %s", estimate)
+
+    # the peak memory use is only tracked with lean_memory
+    assert wrangler.peak_memory_nbytes is None
+
+    # {{{ compare with the arrays and kernels of a run
+
+    assert (estimate.nbytes["multipole_expansions"]
+            == wrangler.multipole_expansion_zeros(weights).nbytes)
+    assert (estimate.nbytes["local_expansions"]
+            == wrangler.local_expansion_zeros(weights).nbytes)
+    assert (estimate.nbytes["potentials"]
+            == sum(pot.nbytes for pot in wrangler.output_zeros(weights)))
+    assert (estimate.nbytes["translation_classes_dependent_data"]
+            == sum(ary.nbytes
+                   for ary in wrangler.multipole_to_local_precompute()))
+    if use_fft:
+        assert (estimate.nbytes["preprocessed_multipole_expansions"]
+                == sum(ary.nbytes for ary in
+                       wrangler.m2l_preproc_mpole_expansion_zeros(weights)))
+        assert estimate.nbytes["fft_workspace"] > 0
+    else:
+        assert estimate.nbytes["preprocessed_multipole_expansions"] == 0
+        assert estimate.nbytes["fft_workspace"] == 0
+
+    from boxtree.fmm import drive_fmm
+    with FMMProfile() as profile:
+        drive_fmm(wrangler, (weights,))
+
+    for stage, flops in estimate.flops.items():
+        recs = [rec for rec in profile.records
+                if rec.stage == stage and rec.flops is not None]
+        if stage == "multipole_to_local" and use_fft:
+            # the preprocessing and postprocessing are not counted by the
+            # profile
+            assert flops > sum(rec.flops for rec in recs)
+        else:
+            assert flops == sum(rec.flops for rec in recs)
+            assert (estimate.ninteractions[stage]
+                    == sum(rec.ninteractions for rec in recs))
+
+    assert estimate.total_flops > 0
+
+    # }}}
+
+    lean_estimate = make_wrangler(lean_memory=True).estimate_resources()
+    assert lean_estimate.flops == estimate.flops
+    assert lean_estimate.total_nbytes < estimate.total_nbytes
+
+# }}}
+
+
+# {{{ test_sumpy_fmm_repeated_evaluation
+
+@pytest.mark.parametrize("use_fft", [True, False])
+def test_sumpy_fmm_repeated_evaluation(actx_factory, use_fft):
+    from sumpy.build_profile import KernelBuildProfile
+
+    actx = actx_factory()
+
+    knl = LaplaceKernel(2)
+    local_expn_class = LinearPDEConformingVolumeTaylorLocalExpansion
+    mpole_expn_class = LinearPDEConformingVolumeTaylorMultipoleExpansion
+    order = 4
+
+    nsources = 500
+    ntargets = 200
+
+    from boxtree.tools import make_normal_particle_array as p_normal
+    sources = p_normal(actx.queue, nsources, knl.dim, np.float64, seed=15)
+    targets = p_normal(actx.queue, ntargets, knl.dim, np.float64, seed=18)
+
+    from boxtree import TreeBuilder
+    tree, _ = TreeBuilder(actx.context)(actx.queue, sources, targets=targets,
+            max_particles_in_box=30, debug=True)
+
+    from boxtree.traversal import FMMTraversalBuilder
+    trav, _ = FMMTraversalBuilder(actx.context)(actx.queue, tree, debug=True)
+
+    if use_fft:
+        from sumpy.expansion.m2l import FFTM2LTranslationClassFactory
+        m2l_translation_factory = FFTM2LTranslationClassFactory()
+    else:
+        from sumpy.expansion.m2l import NonFFTM2LTranslationClassFactory
+        m2l_translation_factory = NonFFTM2LTranslationClassFactory()
+
+    m2l_translation = m2l_translation_factory.get_m2l_translation_class(
+                knl, local_expn_class)()
+
+    tree_indep = SumpyTreeIndependentDataForWrangler(
+            actx.context,
+            partial(mpole_expn_class, knl),
+            partial(local_expn_class, knl, m2l_translation=m2l_translation),
+            [knl])
+
+    def make_wrangler():
+        return SumpyExpansionWrangler(tree_indep, trav, np.float64,
+                fmm_level_to_order=lambda kernel, kernel_args, tree, lev: order)
+
+    wrangler = make_wrangler()
+
+    from boxtree.fmm import drive_fmm
+    rng = np.random.default_rng(44)
+    for i in range(3):
+        weights = actx.from_numpy(rng.random(nsources, dtype=np.float64))
+
+        with KernelBuildProfile() as profile:
+            pot, = drive_fmm(wrangler, (weights,))
+        if i > 0:
+            # the kernels are not regenerated
+            assert not [
+                rec for rec in profile.records if rec.stage == "generate"]
+
+        ref_pot, = drive_fmm(make_wrangler(), (weights,))
+
+        pot = actx.to_numpy(pot)
+        ref_pot = actx.to_numpy(ref_pot)
+        assert la.norm(pot - ref_pot, np.inf) < 1.0e-14 * la.norm(ref_pot, np.inf)
+
+# }}}
+
+
+# {{{ test_sumpy_fmm_delta
+
+@pytest.mark.parametrize("use_fft", [True, False])
+def test_sumpy_fmm_delta(actx_factory, use_fft):
+    from boxtree.fmm import drive_fmm
+
+    from sumpy.fmm import drive_fmm_delta
+    from sumpy.fmm_profile import FMMProfile
+
+    actx = actx_factory()
+
+    knl = LaplaceKernel(2)
+    local_expn_class = LinearPDEConformingVolumeTaylorLocalExpansion
+    mpole_expn_class = LinearPDEConformingVolumeTaylorMultipoleExpansion
+    order = 4
+
+    nsources = 2000
+    ntargets = 500
+
+    from boxtree.tools import make_normal_particle_array as p_normal
+    sources = p_normal(actx.queue, nsources, knl.dim, np.float64, seed=15)
+    targets = p_normal(actx.queue, ntargets, knl.dim, np.float64, seed=18)
+
+    from boxtree import TreeBuilder
+    tree, _ = TreeBuilder(actx.context)(actx.queue, sources, targets=targets,
+            max_particles_in_box=30, debug=True)
+
+    from boxtree.traversal import FMMTraversalBuilder
+    trav, _ = FMMTraversalBuilder(actx.context)(actx.queue, tree, debug=True)
+
+    if use_fft:
+        from sumpy.expansion.m2l import FFTM2LTranslationClassFactory
+        m2l_translation_factory = FFTM2LTranslationClassFactory()
+    else:
+        from sumpy.expansion.m2l import NonFFTM2LTranslationClassFactory
+        m2l_translation_factory = NonFFTM2LTranslationClassFactory()
+
+    m2l_translation = m2l_translation_factory.get_m2l_translation_class(
+                knl, local_expn_class)()
+
+    tree_indep = SumpyTreeIndependentDataForWrangler(
+            actx.context,
+            partial(mpole_expn_class, knl),
+            partial(local_expn_class, knl, m2l_translation=m2l_translation),
+            [knl])
+
+    wrangler = SumpyExpansionWrangler(tree_indep, trav, np.float64,
+            fmm_level_to_order=lambda kernel, kernel_args, tree, lev: order)
+
+    rng = np.random.default_rng(44)
+    weights = rng.random(nsources, dtype=np.float64)
+
+    with FMMProfile() as profile:
+        pot, = drive_fmm(wrangler, (actx.from_numpy(weights),))
+    pot = actx.to_numpy(pot)
+
+    def ninteractions(profile):
+        return sum(rec.ninteractions for rec in profile.records
+                   if rec.ninteractions is not None)
+
+    def check(pot, ref_pot):
+        assert la.norm(pot - ref_pot, np.inf) < 1.0e-13 * la.norm(ref_pot, np.inf)
+
+    # {{{ re-weight some sources
+
+    source_ids = rng.choice(nsources, 20, replace=False)
+    weight_deltas = rng.random(len(source_ids), dtype=np.float64)
+
+    with FMMProfile() as delta_profile:
+        delta_pot, = drive_fmm_delta(
+                wrangler, actx.queue, source_ids, (weight_deltas,))
+    assert ninteractions(delta_profile) < 0.5 * ninteractions(profile)
+
+    weights[source_ids] += weight_deltas
+    ref_pot, = drive_fmm(wrangler, (actx.from_numpy(weights),))
+    ref_pot = actx.to_numpy(ref_pot)
+    check(pot + actx.to_numpy(delta_pot), ref_pot)
+    pot = ref_pot
+
+    # }}}
+
+    # {{{ move some sources towards the centers of their boxes
+
+    host_tree = tree.get(actx.queue)
+    source_boxes, = np.nonzero(host_tree.box_source_counts_nonchild)
+    source_boxes = rng.choice(source_boxes, 5, replace=False)
+    tree_source_ids = host_tree.box_source_starts[source_boxes]
+    source_ids = host_tree.user_source_ids[tree_source_ids]
+    new_sources = 0.5 * (
+            np.array([ary[tree_source_ids] for ary in host_tree.sources])
+            + host_tree.box_centers[:, source_boxes])
+
+    with FMMProfile() as delta_profile:
+        delta_pot, = drive_fmm_delta(
+                wrangler, actx.queue, source_ids, (weight_deltas[:5],),
+                new_sources=new_sources, weights=(weights[source_ids],))
+    assert ninteractions(delta_profile) < 0.5 * ninteractions(profile)
+
+    weights[source_ids] += weight_deltas[:5]
+    ref_pot, = drive_fmm(wrangler, (actx.from_numpy(weights),))
+    ref_pot = actx.to_numpy(ref_pot)
+    check(pot + actx.to_numpy(delta_pot), ref_pot)
+
+    # the moved sources are used by a new wrangler
+    new_wrangler = SumpyExpansionWrangler(tree_indep, trav, np.float64,
+            fmm_level_to_order=lambda kernel, kernel_args, tree, lev: order)
+    new_pot, = drive_fmm(new_wrangler, (actx.from_numpy(weights),))
+    check(actx.to_numpy(new_pot), ref_pot)
+
+    with pytest.raises(ValueError):
+        drive_fmm_delta(wrangler, actx.queue, source_ids[:1],
+                (weight_deltas[:1],),
+                new_sources=host_tree.box_centers[:, :1] + host_tree.root_extent,
+                weights=(weights[source_ids[:1]],))
+
+    # }}}
+
+# }}}
+
+
+# {{{ test_sumpy_fmm_near_field_matrix
+
+@pytest.mark.parametrize(("knl", "exclude_self"), [
+    (LaplaceKernel(2), True),
+    (HelmholtzKernel(2), False),
+    ])
+def test_sumpy_fmm_near_field_matrix(actx_factory, knl, exclude_self):
+    from sumpy.fmm_profile import FMMProfile
+
+    actx = actx_factory()
+
+    local_expn_class = LinearPDEConformingVolumeTaylorLocalExpansion
+    mpole_expn_class = LinearPDEConformingVolumeTaylorMultipoleExpansion
+    order = 4
+
+    nsources = 1000
+    ntargets = 300
+
+    from boxtree.tools import make_normal_particle_array as p_normal
+    sources = p_normal(actx.queue, nsources, knl.dim, np.float64, seed=15)
+
+    from boxtree import TreeBuilder
+    if exclude_self:
+        tree, _ = TreeBuilder(actx.context)(actx.queue, sources,
+                max_particles_in_box=30, debug=True)
+        self_extra_kwargs = {"target_to_source": actx.from_numpy(
+            np.arange(tree.ntargets, dtype=np.int32))}
+    else:
+        targets = p_normal(actx.queue, ntargets, knl.dim, np.float64, seed=18)
+        tree, _ = TreeBuilder(actx.context)(actx.queue, sources,
+                targets=targets, max_particles_in_box=30, debug=True)
+        self_extra_kwargs = {}
+
+    from boxtree.traversal import FMMTraversalBuilder
+    trav, _ = FMMTraversalBuilder(actx.context)(actx.queue, tree, debug=True)
+
+    extra_kwargs = {}
+    dtype = np.float64
+    if isinstance(knl, HelmholtzKernel):
+        extra_kwargs["k"] = 0.05
+        dtype = np.complex128
+
+    tree_indep = SumpyTreeIndependentDataForWrangler(
+            actx.context,
+            partial(mpole_expn_class, knl),
+            partial(local_expn_class, knl),
+            [knl], exclude_self=exclude_self)
+
+    def make_wrangler(near_field_matrix_budget=None):
+        return SumpyExpansionWrangler(tree_indep, trav, dtype,
+                fmm_level_to_order=lambda kernel, kernel_args, tree, lev: order,
+                kernel_extra_kwargs=extra_kwargs,
+                self_extra_kwargs=self_extra_kwargs,
+                near_field_matrix_budget=near_field_matrix_budget)
+
+    from boxtree.fmm import drive_fmm
+    rng = np.random.default_rng(44)
+    weights = actx.from_numpy(rng.random(nsources, dtype=np.float64))
+    ref_pot, = drive_fmm(make_wrangler(), (weights,))
+    ref_pot = actx.to_numpy(ref_pot)
+
+    wrangler = make_wrangler(near_field_matrix_budget=2**30)
+    nbytes = wrangler.estimate_resources().nbytes["near_field_matrix"]
+    assert nbytes > 0
+
+    for _ in range(2):
+        with FMMProfile() as profile:
+            pot, = drive_fmm(wrangler, (weights,))
+
+        pot = actx.to_numpy(pot)
+        assert la.norm(pot - ref_pot, np.inf) < 1.0e-13 * la.norm(ref_pot, np.inf)
+
+        assert "p2p_matrix_blocks" in {
+                rec.kernel_name for rec in profile.records
+                if rec.stage == "eval_direct"}
+
+    _, blocks = wrangler.near_field_matrix_blocks()
+    assert blocks.nbytes == nbytes
+
+    # the blocks do not fit, so the interactions are evaluated on the fly
+    wrangler = make_wrangler(near_field_matrix_budget=nbytes - 1)
+    assert wrangler.estimate_resources().nbytes["near_field_matrix"] == 0
+    pot, = drive_fmm(wrangler, (weights,))
+    assert wrangler.near_field_matrix_blocks() is None
+
+    pot = actx.to_numpy(pot)
+    assert la.norm(pot - ref_pot, np.inf) < 1.0e-13 * la.norm(ref_pot, np.inf)
+
+# }}}
+
+
+# {{{ test_sumpy_fmm_near_field_csr_matrix
+
+@pytest.mark.parametrize(("knl", "exclude_self"), [
+    (LaplaceKernel(2), True),
+    (HelmholtzKernel(2), False),
+    ])
+def test_sumpy_fmm_near_field_csr_matrix(actx_factory, knl, exclude_self):
+    actx = actx_factory()
+
+    nsources = 1000
+    ntargets = 300
+
+    from boxtree.tools import make_normal_particle_array as p_normal
+    sources = p_normal(actx.queue, nsources, knl.dim, np.float64, seed=15)
+
+    from boxtree import TreeBuilder
+    if exclude_self:
+        targets = sources
+        tree, _ = TreeBuilder(actx.context)(actx.queue, sources,
+                max_particles_in_box=30, debug=True)
+        self_extra_kwargs = {"target_to_source": actx.from_numpy(
+            np.arange(tree.ntargets, dtype=np.int32))}
+    else:
+        targets = p_normal(actx.queue, ntargets, knl.dim, np.float64, seed=18)
+        tree, _ = TreeBuilder(actx.context)(actx.queue, sources,
+                targets=targets, max_particles_in_box=30, debug=True)
+        self_extra_kwargs = {}
+
+    from boxtree.traversal import FMMTraversalBuilder
+    trav, _ = FMMTraversalBuilder(actx.context)(actx.queue, tree, debug=True)
+
+    extra_kwargs = {}
+    dtype = np.float64
+    if isinstance(knl, HelmholtzKernel):
+        extra_kwargs["k"] = 0.05
+        dtype = np.complex128
+
+    tree_indep = SumpyTreeIndependentDataForWrangler(
+            actx.context,
+            partial(LinearPDEConformingVolumeTaylorMultipoleExpansion, knl),
+            partial(LinearPDEConformingVolumeTaylorLocalExpansion, knl),
+            [knl], exclude_self=exclude_self)
+    wrangler = SumpyExpansionWrangler(tree_indep, trav, dtype,
+            fmm_level_to_order=lambda kernel, kernel_args, tree, lev: 4,
+            kernel_extra_kwargs=extra_kwargs,
+            self_extra_kwargs=self_extra_kwargs)
+
+    def to_dense(data, indices, indptr):
+        data, indices, indptr = (actx.to_numpy(ary)
+                for ary in (data, indices, indptr))
+        rows = np.repeat(np.arange(tree.ntargets), np.diff(indptr))
+
+        # no duplicate entries
+        assert len(set(zip(rows, indices, strict=True))) == len(data)
+
+        mat = np.zeros((tree.ntargets, tree.nsources), dtype=dtype)
+        mat[rows, indices] = data
+        return mat
+
+    mat = to_dense(*wrangler.near_field_csr_matrix(actx.queue))
+
+    # {{{ compare with the list 1 interactions of the FMM
+
+    rng = np.random.default_rng(44)
+    weights = rng.random(nsources, dtype=np.float64)
+
+    pot, _ = wrangler.eval_direct(
+            trav.target_boxes,
+            trav.neighbor_source_boxes_starts,
+            trav.neighbor_source_boxes_lists,
+            (wrangler.reorder_sources(actx.from_numpy(weights)),))
+    pot = actx.to_numpy(wrangler.reorder_potentials(pot)[0])
+
+    assert la.norm(mat @ weights - pot, np.inf) < 1.0e-13 * la.norm(pot, np.inf)
+
+    # }}}
+
+    # {{{ thresholded by distance
+
+    sources = actx.to_numpy(sources)
+    targets = actx.to_numpy(targets)
+    distances = la.norm(
+            targets[:, :, np.newaxis] - sources[:, np.newaxis, :], axis=0)
+
+    max_distance = 0.5 * np.max(distances[mat != 0])
+    near_mat = to_dense(*wrangler.near_field_csr_matrix(actx.queue,
+            max_distance=max_distance))
+
+    assert 0 < np.count_nonzero(near_mat) < np.count_nonzero(mat)
+    assert np.array_equal(near_mat, np.where(distances <= max_distance, mat, 0))
+
+    # }}}
+
+    pytest.importorskip("scipy")
+
+    sp_mat = wrangler.near_field_csr_matrix(actx.queue, host=True)
+    assert np.array_equal(sp_mat.toarray(), mat)
+
+# }}}
+
+
+# {{{ test_sumpy_fmm_symmetric_p2p
+
+@pytest.mark.parametrize("knl", [LaplaceKernel(2), HelmholtzKernel(2)])
+def test_sumpy_fmm_symmetric_p2p(actx_factory, knl):
+    from sumpy.fmm_profile import FMMProfile
+
+    actx = actx_factory()
+
+    import pyopencl as cl
+    if not actx.queue.device.type & cl.device_type.CPU:
+        pytest.skip("symmetric P2P is only supported on CPU devices")
+
+    nsources = 1000
+
+    from boxtree.tools import make_normal_particle_array as p_normal
+    sources = p_normal(actx.queue, nsources, knl.dim, np.float64, seed=15)
+
+    from boxtree import TreeBuilder
+    tree, _ = TreeBuilder(actx.context)(actx.queue, sources,
+            max_particles_in_box=30, debug=True)
+
+    from boxtree.traversal import FMMTraversalBuilder
+    trav, _ = FMMTraversalBuilder(actx.context)(actx.queue, tree, debug=True)
+
+    extra_kwargs = {}
+    dtype = np.float64
+    if isinstance(knl, HelmholtzKernel):
+        extra_kwargs["k"] = 0.05
+        dtype = np.complex128
+
+    tree_indep = SumpyTreeIndependentDataForWrangler(
+            actx.context,
+            partial(LinearPDEConformingVolumeTaylorMultipoleExpansion, knl),
+            partial(LinearPDEConformingVolumeTaylorLocalExpansion, knl),
+            [knl], exclude_self=True)
+
+    def make_wrangler(symmetric_p2p):
+        return SumpyExpansionWrangler(tree_indep, trav, dtype,
+                fmm_level_to_order=lambda kernel, kernel_args, tree, lev: 4,
+                kernel_extra_kwargs=extra_kwargs,
+                self_extra_kwargs={"target_to_source": actx.from_numpy(
+                    np.arange(tree.ntargets, dtype=np.int32))},
+                symmetric_p2p=symmetric_p2p)
+
+    from boxtree.fmm import drive_fmm
+    rng = np.random.default_rng(44)
+    weights = actx.from_numpy(rng.random(nsources, dtype=np.float64))
+
+    ninteractions = {}
+    pots = {}
+    for symmetric_p2p in [False, True]:
+        wrangler = make_wrangler(symmetric_p2p)
+        with FMMProfile() as profile:
+            pot, = drive_fmm(wrangler, (weights,))
+
+        pots[symmetric_p2p] = actx.to_numpy(pot)
+        ninteractions[symmetric_p2p] = sum(
+                rec.ninteractions for rec in profile.records
+                if rec.stage == "eval_direct")
+        assert (ninteractions[symmetric_p2p]
+                == wrangler.estimate_resources().ninteractions["eval_direct"])
+
+    ref_pot = pots[False]
+    assert la.norm(pots[True] - ref_pot, np.inf) < 1.0e-13 * la.norm(ref_pot, np.inf)
+
+    # each pair of distinct particles is evaluated once
+    assert 2 * ninteractions[True] == ninteractions[False] - nsources
+
+    # the pairs of boxes evaluated at once have no box in common
+    color_starts, pair_boxes_a, pair_boxes_b, _ = (
+            wrangler._symmetric_p2p_pairs())
+    pair_boxes_a = actx.to_numpy(pair_boxes_a)
+    pair_boxes_b = actx.to_numpy(pair_boxes_b)
+    for start, stop in zip(color_starts[:-1], color_starts[1:], strict=True):
+        boxes = np.union1d(pair_boxes_a[start:stop], pair_boxes_b[start:stop])
+        nboxes = np.sum(np.where(
+            pair_boxes_a[start:stop] == pair_boxes_b[start:stop], 1, 2))
+        assert len(boxes) == nboxes
+
+    # {{{ unsupported
+
+    from sumpy.kernel import AxisTargetDerivative
+    tree_indep = SumpyTreeIndependentDataForWrangler(
+            actx.context,
+            partial(LinearPDEConformingVolumeTaylorMultipoleExpansion, knl),
+            partial(LinearPDEConformingVolumeTaylorLocalExpansion, knl),
+            [AxisTargetDerivative(0, knl)], exclude_self=True)
+    with pytest.raises(ValueError):
+        make_wrangler(True)
+
+    # }}}
+
+# }}}
+
+
 """
 You can test individual routines by typing
 $ python test/test_fmm.py 'test_sumpy_fmm(_acf, LaplaceKernel(2),
@@ -479,6 +479,134 @@ def test_p2e2p(actx_factory, base_knl, expn_class, order, with_source_derivative
 # }}}
 
 
+# {{{ test_p2m2p_recurrence
+
+class _SymbolicMultipoleMixin:
+    """Uses the symbolically generated P2M and M2P kernels of
+    :class:`~sumpy.expansion.ExpansionBase` instead of the recurrence-based
+    ones.
+    """
+
+    def loopy_expansion_formation(self, kernels, strength_usage, nstrengths):
+        from sumpy.expansion import ExpansionBase
+        return ExpansionBase.loopy_expansion_formation(
+            self, kernels, strength_usage, nstrengths)
+
+    def loopy_evaluator(self, kernels):
+        from sumpy.expansion import ExpansionBase
+        return ExpansionBase.loopy_evaluator(self, kernels)
+
+
+class SymbolicVolumeTaylorMultipoleExpansion(
+        _SymbolicMultipoleMixin, VolumeTaylorMultipoleExpansion):
+    pass
+
+
+class SymbolicLinearPDEConformingVolumeTaylorMultipoleExpansion(
+        _SymbolicMultipoleMixin, LinearPDEConformingVolumeTaylorMultipoleExpansion):
+    pass
+
+
+@pytest.mark.parametrize("order", [0, 1, 5])
+@pytest.mark.parametrize(("base_knl", "expn_class", "sym_expn_class"), [
+    (LaplaceKernel(2), VolumeTaylorMultipoleExpansion,
+     SymbolicVolumeTaylorMultipoleExpansion),
+    (LaplaceKernel(3), LinearPDEConformingVolumeTaylorMultipoleExpansion,
+     SymbolicLinearPDEConformingVolumeTaylorMultipoleExpansion),
+    (HelmholtzKernel(2), LinearPDEConformingVolumeTaylorMultipoleExpansion,
+     SymbolicLinearPDEConformingVolumeTaylorMultipoleExpansion),
+    (HelmholtzKernel(3, allow_evanescent=True), VolumeTaylorMultipoleExpansion,
+     SymbolicVolumeTaylorMultipoleExpansion),
+    ])
+def test_p2m2p_recurrence(actx_factory, base_knl, expn_class, sym_expn_class,
+        order):
+    from sumpy import E2PFromSingleBox, P2EFromSingleBox
+    from sumpy.expansion.loopy import (
+        supports_recurrence_m2p,
+        supports_recurrence_p2m,
+    )
+
+    actx = actx_factory()
+
+    dim = base_knl.dim
+    nsources = 20
+    ntargets = 30
+
+    extra_kwargs = {}
+    if isinstance(base_knl, HelmholtzKernel):
+        if base_knl.allow_evanescent:
+            extra_kwargs["k"] = 1.3 * (0.707 + 0.707j)
+        else:
+            extra_kwargs["k"] = 1.3
+
+    target_kernels = [
+        base_knl,
+        AxisTargetDerivative(0, base_knl),
+        AxisTargetDerivative(dim - 1, base_knl),
+        ]
+
+    rng = np.random.default_rng(17)
+    sources = actx.from_numpy(0.3 * (rng.random((dim, nsources)) - 0.5))
+    strengths = actx.from_numpy(rng.random(nsources))
+    targets = 3 + rng.random((dim, ntargets))
+    targets = make_obj_array([actx.from_numpy(targets[i].copy())
+        for i in range(dim)])
+    centers = actx.from_numpy(np.zeros((dim, 1)))
+
+    source_boxes = actx.from_numpy(np.array([0], dtype=np.int32))
+    box_source_starts = actx.from_numpy(np.array([0], dtype=np.int32))
+    box_source_counts_nonchild = (
+        actx.from_numpy(np.array([nsources], dtype=np.int32)))
+    box_target_starts = actx.from_numpy(np.array([0], dtype=np.int32))
+    box_target_counts_nonchild = (
+        actx.from_numpy(np.array([ntargets], dtype=np.int32)))
+
+    rscale = 0.5  # pick something non-1
+
+    results = []
+    for cls in [expn_class, sym_expn_class]:
+        expn = cls(base_knl, order=order)
+        if cls is expn_class:
+            assert supports_recurrence_p2m(expn, [base_knl])
+            assert supports_recurrence_m2p(expn, target_kernels)
+
+        p2e = P2EFromSingleBox(actx.context, expn, kernels=[base_knl])
+        e2p = E2PFromSingleBox(actx.context, expn, kernels=target_kernels)
+
+        _evt, (mpoles,) = p2e(actx.queue,
+                source_boxes=source_boxes,
+                box_source_starts=box_source_starts,
+                box_source_counts_nonchild=box_source_counts_nonchild,
+                centers=centers,
+                sources=sources,
+                strengths=(strengths,),
+                nboxes=1,
+                tgt_base_ibox=0,
+                rscale=rscale,
+                **extra_kwargs)
+
+        _evt, pot = e2p(actx.queue,
+                src_expansions=mpoles,
+                src_base_ibox=0,
+                target_boxes=source_boxes,
+                box_target_starts=box_target_starts,
+                box_target_counts_nonchild=box_target_counts_nonchild,
+                centers=centers,
+                targets=targets,
+                rscale=rscale,
+                **extra_kwargs)
+
+        results.append((actx.to_numpy(mpoles),
+                        [actx.to_numpy(p) for p in pot]))
+
+    (mpoles, pot), (ref_mpoles, ref_pot) = results
+    assert la.norm(mpoles - ref_mpoles) <= 1e-13 * la.norm(ref_mpoles)
+    for p, ref_p in zip(pot, ref_pot, strict=True):
+        assert la.norm(p - ref_p) <= 1e-13 * la.norm(ref_p)
+
+# }}}
+
+
 # {{{ test_translations
 
 @pytest.mark.parametrize("knl, local_expn_class, mpole_expn_class, use_fft", [
@@ -210,6 +210,23 @@ def test_order_finder(knl):
     assert (np.diff(orders) <= 0).all()
 
 
+def test_order_finder_expansion_dtype():
+    from sumpy.expansion.level_to_order import SimpleExpansionOrderFinder
+
+    knl = LaplaceKernel(3)
+    tree = FakeTree(knl.dim, 200, 0.5)
+
+    def get_order(tol, expansion_dtype=None):
+        ofind = SimpleExpansionOrderFinder(tol, expansion_dtype=expansion_dtype)
+        return ofind(knl, frozenset(), tree, 3)
+
+    eps = np.finfo(np.float32).eps
+    assert get_order(1e-12, np.float32) == get_order(eps)
+    assert get_order(1e-12, np.float32) < get_order(1e-12)
+    assert get_order(1e-12, np.float64) == get_order(1e-12)
+    assert get_order(1e-3, np.float32) == get_order(1e-3)
+
+
 @pytest.mark.parametrize("knl", [
         LaplaceKernel(2), HelmholtzKernel(2),
         LaplaceKernel(3), HelmholtzKernel(3)])
@@ -589,6 +606,169 @@ def test_get_storage_index(order, knl, compressed):
 # }}}
 
 
+# {{{ test_projection_matrix_sharing
+
+def test_projection_matrix_sharing():
+    order = 5
+    rscale = sym.Symbol("rscale")
+
+    # all components of the Stokeslet satisfy the same PDE
+    w00 = LinearPDEBasedExpansionTermsWrangler(order, 3, StokesletKernel(3, 0, 0))
+    w01 = LinearPDEBasedExpansionTermsWrangler(order, 3, StokesletKernel(3, 0, 1))
+    assert (w00.get_stored_ids_and_unscaled_projection_matrix()
+            is w01.get_stored_ids_and_unscaled_projection_matrix())
+    assert w00.get_projection_matrix(rscale) is w01.get_projection_matrix(rscale)
+
+    stored_ids, op = w01._compute_stored_ids_and_unscaled_projection_matrix()
+    assert stored_ids == w00.get_coefficient_identifiers()
+    assert op.from_output_coeffs_by_row == (
+        w00.get_stored_ids_and_unscaled_projection_matrix()[1]
+        .from_output_coeffs_by_row)
+
+    # different PDEs, orders and scaling must not share
+    w_lap = LinearPDEBasedExpansionTermsWrangler(order, 3, LaplaceKernel(3))
+    assert len(w_lap.get_coefficient_identifiers()) != len(stored_ids)
+    assert (w00.copy(order=order + 1).get_stored_ids_and_unscaled_projection_matrix()
+            is not w00.get_stored_ids_and_unscaled_projection_matrix())
+    assert (w00.get_projection_matrix(2*rscale)
+            is not w00.get_projection_matrix(rscale))
+
+
+def test_projection_matrix_cache_eviction(monkeypatch):
+    from collections import OrderedDict
+
+    monkeypatch.setattr(LinearPDEBasedExpansionTermsWrangler,
+            "projection_matrix_cache", OrderedDict())
+    monkeypatch.setattr(LinearPDEBasedExpansionTermsWrangler,
+            "projection_matrix_cache_max_entries", 1)
+
+    order = 4
+    w_lap = LinearPDEBasedExpansionTermsWrangler(order, 3, LaplaceKernel(3))
+    stored_ids, op = w_lap.get_stored_ids_and_unscaled_projection_matrix()
+    w_helm = LinearPDEBasedExpansionTermsWrangler(order, 2, HelmholtzKernel(2))
+    w_helm.get_stored_ids_and_unscaled_projection_matrix()
+
+    cache = LinearPDEBasedExpansionTermsWrangler.projection_matrix_cache
+    assert list(cache) == [w_helm._get_projection_cache_key()]
+
+    # recomputed (or read back from the on-disk cache) after the eviction
+    w_lap = w_lap.copy()
+    new_stored_ids, new_op = w_lap.get_stored_ids_and_unscaled_projection_matrix()
+    assert new_stored_ids == stored_ids
+    assert new_op.from_output_coeffs_by_row == op.from_output_coeffs_by_row
+    assert new_op.from_input_coeffs_by_row == op.from_input_coeffs_by_row
+    assert list(cache) == [w_lap._get_projection_cache_key()]
+
+
+def _projection_to_dense(op):
+    import sympy as sp
+
+    columns = []
+    for j in range(op.shape[1]):
+        unit = [0]*op.shape[1]
+        unit[j] = 1
+        columns.append(op.matvec(unit))
+
+    return sp.Matrix(columns).T
+
+
+@pytest.mark.parametrize("knl", [
+    LaplaceKernel(3),
+    BiharmonicKernel(2),
+    HelmholtzKernel(2),
+    StokesletKernel(3, 0, 1),
+    ])
+def test_projection_by_elimination(knl):
+    import sympy as sp
+
+    order = 5
+    rscale = sym.Symbol("rscale")
+    w = LinearPDEBasedExpansionTermsWrangler(order, knl.dim, knl)
+    stored_ids, op = w._compute_stored_ids_and_unscaled_projection_matrix()
+    elim_stored_ids, elim_op = w._compute_projection_by_elimination()
+
+    assert elim_stored_ids == stored_ids
+    assert (_projection_to_dense(elim_op)
+            - _projection_to_dense(op)).applyfunc(sp.simplify).is_zero_matrix
+
+    w_elim = w.copy()
+    w_elim.get_stored_ids_and_unscaled_projection_matrix = \
+        lambda: (elim_stored_ids, elim_op)
+    assert (_projection_to_dense(w_elim._compute_projection_matrix(rscale))
+            - _projection_to_dense(w.get_projection_matrix(rscale))
+            ).applyfunc(sp.simplify).is_zero_matrix
+
+
+def test_projection_for_pde_system():
+    import sympy as sp
+
+    w = make_identity_diff_op(2)
+    pde = concat(laplacian(w), diff(w, (1, 1)))
+
+    class MyKernel(ExpressionKernel):
+        def __init__(self):
+            super().__init__(dim=2, expression=1, global_scaling_const=1,
+                is_complex_valued=False)
+
+        def get_pde_as_diff_op(self):
+            return pde
+
+    order = 6
+    wrangler = LinearPDEBasedExpansionTermsWrangler(order, 2, MyKernel())
+    mis = [tuple(mi) for mi in wrangler.get_full_coefficient_identifiers()]
+    mi_to_index = {mi: i for i, mi in enumerate(mis)}
+    stored_ids, op = wrangler.get_stored_ids_and_unscaled_projection_matrix()
+
+    # the harmonic functions with u_xy = 0 are spanned by 1, x, y and x^2 - y^2
+    assert len(stored_ids) == 4
+
+    # the full coefficients satisfy all the relations implied by the PDE
+    full = _projection_to_dense(op)
+    for eq in pde.eqs:
+        for shift in mis:
+            rows = [(mi_to_index.get(tuple(a + b for a, b in
+                                           zip(ident.mi, shift, strict=True))),
+                     coeff)
+                    for ident, coeff in eq.items()]
+            if any(i is None for i, _ in rows):
+                continue
+            assert sum((coeff*full[i, :] for i, coeff in rows),
+                       sp.zeros(1, len(stored_ids))).is_zero_matrix
+
+# }}}
+
+
+# {{{ test_lazy_import
+
+def test_lazy_import():
+    import subprocess
+
+    code = """
+import sys
+import sumpy
+heavy = ("loopy", "pyopencl", "sympy", "sumpy.e2e", "pytools.persistent_dict")
+assert not any(name in sys.modules for name in heavy), \
+    [name for name in heavy if name in sys.modules]
+
+from sumpy import P2P, code_cache
+from sumpy.p2p import P2P as P2P_orig
+assert P2P is P2P_orig
+assert code_cache is sumpy.code_cache
+assert "E2EFromCSR" in dir(sumpy)
+
+try:
+    sumpy.NotAnAttribute
+except AttributeError:
+    pass
+else:
+    raise AssertionError
+"""
+
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+# }}}
+
+
 # You can test individual routines by typing
 # $ python test_misc.py 'test_pde_check_kernels(_acf,
 #       KernelInfo(HelmholtzKernel(2), k=5), order=5)'
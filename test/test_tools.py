@@ -34,10 +34,13 @@ from arraycontext import pytest_generate_tests_for_array_contexts
 import sumpy.symbolic as sym
 from sumpy.array_context import PytestPyOpenCLArrayContextFactory, _acf  # noqa: F401
 from sumpy.tools import (
+    _reduced_row_echelon_form_generic,
     fft,
     fft_toeplitz_upper_triangular,
     loopy_fft,
     matvec_toeplitz_upper_triangular,
+    nullspace,
+    reduced_row_echelon_form,
 )
 
 
@@ -101,6 +104,211 @@ def test_fft(actx_factory, size):
 # }}}
 
 
+# {{{ test_binary_caching_executor
+
+def test_binary_caching_executor(actx_factory, monkeypatch):
+    actx = actx_factory()
+
+    from sumpy import CACHING_ENABLED, P2P, binary_cache
+    from sumpy.kernel import LaplaceKernel
+    from sumpy.tools import BinaryCachingExecutor
+
+    if not CACHING_ENABLED:
+        pytest.skip("caching is disabled")
+
+    knl = LaplaceKernel(2)
+
+    rng = np.random.default_rng(42)
+    sources = rng.random((2, 50))
+    targets = rng.random((2, 20)) + 2
+    strengths = rng.random(50)
+
+    results = []
+    for _ in range(2):
+        # a new P2P does not share the in-memory caches of the previous one
+        p2p = P2P(actx.context, [knl], exclude_self=False)
+        executor = p2p.get_cached_kernel_executor(
+            targets_is_obj_array=False, sources_is_obj_array=False)
+        assert isinstance(executor, BinaryCachingExecutor)
+        # the executor is only wrapped while an FMM profile is active
+        assert p2p.get_cached_kernel_executor(
+            targets_is_obj_array=False, sources_is_obj_array=False) is executor
+
+        _evt, (result,) = p2p(actx.queue, targets, sources, [strengths],
+                              out_host=True)
+        results.append(result)
+
+    assert any(key[0] == executor.cache_key for key in binary_cache)
+    assert np.array_equal(results[0], results[1])
+
+    # loopy's executor is used with other versions of loopy
+    import sumpy.tools
+    monkeypatch.setattr(sumpy.tools, "_BINARY_CACHING_LOOPY_VERSIONS",
+                        ((0,), (0,)))
+
+    p2p = P2P(actx.context, [knl], exclude_self=False)
+    executor = p2p.get_cached_kernel_executor(
+        targets_is_obj_array=False, sources_is_obj_array=False)
+    assert not isinstance(executor, BinaryCachingExecutor)
+
+    _evt, (result,) = p2p(actx.queue, targets, sources, [strengths],
+                          out_host=True)
+    assert np.array_equal(result, results[0])
+
+# }}}
+
+
+# {{{ test_kernel_build_profile
+
+def test_kernel_build_profile(actx_factory):
+    actx = actx_factory()
+
+    import json
+
+    from sumpy import P2P, CacheMode
+    from sumpy.build_profile import KernelBuildProfile
+    from sumpy.kernel import LaplaceKernel
+
+    p2p = P2P(actx.context, [LaplaceKernel(2)], exclude_self=False)
+
+    with CacheMode(False), KernelBuildProfile(trace_memory=True) as profile:
+        p2p.get_cached_kernel_executor(
+            targets_is_obj_array=False, sources_is_obj_array=False)
+
+    rec, = profile.records
+    assert rec.class_name == "P2P"
+    assert rec.stage == "generate"
+    assert rec.cache_hit is None
+    assert rec.peak_memory is not None and rec.peak_memory > 0
+
+    phase_names = {phase.name for phase in rec.phases}
+    assert {"get_optimized_kernel", "get_loopy_insns_and_result_names",
+            "run_global_cse", "to_loopy_insns"} <= phase_names
+
+    for phase in rec.phases:
+        assert phase.elapsed <= rec.elapsed
+        if phase.name == "to_loopy_insns":
+            assert phase.counts["ninsns"] > 0
+
+    records = json.loads(profile.to_json())
+    assert records[0]["phases"][0]["name"] == rec.phases[0].name
+
+    # nothing is recorded outside of a profile
+    p2p = P2P(actx.context, [LaplaceKernel(2)], exclude_self=False)
+    with CacheMode(False):
+        p2p.get_cached_kernel_executor(
+            targets_is_obj_array=False, sources_is_obj_array=False)
+    assert len(profile.records) == 1
+
+# }}}
+
+
+# {{{ test_code_cache_management
+
+def test_code_cache_management(tmp_path):
+    from sumpy.cache import SumpyCodeCache
+    from sumpy.expansion.local import VolumeTaylorLocalExpansion
+    from sumpy.kernel import LaplaceKernel
+
+    knl = LaplaceKernel(2)
+
+    def make_key(order, kernel_version):
+        return ("E2EFromCSR", VolumeTaylorLocalExpansion(knl, order),
+                kernel_version, True)
+
+    cache = SumpyCodeCache("sumpy-test-cache",
+                           container_dir=str(tmp_path / "cache"),
+                           safe_sync=False)
+    for order in range(1, 5):
+        cache.store_if_not_present(make_key(order, "v1"), "x" * 1000 * order)
+    cache.store_if_not_present(make_key(5, "v0"), "y" * 100)
+
+    entries = cache.entries()
+    assert len(entries) == 5
+    assert {entry.name for entry in entries} == {"E2EFromCSR"}
+    assert sorted(entry.order for entry in entries) == [1, 2, 3, 4, 5]
+
+    # {{{ export and import
+
+    bundle = str(tmp_path / "bundle.sqlite")
+    assert cache.export_bundle(bundle) == 5
+    assert cache.export_bundle(bundle, names=["P2PFromCSR"]) == 0
+
+    other_cache = SumpyCodeCache("sumpy-test-cache",
+                                 container_dir=str(tmp_path / "other"),
+                                 safe_sync=False)
+    assert other_cache.import_bundle(bundle) == 5
+    assert other_cache[make_key(3, "v1")] == "x" * 3000
+    assert len(other_cache.entries()) == 5
+
+    # }}}
+
+    # {{{ pruning and eviction
+
+    assert cache.prune_stale("v1") == 1
+    assert len(cache) == 4
+
+    # make order 1 the most recently used entry
+    cache.clear_in_mem_cache()
+    assert cache[make_key(1, "v1")] == "x" * 1000
+
+    total_size = cache.total_size()
+    cache.evict(total_size - 1)
+    assert len(cache) == 3
+    with pytest.raises(KeyError):
+        cache[make_key(2, "v1")]
+
+    cache.max_size = 3000
+    cache.store_if_not_present(make_key(6, "v1"), "z" * 100)
+    assert cache.total_size() <= 3000
+    assert make_key(6, "v1") in cache
+    assert make_key(1, "v1") in cache
+
+    # }}}
+
+# }}}
+
+
+# {{{ test_exact_reduced_row_echelon_form
+
+@pytest.mark.parametrize("rational", [False, True])
+@pytest.mark.parametrize(("nrows", "ncols", "rank"), [
+    (1, 1, 0), (6, 9, 4), (12, 10, 10), (15, 20, 7),
+    ])
+def test_exact_reduced_row_echelon_form(nrows, ncols, rank, rational):
+    import sympy
+
+    rng = np.random.default_rng(17)
+
+    def make_entry():
+        if rational:
+            return sym.Rational(int(rng.integers(-9, 10)), int(rng.integers(1, 6)))
+        return int(rng.integers(-9, 10))
+
+    # a matrix of the given rank
+    a = np.array([[make_entry() for _ in range(rank)] for _ in range(nrows)],
+                 dtype=object).reshape(nrows, rank)
+    b = np.array([[make_entry() for _ in range(ncols)] for _ in range(rank)],
+                 dtype=object).reshape(rank, ncols)
+    mat = a.dot(b) if rank else np.zeros((nrows, ncols), dtype=object)
+
+    rref, pivot_cols = reduced_row_echelon_form(mat)
+    ref_rref, ref_pivot_cols = sympy.Matrix(mat.tolist()).rref()
+    assert tuple(pivot_cols) == ref_pivot_cols
+    assert sympy.Matrix(rref.tolist()) == ref_rref
+
+    generic_rref, generic_pivot_cols = _reduced_row_echelon_form_generic(mat)
+    assert pivot_cols == generic_pivot_cols
+    assert (rref == generic_rref).all()
+
+    if rank < ncols:
+        null = nullspace(mat)
+        assert null.shape == (ncols, ncols - rank)
+        assert not any(sym.sympify(x) != 0 for x in mat.dot(null).flat)
+
+# }}}
+
+
 # You can test individual routines by typing
 # $ python test_tools.py 'test_fft(_acf, 30)'
 